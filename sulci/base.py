@@ -8,10 +8,63 @@ from limpyd.database import RedisDatabase
 from limpyd import redis_connect
 
 from sulci.utils import load_file, get_dir
-from sulci.textutils import tokenize_text
+from sulci.textutils import tokenize_text, iter_tokenize_text, iter_token_spans
 from sulci.stopwords import usual_words
 from sulci import config
 
+USUAL_WORDS = frozenset(usual_words)
+
+TOOL_TAGS = frozenset([
+    "DTN:sg",
+    "DTN:pl",
+    "DTC:sg",
+    "DTC:pl",
+    "PLU",
+    "COO",
+    "PREP",
+    "REL",
+    "SUB",
+    "PRO:sg",
+    "PRO:pl",
+    "PRV:sg"  # The missing comma is historical: "PRV:sg" is not a tool tag
+    "PRV:pl"
+])
+
+VERB_TAGS = frozenset([
+    "VCJ:sg",
+    "VCJ:pl",
+    "PAR:sg",
+    "PAR:pl",
+    "VNCFF",
+    "VNCNT",
+])
+
+ETRE_TAGS = frozenset([
+    "ECJ:sg",
+    "ECJ:pl",
+    "EPAR:sg",
+    "ENCFF",
+    "ENCNT",
+])
+
+AVOIR_TAGS = frozenset([
+    "ACJ:sg",
+    "ACJ:pl",
+    "APAR:sg",
+    "APAR:pl",
+    "ANCFF",
+    "ANCNT",
+])
+
+# Flags of Token.features, see Token.compute_features
+MEANING = 1
+MEANING_ALONE = 2
+TOOL_WORD = 4
+VERB = 8
+ETRE = 16
+AVOIR = 32
+TITLE = 64
+
 
 class TextManager(object):
     """
@@ -20,6 +73,7 @@ class TextManager(object):
     """
     VALID_EXT = None  # To be overwrited
     PENDING_EXT = None  # To be overwrited
+    TRAINING = False  # True for the manually tagged texts used by the trainers
 
     def get_files(self, kind):
         return [x for x in os.listdir(get_dir(__file__) + self.PATH) if x.endswith(kind)]
@@ -30,25 +84,39 @@ class TextManager(object):
         text is tokenized
         each token is : original + optionnal verified_tag (for training)
         """
-        csamples = []
-        ctokens = []
+        csamples = list(self.iter_samples(text))
+        ctokens = [t for s in csamples for t in s]
+        return csamples, ctokens
+
+    def iter_samples(self, text):
+        """
+        Yield the samples of a tokenized text, one by one.
+        text can be any iterable of tokens, for example a generator: a sample
+        is yielded as soon as the first token of the next one is read, so only
+        the current sample is kept in memory.
+        Tokens can also be given as (token, start, end) tuples, with their
+        offsets in the text.
+        """
+        sample_class = self.TRAINING and TrainerSample or Sample
         current_sample = None
         previous_token = None
         sample_id = 0
         for idx, tk in enumerate(text):
-            t, created = Token.get_or_create(idx, self, original=tk)
+            start = end = None
+            if isinstance(tk, tuple):
+                tk, start, end = tk
+            # Tokens are never looked up, their position in the text is
+            # enough as pk
+            t = Token(idx, original=tk, start=start, end=end)
             if current_sample is None or t.begin_of_sample(previous_token):
-                current_sample, created = Sample.get_or_create(
-                                              sample_id,
-                                              self,
-                                              parent=self
-                                          )
+                if current_sample is not None:
+                    yield current_sample
+                current_sample = sample_class(sample_id, parent=self)
                 sample_id += 1
-                csamples.append(current_sample)
             current_sample.append(t)
-            ctokens.append(t)
             previous_token = t
-        return csamples, ctokens
+        if current_sample is not None:
+            yield current_sample
 
     @property
     def valid_files(self):
@@ -65,29 +133,39 @@ class TextManager(object):
     def tokenize(self, text):
         return tokenize_text(text)
 
+    def iter_tokenize(self, text):
+        return iter_tokenize_text(text)
+
+    def iter_token_spans(self, text):
+        return iter_token_spans(text)
+
 
 class RetrievableObject(object):
     """
     Simple abstract class to manage RAM stored and retrievable objects.
     """
+    __slots__ = ()  # Let the subclasses define their own slots
 
     @classmethod
     def get_or_create(cls, ref, parent_container, **kwargs):
         """
         Here, objects are created within a parent container.
         For exemple, the text, or a sample, or a lexicon, ecc.
-        The store field is build from the name of the class.
+        The store field is build from the name of the class, and the objects
+        are stored by pk (see make_pk).
         """
-        key, pk = cls.make_key(ref)
+        pk = cls.make_pk(ref)
         store_field_name = "_store_%s" % cls.__name__.lower()
-        if not hasattr(parent_container, store_field_name):
-            setattr(parent_container, store_field_name, {})
-        store_field = getattr(parent_container, store_field_name)
-        if key in store_field:
-            return (store_field[key], False)
-        else:
-            store_field[key] = cls(pk, **kwargs)
-            return (store_field[key], True)
+        try:
+            store_field = getattr(parent_container, store_field_name)
+        except AttributeError:
+            store_field = {}
+            setattr(parent_container, store_field_name, store_field)
+        try:
+            return (store_field[pk], False)
+        except KeyError:
+            store_field[pk] = obj = cls(pk, **kwargs)
+            return (obj, True)
 
     @classmethod
     def sort(cls, seq, attr, reverse=True):
@@ -97,17 +175,29 @@ class RetrievableObject(object):
             intermed.reverse()
         return [tup[-1] for tup in intermed]
 
-    @classmethod
-    def make_key(cls, expression):  # TODO Optimize me !
+    @staticmethod
+    def make_pk(expression):
         """
         Make a standardization in the expression to return a tuple who maximise
         maching possibilities.
         expression must be a list or tuple, or string or unicode
         """
-        if not isinstance(expression, (list, tuple)):
-            expression = unicode(expression).split()
-        expression = tuple(expression)
-        return "%s__%s" % (cls.__name__, expression), expression
+        if isinstance(expression, tuple):
+            return expression
+        elif isinstance(expression, list):
+            return tuple(expression)
+        elif isinstance(expression, unicode):
+            return tuple(expression.split())
+        return tuple(unicode(expression).split())
+
+    @classmethod
+    def make_key(cls, expression):
+        """
+        Return a string key, unique among all the classes, and the pk.
+        The stores don't use it anymore, as they are one per class.
+        """
+        pk = cls.make_pk(expression)
+        return "%s__%s" % (cls.__name__, pk), pk
 
     def __str__(self):
         return self.__unicode__().encode("utf-8")
@@ -117,6 +207,7 @@ class Sample(RetrievableObject):
     """
     A sentence of the text.
     """
+    __slots__ = ("id", "tokens", "_len", "tag", "parent")
 
     def __init__(self, pk, parent=None, **kwargs):
         self.id = pk
@@ -124,16 +215,6 @@ class Sample(RetrievableObject):
         self._len = None  # For caching
         self.tag = None
         self.parent = parent
-        # This field is used  just in training mode.
-        # The idea is : every time a token with wrong tag is processed but
-        # not corrected, we store his index, to prevent from reprocessing it until
-        # the sample has changed.
-        # Maybe, for design purpose, this field can be added by trainer or
-        # whe should subclass the Sample with a TrainerSample...
-        self._trainer_processed = set()
-        # If each errors in the sample are processed but not corrected, it's not
-        # necessary to reprocess there errors until the sample hasn't changed.
-        self._trainer_candidate = True
 
     def __unicode__(self):
         return u" ".join([unicode(t) for t in self.tokens])
@@ -167,7 +248,9 @@ class Sample(RetrievableObject):
         return 0 <= pos < len(self)
 
     def meaning_words_count(self):
-        return len([t for t in self.tokens if t.has_meaning()])
+        # The features are computed with the stemms, see Token.compute_features
+        return len([t for t in self.tokens
+                    if (t.has_meaning() if t.features is None else t.features & MEANING)])
 
     def is_token(self, stemm, position):
         """
@@ -185,6 +268,30 @@ class Sample(RetrievableObject):
         end = min(len(self), position + 5)
         return u" ".join([t.__urepr__() for t in self[begin:end]])
 
+    def reset_trainer_status(self):
+        """
+        Called by the rules each time a token of this sample is modified.
+        Nothing to reset out of training, see TrainerSample.
+        """
+        pass
+
+
+class TrainerSample(Sample):
+    """
+    A sentence of a manually tagged text, with the status used by the trainers.
+    """
+    __slots__ = ("_trainer_processed", "_trainer_candidate")
+
+    def __init__(self, pk, parent=None, **kwargs):
+        super(TrainerSample, self).__init__(pk, parent=parent, **kwargs)
+        # Every time a token with wrong tag is processed but not corrected,
+        # we store his index, to prevent from reprocessing it until the sample
+        # has changed.
+        self._trainer_processed = set()
+        # If each errors in the sample are processed but not corrected, it's not
+        # necessary to reprocess there errors until the sample hasn't changed.
+        self._trainer_candidate = True
+
     def get_errors(self, attr="tag"):
         """
         Retrieve errors, comparing attr and verified_attr.
@@ -231,18 +338,24 @@ class Token(RetrievableObject):
     """
     Simplest element of a text.
     """
+    __slots__ = ("id", "verified_tag", "verified_lemme", "original", "lemme",
+                 "parent", "position", "start", "end", "tag", "stemm",
+                 "features")
 
-    def __init__(self, pk, original, parent=None, position=0, **kwargs):
+    def __init__(self, pk, original, parent=None, position=0, start=None,
+                 end=None, **kwargs):
         """
-        pk = unique string representing object (used to store in cache)
+        pk = unique key of the object (eg. its index in the text)
         original = raw string of token, when used in training mode, has tag and
         lemme attached, eg. word/tag/lemme
         parent = the parent sample; can be omitted here, but is needed for using
         the token, so it have to be setted manually if not passed here
         position = the position of the token in the parent sample (O indexed)
+        start, end = the offsets of the token in the normalized text, if known
         """
         self.id = pk
         self.verified_tag = None
+        self.verified_lemme = None
         orig = original.split("/")
         self.original = orig[0]
         self.lemme = orig[0]  # Default value
@@ -252,8 +365,10 @@ class Token(RetrievableObject):
             self.verified_lemme = len(orig) > 2 and orig[2] or self.original
         self.parent = parent
         self.position = position
+        self.start = start
+        self.end = end
         self.tag = ""
-        self._len = None
+        self.features = None
 
     def __unicode__(self):
         return unicode(self.lemme)
@@ -356,9 +471,7 @@ class Token(RetrievableObject):
         return not self.__eq__(y)
 
     def __len__(self):
-        if self._len is None:
-            self._len = len(self.original)
-        return self._len
+        return len(self.original)
 
     def __getitem__(self, key):
         return self.original.__getitem__(key)
@@ -371,7 +484,7 @@ class Token(RetrievableObject):
         # We take words < 2 letters only if it's a number
         # We don't take tools words (by tag)
         # We don't take être and avoir
-        return self.lemme not in usual_words \
+        return self.lemme not in USUAL_WORDS \
                and (len(self.lemme) >= 2 or self.lemme.isdigit())\
                and not self.is_tool_word() \
                and not self.is_etre() \
@@ -381,55 +494,20 @@ class Token(RetrievableObject):
         """
         Try to define if this word is a "mot outil".
         """
-        tool_tags = [
-            "DTN:sg",
-            "DTN:pl",
-            "DTC:sg",
-            "DTC:pl",
-            "PLU",
-            "COO",
-            "PREP",
-            "REL",
-            "SUB",
-            "PRO:sg",
-            "PRO:pl",
-            "PRV:sg"
-            "PRV:pl"
-        ]
-        return self.tag in tool_tags or self.original in usual_words \
-                         or (self.position == 0 and self.lower() in usual_words)
+        return self.tag in TOOL_TAGS or self.original in USUAL_WORDS \
+                         or (self.position == 0 and self.lower() in USUAL_WORDS)
 
     def is_verb(self):
         """
         We don't take in count the verbs Etre and Avoir.
         """
-        return self.tag in [
-            "VCJ:sg",
-            "VCJ:pl",
-            "PAR:sg",
-            "PAR:pl",
-            "VNCFF",
-            "VNCNT",
-        ]
+        return self.tag in VERB_TAGS
 
     def is_etre(self):
-        return self.tag in [
-            "ECJ:sg",
-            "ECJ:pl",
-            "EPAR:sg",
-            "ENCFF",
-            "ENCNT",
-        ]
+        return self.tag in ETRE_TAGS
 
     def is_avoir(self):
-        return self.tag in [
-            "ACJ:sg",
-            "ACJ:pl",
-            "APAR:sg",
-            "APAR:pl",
-            "ANCFF",
-            "ANCNT",
-        ]
+        return self.tag in AVOIR_TAGS
 
     def has_meaning_alone(self):
         """
@@ -444,6 +522,33 @@ class Token(RetrievableObject):
         """
         return self.tag[:3] == "SBP"
 
+    def compute_features(self):
+        """
+        Compute the flags of the predicates above (MEANING, TOOL_WORD, etc.),
+        store them in self.features and return them.
+        Must be called again if the tag or the lemme of the token change.
+        """
+        features = 0
+        if self.is_tool_word():
+            features |= TOOL_WORD
+        if self.tag in VERB_TAGS:
+            features |= VERB
+        if self.tag in ETRE_TAGS:
+            features |= ETRE
+        if self.tag in AVOIR_TAGS:
+            features |= AVOIR
+        if self.tag[:3] == "SBP":
+            features |= TITLE
+        lemme = self.lemme
+        if not features & (TOOL_WORD | ETRE | AVOIR) \
+           and lemme not in USUAL_WORDS \
+           and (len(lemme) >= 2 or lemme.isdigit()):
+            features |= MEANING
+            if len(lemme) >= 2:
+                features |= MEANING_ALONE
+        self.features = features
+        return features
+
     def is_neighbor(self, candidates):
         """
         Return true if word appears with right neighbours.
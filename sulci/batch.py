@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tagging and lemmatization of many samples over a pool of processes.
+
+The rules never look outside the sample of a token, so the samples, of many
+texts or of one long text, can be processed independently, in any process.
+
+The pool is created once the lexicon and the rules are loaded: the workers are
+forked from the current process and share them copy-on-write, instead of
+loading them again. Only the words go to the workers, and only the tags and
+lemmes come back, in the order of the samples.
+"""
+import multiprocessing
+
+from sulci.base import Sample, Token
+
+# Set in the parent process just before forking the workers
+_models = {}
+
+
+def _process(payload):
+    """
+    Tag and/or lemmatize one sample in a worker.
+    payload is (words, verified_tags, tags): tags is None if the sample has
+    to be tagged, verified_tags is None if there are none.
+    Return (tags, lemmes), lemmes is None without lemmatizer.
+    """
+    words, verified_tags, tags = payload
+    sample = Sample(0)
+    for idx, word in enumerate(words):
+        token = Token(idx, word)
+        if verified_tags is not None:
+            token.verified_tag = verified_tags[idx]
+        if tags is not None:
+            token.tag = tags[idx]
+        sample.append(token)
+    postagger = _models.get("postagger")
+    if postagger is not None:
+        postagger.tag_all(sample, **_models["tag_options"])
+    lemmes = None
+    lemmatizer = _models.get("lemmatizer")
+    if lemmatizer is not None:
+        lemmatizer.do(sample.tokens)
+        lemmes = [t.lemme for t in sample]
+    return [t.tag for t in sample], lemmes
+
+
+def iter_batch_samples(items):
+    """
+    Yield the samples of items, which can be samples (or lists of tokens), or
+    texts with a samples attribute.
+    """
+    for item in items:
+        if hasattr(item, "samples"):
+            for sample in item.samples:
+                yield sample
+        else:
+            yield item
+
+
+class BatchProcessor(object):
+    """
+    Tag (with postagger) and/or lemmatize (with lemmatizer) samples over a pool
+    of processes.
+
+    Use it as a context manager to keep the same pool for many batches:
+
+        with BatchProcessor(postagger, lemmatizer) as processor:
+            processor.process(texts)
+    """
+
+    def __init__(self, postagger=None, lemmatizer=None, processes=None,
+                 lexical=True, contextual=True):
+        """
+        processes defaults to the number of CPUs; with 1, the samples are
+        processed in the current process.
+        """
+        if postagger is None and lemmatizer is None:
+            raise ValueError("A postagger or a lemmatizer is needed.")
+        self.postagger = postagger
+        self.lemmatizer = lemmatizer
+        self.processes = processes or multiprocessing.cpu_count()
+        self.tag_options = {"lexical": lexical, "contextual": contextual}
+        self.pool = None
+
+    def load(self):
+        """
+        Load the lexicon and the rules in the current process.
+        """
+        if self.postagger is not None:
+            self.postagger.lexicon.loaded
+            self.postagger.tag_all([], **self.tag_options)
+        if self.lemmatizer is not None:
+            self.lemmatizer.lexicon.loaded
+            self.lemmatizer.do([])
+
+    def open(self):
+        if self.pool is None and self.processes > 1:
+            self.load()
+            _models.clear()
+            _models.update(postagger=self.postagger, lemmatizer=self.lemmatizer,
+                           tag_options=self.tag_options)
+            self.pool = multiprocessing.Pool(self.processes)
+        return self
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        _models.clear()
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def process(self, items, chunksize=None):
+        """
+        Tag and/or lemmatize items (see iter_batch_samples), and return them.
+        """
+        items = list(items)
+        samples = list(iter_batch_samples(items))
+        if self.processes == 1 or len(samples) < 2:
+            for sample in samples:
+                if self.postagger is not None:
+                    self.postagger.tag_all(sample, **self.tag_options)
+                if self.lemmatizer is not None:
+                    self.lemmatizer.do(list(sample))
+            return items
+        payloads = []
+        for sample in samples:
+            verified_tags = [t.verified_tag for t in sample]
+            if not any(verified_tags):
+                verified_tags = None
+            tags = None if self.postagger is not None else [t.tag for t in sample]
+            payloads.append(([t.original for t in sample], verified_tags, tags))
+        if chunksize is None:
+            # A few chunks by process, to balance the load
+            chunksize = max(1, len(payloads) // (self.processes * 4))
+        opened = self.pool is None
+        if opened:
+            self.open()
+        try:
+            results = self.pool.imap(_process, payloads, chunksize)
+            for sample, (tags, lemmes) in zip(samples, results):
+                for idx, token in enumerate(sample):
+                    token.tag = tags[idx]
+                    if lemmes is not None:
+                        token.lemme = lemmes[idx]
+        finally:
+            if opened:
+                self.close()
+        return items
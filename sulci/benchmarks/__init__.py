@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the sulci processing chain.
+
+Run them with `python sulci/benchmarks/run.py`, see the --help for options.
+"""
+import os
+import time
+import random
+
+from sulci.utils import get_dir, load_file
+from sulci.log import sulci_logger
+
+
+def corpus_files(extension=".crp"):
+    """
+    Return the relative paths of the corpus files with this extension.
+    """
+    path = os.path.join(get_dir(__file__), os.pardir, "corpus")
+    return sorted(os.path.join("corpus", f) for f in os.listdir(path)
+                  if f.endswith(extension))
+
+
+def corpus_raw_texts(extension=".crp"):
+    """
+    Rebuild the raw texts of the corpus files, by removing the manual tags
+    and lemmes.
+    """
+    texts = []
+    for path in corpus_files(extension):
+        tokens = load_file(path).split()
+        texts.append(u" ".join(t.split(u"/")[0] for t in tokens))
+    return texts
+
+
+def synthetic_article(size, seed=1977):
+    """
+    Build a big CMS-like article (about `size` chars), from the corpus texts,
+    with paragraphs, some markup, entities and double quotes.
+    """
+    rand = random.Random(seed)
+    sentences = []
+    for text in corpus_raw_texts():
+        sentences += [s.strip() + u" ." for s in text.split(u" . ") if s.strip()]
+    pieces = []
+    length = 0
+    while length < size:
+        sentence = rand.choice(sentences)
+        kind = rand.random()
+        if kind < 0.1:
+            sentence = u'<p class="chapo">"%s"</p>' % sentence
+        elif kind < 0.2:
+            sentence = u"<p>%s <a href=\"/article/%d\">l&#39;article</a></p>" \
+                       % (sentence, rand.randint(1, 100000))
+        elif kind < 0.25:
+            sentence = u"<p><em>%s</em> &eacute;crit-il.</p>" % sentence
+        else:
+            sentence = u"<p>%s</p>" % sentence
+        pieces.append(sentence)
+        length += len(sentence) + 1
+    return u"\n".join(pieces)
+
+
+def best_of(func, *args, **kwargs):
+    """
+    Call func `repeat` times (default 3), and return its best duration (in
+    seconds) and its last result.
+    """
+    repeat = kwargs.pop("repeat", 3)
+    best = None
+    result = None
+    for i in xrange(repeat):
+        before = time.time()
+        result = func(*args, **kwargs)
+        duration = time.time() - before
+        if best is None or duration < best:
+            best = duration
+    return best, result
+
+
+def report(label, duration, amount=None, unit=None, per_minute=False):
+    """
+    Log one line of benchmark result, with the throughput (by second, or by
+    minute) if an amount is given.
+    """
+    line = u"%-45s %8.3f s" % (label, duration)
+    if amount is not None and per_minute:
+        line += u"  %12.0f %s/min" % (amount * 60 / max(duration, 1e-9), unit)
+    elif amount is not None:
+        line += u"  %12.0f %s/s" % (amount / max(duration, 1e-9), unit)
+    sulci_logger.info(line, "WHITE")
+
+
+def title(label):
+    sulci_logger.info(label, "YELLOW", True)
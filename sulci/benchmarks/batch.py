@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+Scaling of the batch tagging and lemmatization with the number of processes.
+"""
+import multiprocessing
+
+from sulci.base import TextManager
+from sulci.lexicon import Lexicon
+from sulci.pos_tagger import PosTagger
+from sulci.lemmatizer import Lemmatizer
+from sulci.batch import BatchProcessor
+from sulci.textutils import iter_tokens
+from sulci.benchmarks import corpus_raw_texts, synthetic_article, best_of, \
+                             report, title
+
+
+def process(processor, samples):
+    processor.process(samples)
+    return [(t.tag, t.lemme) for sample in samples for t in sample]
+
+
+def run(size=500000, **kwargs):
+    lexicon = Lexicon()
+    postagger = PosTagger(lexicon=lexicon)
+    lemmatizer = Lemmatizer(lexicon)
+    counts = [1]
+    while counts[-1] * 2 <= max(multiprocessing.cpu_count(), 2):
+        counts.append(counts[-1] * 2)
+    datasets = [
+        ("corpus (*.crp)", corpus_raw_texts()),
+        ("synthetic article (%d chars)" % size, [synthetic_article(size)]),
+    ]
+    for label, texts in datasets:
+        samples = []
+        for text in texts:
+            samples += list(TextManager().iter_samples(iter_tokens(text)))
+        tokens = sum(len(s) for s in samples)
+        title(u"Batch processing: %s, %d samples, %d CPUs" % (
+              label, len(samples), multiprocessing.cpu_count()))
+        reference = None
+        for processes in counts:
+            with BatchProcessor(postagger, lemmatizer, processes) as processor:
+                duration, result = best_of(process, processor, samples)
+            if reference is None:
+                reference = result
+            elif result != reference:
+                raise AssertionError("Results differ from the in process ones")
+            report(u"%d process(es)" % processes, duration, tokens, "tokens")
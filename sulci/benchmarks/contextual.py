@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput of the contextual tagging: the rules applied one after the other,
+versus the ContextualTransducer.
+"""
+from sulci.base import TextManager
+from sulci.lexicon import Lexicon
+from sulci.pos_tagger import PosTagger
+from sulci.rules_templates import ContextualTemplateGenerator
+from sulci.textutils import iter_tokens
+from sulci.benchmarks import corpus_raw_texts, synthetic_article, best_of, \
+                             report, title
+
+
+def sequential(tokens, tags, tagger):
+    for token, tag in zip(tokens, tags):
+        token.tag = tag
+    for rule in ContextualTemplateGenerator.load():
+        template, _ = ContextualTemplateGenerator.get_instance(rule)
+        template.apply_rule(tokens, rule)
+    return [t.tag for t in tokens]
+
+
+def indexed(tokens, tags, tagger):
+    for token, tag in zip(tokens, tags):
+        token.tag = tag
+    tagger.apply_rules(tokens, tagger.compiled_rules(ContextualTemplateGenerator))
+    return [t.tag for t in tokens]
+
+
+def transducer(tokens, tags, tagger):
+    for token, tag in zip(tokens, tags):
+        token.tag = tag
+    tagger.transducer.apply(tokens)
+    return [t.tag for t in tokens]
+
+
+def run(size=500000, **kwargs):
+    tagger = PosTagger(lexicon=Lexicon())
+    datasets = [
+        ("corpus (*.crp)", corpus_raw_texts()),
+        ("synthetic article (%d chars)" % size, [synthetic_article(size)]),
+    ]
+    for label, texts in datasets:
+        tokens = []
+        for text in texts:
+            tokens += TextManager().instantiate_text(iter_tokens(text))[1]
+        tagger.tag_all(tokens, contextual=False)
+        tags = [t.tag for t in tokens]
+        title(u"Contextual tagging: %s, %d rules" % (label, len(tagger.transducer)))
+        sequential_time, reference = best_of(sequential, tokens, tags, tagger, repeat=1)
+        indexed_time, indexed_result = best_of(indexed, tokens, tags, tagger)
+        transducer_time, result = best_of(transducer, tokens, tags, tagger)
+        if result != reference or indexed_result != reference:
+            raise AssertionError("Tags differ from the sequential rules")
+        report(u"rules one after the other", sequential_time, len(tokens), "tokens")
+        report(u"rules indexed by from_tag", indexed_time, len(tokens), "tokens")
+        report(u"ContextualTransducer", transducer_time, len(tokens), "tokens")
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Edit distance between words of the corpus vocabulary.
+
+The previous implementation (full matrix stored in a dict) is kept here as
+reference.
+"""
+import random
+
+from sulci.textutils import edit_distance, edit_distances
+from sulci.benchmarks import corpus_raw_texts, best_of, report, title
+
+
+def legacy_lev(s1, s2):
+    s1 = ' ' + s1
+    s2 = ' ' + s2
+    d = {}
+    S = len(s1)
+    T = len(s2)
+    for i in range(S):
+        d[i, 0] = i
+    for j in range(T):
+        d[0, j] = j
+    for j in range(1, T):
+        for i in range(1, S):
+            if s1[i] == s2[j]:
+                d[i, j] = d[i - 1, j - 1]
+            else:
+                d[i, j] = min(d[i - 1, j] + 1, d[i, j - 1] + 1, d[i - 1, j - 1] + 1)
+    return d[S - 1, T - 1]
+
+
+def legacy(words, vocabulary, max_distance):
+    return [[(c, legacy_lev(w, c)) for c in vocabulary
+             if legacy_lev(w, c) <= max_distance] for w in words]
+
+
+def current(words, vocabulary, max_distance):
+    return [[(c, edit_distance(w, c)) for c in vocabulary
+             if edit_distance(w, c) <= max_distance] for w in words]
+
+
+def batch(words, vocabulary, max_distance):
+    return [edit_distances(w, vocabulary, max_distance) for w in words]
+
+
+def run(size=500000, max_distance=2, **kwargs):
+    vocabulary = sorted(set(w for t in corpus_raw_texts() for w in t.split()
+                            if len(w) > 3))
+    words = random.Random(1977).sample(vocabulary, 20)
+    title(u"Edit distance: %d words against %d words, max distance %d"
+          % (len(words), len(vocabulary), max_distance))
+    comparisons = len(words) * len(vocabulary)
+    legacy_time, reference = best_of(legacy, words, vocabulary, max_distance, repeat=1)
+    current_time, result = best_of(current, words, vocabulary, max_distance)
+    batch_time, batch_result = best_of(batch, words, vocabulary, max_distance)
+    if result != reference or batch_result != reference:
+        raise AssertionError("Distances differ from the legacy implementation")
+    report(u"legacy (lev, mode 3)", legacy_time, comparisons, "comparisons")
+    report(u"edit_distance", current_time, comparisons, "comparisons")
+    report(u"edit_distances (batch, with cutoff)", batch_time, comparisons, "comparisons")
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput of the extraction of the text content of HTML article bodies.
+
+Compared to the previous path (unescape_entities then strip_tags), which is
+kept in sulci.textutils.
+"""
+import random
+
+from sulci.textutils import strip_tags, unescape_entities, extract_text
+from sulci.benchmarks import synthetic_article, best_of, report, title
+
+SCRIPT = u"""<script type="text/javascript">
+var _gaq = _gaq || []; _gaq.push(['_setAccount', 'UA-XXXXX-X']);
+if (a < b && b > c) { document.write("<p>" + c + "</p>"); }
+</script>"""
+STYLE = u"""<style type="text/css">
+.chapo { font-weight: bold; } p > em { color: #333; }
+</style>"""
+COMMENT = u"<!-- pub: habillage, emplacement %d -->"
+
+
+def cms_article(size, seed=1977):
+    """
+    A synthetic article, with the scripts, styles and comments the CMS
+    usually put in the middle of the bodies.
+    """
+    rand = random.Random(seed)
+    paragraphs = synthetic_article(size, seed=seed).split(u"\n")
+    final = []
+    for idx, paragraph in enumerate(paragraphs):
+        final.append(paragraph)
+        if idx % 20 == 0:
+            final.append(rand.choice([SCRIPT, STYLE, COMMENT % idx]))
+    return u"\n".join(final)
+
+
+def legacy(texts):
+    return [strip_tags(unescape_entities(t)) for t in texts]
+
+
+def current(texts):
+    return [extract_text(t) for t in texts]
+
+
+def run(size=500000, **kwargs):
+    texts = [cms_article(size, seed=seed) for seed in xrange(3)]
+    title(u"HTML text extraction: CMS articles (%d chars)" % size)
+    chars = sum(len(t) for t in texts)
+    legacy_time, reference = best_of(legacy, texts)
+    current_time, result = best_of(current, texts)
+    report(u"legacy (unescape_entities + strip_tags)", legacy_time, chars, "chars")
+    report(u"extract_text", current_time, chars, "chars")
+    dropped = sum(len(r) for r in reference) - sum(len(r) for r in result)
+    report(u"chars of scripts and styles dropped: %d" % dropped, current_time)
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput of the text instantiation (tokens and samples creation), and of the
+lookups in the RetrievableObject stores.
+
+The previous string keys ("Class__(u'key',)") are kept here as reference.
+"""
+from functools import partial
+
+from sulci.base import TextManager, Sample, Token
+from sulci.textmining import Stemm
+from sulci.utils import load_file
+from sulci.benchmarks import corpus_files, best_of, report, title
+
+
+def legacy_make_key(cls, expression):
+    if not isinstance(expression, (list, tuple)):
+        expression = unicode(expression).split()
+    expression = tuple(expression)
+    return "%s__%s" % (cls.__name__, expression), expression
+
+
+def legacy_get_or_create(cls, ref, parent_container, **kwargs):
+    key, pk = legacy_make_key(cls, ref)
+    store_field_name = "_legacy_store_%s" % cls.__name__.lower()
+    if not hasattr(parent_container, store_field_name):
+        setattr(parent_container, store_field_name, {})
+    store_field = getattr(parent_container, store_field_name)
+    if key in store_field:
+        return (store_field[key], False)
+    else:
+        store_field[key] = cls(pk, **kwargs)
+        return (store_field[key], True)
+
+
+def legacy_instantiate(tokens):
+    samples = []
+    current_sample = None
+    previous_token = None
+    for idx, tk in enumerate(tokens):
+        t = Token(legacy_make_key(Token, idx)[1], original=tk)
+        if current_sample is None or t.begin_of_sample(previous_token):
+            current_sample = Sample(legacy_make_key(Sample, len(samples))[1])
+            samples.append(current_sample)
+        current_sample.append(t)
+        previous_token = t
+    return samples
+
+
+def current_instantiate(tokens):
+    return TextManager().instantiate_text(tokens)[0]
+
+
+class Container(object):
+    pass
+
+
+def stemms_lookups(get_or_create, keys):
+    container = Container()
+    for key in keys:
+        get_or_create(key, container, text=None)
+    return len(getattr(container, "_store_stemm", None)
+               or getattr(container, "_legacy_store_stemm"))
+
+
+def run(**kwargs):
+    tokens = []
+    for path in corpus_files():
+        tokens += load_file(path).split()
+    title(u"Text instantiation: %d tokens of the corpus" % len(tokens))
+    legacy_time, reference = best_of(legacy_instantiate, tokens)
+    current_time, result = best_of(current_instantiate, tokens)
+    if [len(s) for s in result] != [len(s) for s in reference]:
+        raise AssertionError("Samples differ from the legacy implementation")
+    report(u"legacy (string keys)", legacy_time, len(tokens), "tokens")
+    report(u"instantiate_text (positional pk)", current_time, len(tokens), "tokens")
+
+    # (lemme, tag) keys, as built by StemmedText.create_stemm
+    keys = [tuple((t.split(u"/") + [u"", u""])[:2]) for t in tokens]
+    title(u"Stemm stores: %d lookups" % len(keys))
+    legacy_time, reference = best_of(stemms_lookups, partial(legacy_get_or_create, Stemm), keys)
+    current_time, result = best_of(stemms_lookups, Stemm.get_or_create, keys)
+    if result != reference:
+        raise AssertionError("Stores differ from the legacy implementation")
+    report(u"legacy (string keys)", legacy_time, len(keys), "lookups")
+    report(u"get_or_create (tuple keys)", current_time, len(keys), "lookups")
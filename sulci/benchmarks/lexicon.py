@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Cold start of the lexicon: parsing lexicon.lxc and computing the affixes and
+factors, versus opening the compiled lexicon.
+"""
+import shutil
+import tempfile
+
+from sulci.lexicon import Lexicon
+from sulci.compiled_lexicon import CompiledLexicon, lexicon_paths
+from sulci.benchmarks import best_of, report, title
+
+
+def reset(path):
+    for cache in (Lexicon._loaded, Lexicon._afixes, Lexicon._factors):
+        cache.pop(path, None)
+
+
+def start(path):
+    """
+    Load the lexicon at path, and return its words mapping.
+    """
+    reset(path)
+    lexicon = Lexicon(path)
+    lexicon.afixes
+    lexicon.factors
+    return lexicon.loaded
+
+
+def lookups(loaded, words):
+    return [loaded[word].default_tag for word in words]
+
+
+def run(**kwargs):
+    path = tempfile.mkdtemp()
+    try:
+        shutil.copy(lexicon_paths("corpus")[0], path)
+        words = list(start(path))
+        title(u"Lexicon loading: %d words" % len(words))
+        text_time, text = best_of(start, path)
+        _, reference = best_of(lookups, text, words)
+        Lexicon(path).compile()
+        compiled_time, compiled = best_of(start, path)
+        if not isinstance(compiled, CompiledLexicon):
+            raise AssertionError("The compiled lexicon is not used")
+        report(u"parse lexicon.lxc", text_time)
+        report(u"open lexicon.lxb", compiled_time)
+        for label, loaded in (("lookups (dict)", text), ("first lookups (lxb)", compiled),
+                              ("next lookups (lxb)", compiled)):
+            duration, result = best_of(lookups, loaded, words, repeat=1)
+            if result != reference:
+                raise AssertionError("The compiled lexicon differs from lexicon.lxc")
+            report(label, duration, len(words), "words")
+    finally:
+        reset(path)
+        shutil.rmtree(path)
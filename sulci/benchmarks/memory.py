@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Memory footprint of the text objects (tokens, samples, stemms), in bytes per
+token.
+
+The objects use __slots__; the legacy layout, with a __dict__ per instance,
+is estimated from the same attributes, to compare both. The same texts are
+also measured as ColumnarText arrays, and tagged and lemmatized both ways.
+"""
+import sys
+
+from sulci.base import TextManager
+from sulci.textmining import StemmedText
+from sulci.textutils import iter_tokens
+from sulci.lexicon import Lexicon
+from sulci.pos_tagger import PosTagger
+from sulci.lemmatizer import Lemmatizer
+from sulci.columnar import ColumnarText
+from sulci.benchmarks import corpus_raw_texts, synthetic_article, best_of, \
+                             report, title
+from sulci.log import sulci_logger
+
+
+class WithDict(object):
+    pass
+
+# Size of an instance with a __dict__, without the dict itself
+DICT_INSTANCE_SIZE = sys.getsizeof(WithDict())
+
+
+def slots_size(obj):
+    """
+    Size of the object itself, its attributes values are not counted.
+    """
+    return sys.getsizeof(obj)
+
+
+def dict_size(obj):
+    """
+    Estimated size of the same object, if its attributes were stored in a
+    __dict__.
+    """
+    attributes = {}
+    for cls in type(obj).__mro__:
+        for name in getattr(cls, "__slots__", ()):
+            if hasattr(obj, name):
+                attributes[name] = getattr(obj, name)
+    return DICT_INSTANCE_SIZE + sys.getsizeof(attributes)
+
+
+def objects(texts):
+    final = []
+    for text in texts:
+        final += text.samples
+        final += text.tokens
+        final += text.stemms
+    return final
+
+
+def footprint(texts, size_of):
+    """
+    Return the bytes per token of the tokens, samples and stemms.
+    """
+    tokens = sum(len(t.tokens) for t in texts)
+    return 1.0 * sum(size_of(o) for o in objects(texts)) / tokens
+
+
+def columnar_footprint(texts):
+    """
+    Return the bytes per token of the same texts, stored as ColumnarText.
+    The strings of the vocabulary are shared, so they are not counted.
+    """
+    tokens = 0
+    size = 0
+    for text in texts:
+        columnar = ColumnarText.from_samples(text.samples)
+        tokens += len(columnar)
+        for name in ColumnarText.COLUMNS + ColumnarText.INT_COLUMNS + ("bounds",):
+            column = getattr(columnar, name)
+            size += column.itemsize * len(column)
+    return 1.0 * size / tokens
+
+
+def tag_objects(raw_texts, postagger, lemmatizer):
+    for raw in raw_texts:
+        _, tokens = TextManager().instantiate_text(list(iter_tokens(raw)))
+        postagger.tag_all(tokens)
+        lemmatizer.do(tokens)
+
+
+def tag_columnar(raw_texts, postagger, lemmatizer):
+    for raw in raw_texts:
+        text = ColumnarText.from_tokens(iter_tokens(raw))
+        text.tag_all(postagger)
+        text.lemmatize(lemmatizer)
+
+
+def run(size=500000, **kwargs):
+    lexicon = Lexicon()
+    postagger = PosTagger(lexicon=lexicon)
+    lemmatizer = Lemmatizer(lexicon)
+
+    def make(raw_texts):
+        return [StemmedText(t, postagger, lemmatizer, lexicon) for t in raw_texts]
+
+    datasets = [
+        ("corpus (*.crp)", corpus_raw_texts()),
+        ("synthetic article (%d chars)" % size, [synthetic_article(size)]),
+    ]
+    for label, raw_texts in datasets:
+        title(u"Memory footprint: %s" % label)
+        duration, texts = best_of(make, raw_texts, repeat=1)
+        tokens = sum(len(t.tokens) for t in texts)
+        sulci_logger.info(u"%-45s %8d tokens in %.3f s" % (u"StemmedText", tokens, duration), "WHITE")
+        for name, size_of in (("legacy (__dict__, estimated)", dict_size),
+                              ("__slots__", slots_size)):
+            sulci_logger.info(u"%-45s %8.1f bytes/token" % (name, footprint(texts, size_of)), "WHITE")
+        sulci_logger.info(u"%-45s %8.1f bytes/token" % ("ColumnarText", columnar_footprint(texts)), "WHITE")
+        for name, func in (("tag and lemmatize Token objects", tag_objects),
+                           ("tag and lemmatize ColumnarText", tag_columnar)):
+            duration, _ = best_of(func, raw_texts, postagger, lemmatizer)
+            report(name, duration, tokens, "tokens")
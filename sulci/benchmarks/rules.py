@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+Cold start of the rules: parsing the rules files, versus loading the
+RulesArtifact.
+"""
+import os
+import shutil
+import tempfile
+
+from sulci.rules_templates import RulesArtifact, ContextualTemplateGenerator, \
+                                  LexicalTemplateGenerator, LemmatizerTemplateGenerator
+from sulci.utils import load_file
+from sulci.benchmarks import best_of, report, title
+
+GENERATORS = (ContextualTemplateGenerator, LexicalTemplateGenerator,
+              LemmatizerTemplateGenerator)
+
+
+def parse():
+    final = []
+    for generator in GENERATORS:
+        rules = generator.parse_rules(load_file(generator.RULES_FILE))
+        final.append([generator.uncompile(rule) for rule in rules])
+    return final
+
+
+def artifact():
+    RulesArtifact._entries = None  # Force the reading of the file
+    return [RulesArtifact.get(generator)[1] for generator in GENERATORS]
+
+
+def run(**kwargs):
+    reference = parse()
+    title(u"Rules loading: %d rules" % sum(len(r) for r in reference))
+    parse_time, reference = best_of(parse, repeat=10)
+    path, default_path = tempfile.mkdtemp(), RulesArtifact.PATH
+    try:
+        RulesArtifact.PATH = os.path.join(path, "rules.artifact")
+        RulesArtifact.build()
+        artifact_time, result = best_of(artifact, repeat=10)
+    finally:
+        RulesArtifact.PATH = default_path
+        RulesArtifact._entries = None
+        shutil.rmtree(path)
+    if result != reference:
+        raise AssertionError("The artifact differs from the rules files")
+    report(u"parse the rules files", parse_time)
+    report(u"load the RulesArtifact", artifact_time)
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+
+import os
+import argparse
+
+os.environ.setdefault("SULCI_CONFIG_MODULE", "sulci.config.example")
+
+from sulci.benchmarks import textutils, html, distance, thesaurus, memory, \
+                             instantiate, contextual, rules, batch, lexicon, \
+                             training
+
+BENCHMARKS = {
+    "textutils": textutils,
+    "html": html,
+    "distance": distance,
+    "thesaurus": thesaurus,
+    "memory": memory,
+    "instantiate": instantiate,
+    "contextual": contextual,
+    "rules": rules,
+    "batch": batch,
+    "lexicon": lexicon,
+    "training": training,
+}
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Run sulci benchmarks.")
+    parser.add_argument(
+        "benchmarks",
+        nargs="*",
+        default=None,
+        help="Benchmarks to run (default: all). Choices: %s." % ", ".join(sorted(BENCHMARKS))
+    )
+    parser.add_argument(
+        "-s",
+        "--size",
+        type=int,
+        action="store",
+        dest="size",
+        default=500000,
+        help="Size (in chars) of the synthetic articles."
+    )
+    args = parser.parse_args()
+
+    for name in args.benchmarks or sorted(BENCHMARKS):
+        BENCHMARKS[name].run(size=args.size)
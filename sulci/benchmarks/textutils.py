@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput of the normalization and tokenization of raw texts.
+
+The previous implementation, made of successive substitutions, is kept here
+as reference, to check that the outputs are the same.
+"""
+import re
+
+from sulci.textutils import to_unicode, strip_tags, unescape_entities, \
+                            normalize_text, tokenize_text, iter_tokens
+from sulci.benchmarks import corpus_raw_texts, synthetic_article, best_of, \
+                             report, title
+
+
+def legacy_normalize_text(text):
+    text = to_unicode(text)
+    text = strip_tags(unescape_entities(text))
+    text = text.replace(u"’", u"'")
+    text = text.replace(u"qu'", u"qu' ")
+    text = re.sub(ur'(")([^ \n\.,!?]){1}', u"\xab\g<2>", text, re.U)
+    text = re.sub(ur'([^ \n]){1}(")', u"\g<1>\xbb", text, re.U)
+    text = re.sub(ur"\-t\-", u" - t - ", text, re.U)
+    text = re.sub(ur"\-(je|moi|tu|toi|il|le|elle|la|on|nous|vous|ils|elles|les|ci|là|ce)([\W])", u" - \g<1>\g<2>", text, re.U)
+    return text
+
+
+def legacy_tokenize_text(text):
+    pattern = re.compile(ur"""
+              c'est\-à\-dire(?#special case)
+              |[A-Z]{1}\.(?#M., R., etc.)
+              |[\d]+(?:[,. ][\d]+)*(?#Number)
+              |[\,\.\:\(\)\!\-\?\[\];…«»"%€$]{1}(?#punct. and symbols)
+              |\w{1}[’\u2019']{1}(?#l' m', etc.)
+              |qu[’\u2019']{1}(?#qu')
+              |[\w’\u2019'\-]+(?#All others "words")
+              """, re.U | re.X)
+    return pattern.findall(text)
+
+
+def legacy(texts):
+    return [legacy_tokenize_text(legacy_normalize_text(t)) for t in texts]
+
+
+def current(texts):
+    return [tokenize_text(normalize_text(t)) for t in texts]
+
+
+def streamed(texts):
+    return [list(iter_tokens(t)) for t in texts]
+
+
+def run(size=500000, **kwargs):
+    datasets = [
+        ("corpus (*.crp)", corpus_raw_texts()),
+        ("synthetic articles (%d chars)" % size,
+         [synthetic_article(size, seed=seed) for seed in xrange(3)]),
+    ]
+    for label, texts in datasets:
+        title(u"Normalization and tokenization: %s" % label)
+        chars = sum(len(t) for t in texts)
+        legacy_time, reference = best_of(legacy, texts)
+        current_time, result = best_of(current, texts)
+        streamed_time, streamed_result = best_of(streamed, texts)
+        if result != reference or streamed_result != reference:
+            raise AssertionError("Tokens differ from the legacy implementation")
+        report(u"legacy (successive substitutions)", legacy_time, chars, "chars")
+        report(u"normalize_text + tokenize_text", current_time, chars, "chars")
+        report(u"iter_tokens", streamed_time, chars, "chars")
+        tokens = sum(len(r) for r in result)
+        report(u"tokens (iter_tokens)", streamed_time, tokens, "tokens")
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Approximate search of descriptors in the thesaurus, with the DescriptorIndex
+versus a scan of all the descriptors names.
+"""
+import random
+
+from sulci.textutils import edit_distances
+from sulci.thesaurus import DescriptorIndex
+from sulci.benchmarks import best_of, report, title
+
+
+def misspell(name, rand, max_edits=2):
+    chars = list(name)
+    for i in xrange(rand.randint(0, max_edits)):
+        position = rand.randint(0, max(0, len(chars) - 1))
+        kind = rand.randint(0, 2)
+        if kind == 0:
+            chars.insert(position, rand.choice(u"aeiourst"))
+        elif chars and kind == 1:
+            del chars[position]
+        elif chars:
+            chars[position] = rand.choice(u"aeiourst")
+    return u"".join(chars)
+
+
+def scan(names, queries, max_distance, limit):
+    final = []
+    for query in queries:
+        distances = edit_distances(query.lower(), [n.lower() for n in names], max_distance)
+        found = sorted((d, names[idx]) for idx, (n, d) in enumerate(distances))
+        final.append(found[:limit])
+    return final
+
+
+def indexed(index, queries, max_distance, limit):
+    return [index.search(q, max_distance, limit) for q in queries]
+
+
+def run(size=500000, max_distance=2, limit=10, **kwargs):
+    build_time, index = best_of(DescriptorIndex.from_file, repeat=1)
+    rand = random.Random(1977)
+    queries = [misspell(rand.choice(index.names), rand) for i in xrange(1000)]
+    title(u"Thesaurus search: %d queries in %d descriptors, max distance %d"
+          % (len(queries), len(index), max_distance))
+    report(u"DescriptorIndex build", build_time, len(index), "descriptors")
+    index_time, result = best_of(indexed, index, queries, max_distance, limit)
+    report(u"DescriptorIndex.search", index_time, len(queries), "queries")
+    scan_queries = queries[:20]
+    scan_time, reference = best_of(scan, index.names, scan_queries, max_distance, limit, repeat=1)
+    report(u"scan with edit_distances", scan_time, len(scan_queries), "queries")
+    if [[d for n, d in r] for r in result[:20]] != [[d for d, n in r] for r in reference]:
+        raise AssertionError("The index does not find the closest descriptors")
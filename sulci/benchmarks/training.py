@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Rules learned per minute by the trainers: the candidate rules tested on
+all the tokens at each step, versus their results kept up to date (see
+RulesCounts), and with the candidates screened on a part of the samples.
+"""
+import time
+
+from sulci.corpus import Corpus, TextCorpus
+from sulci.lexicon import Lexicon
+from sulci.pos_tagger import PosTagger
+from sulci.lemmatizer import Lemmatizer
+from sulci.trainers import LexicalTrainer, ContextualTrainer, LemmatizerTrainer
+from sulci.utils import load_file
+from sulci.log import sulci_logger
+from sulci.benchmarks import corpus_files, report, title
+
+TEXTS = 4  # Number of corpus texts to train on
+SCREENING = 0.25  # Fraction of the samples to screen the candidates on
+
+
+def pos_trainer(trainer_class):
+    def make(**kwargs):
+        corpus = Corpus()
+        corpus._texts = [TextCorpus(path) for path in corpus_files()[:TEXTS]]
+        return trainer_class(PosTagger(lexicon=Lexicon()), corpus, **kwargs)
+    return make
+
+
+def lemmatizer_trainer(**kwargs):
+    lemmatizer = Lemmatizer(Lexicon())
+    lemmatizer._raw_content = u" ".join(u" ".join(load_file(path).split())
+                                        for path in corpus_files(".lem.crp")[:TEXTS])
+    return LemmatizerTrainer(lemmatizer, **kwargs)
+
+
+def train(make, check_screening=False, **kwargs):
+    trainer = make(**kwargs)
+    trainer.check_screening = check_screening
+    before = time.time()
+    rules = trainer.train(export=False)  # Do not write the corpus .pdg files
+    return time.time() - before, rules, trainer
+
+
+def run(**kwargs):
+    for label, make in (("Lexical", pos_trainer(LexicalTrainer)),
+                        ("Contextual", pos_trainer(ContextualTrainer)),
+                        ("Lemmatizer", lemmatizer_trainer)):
+        full_time, reference, trainer = train(make, incremental=False)
+        title(u"%s training: %d texts, %d rules, %d candidates not tested"
+              % (label, TEXTS, len(reference), trainer.skipped_tests))
+        incremental_time, rules, _ = train(make, incremental=True)
+        if rules != reference:
+            raise AssertionError("The incremental training learned other rules")
+        report(u"test the candidates at each step", full_time, len(reference),
+               "rules", per_minute=True)
+        report(u"update the results of the rules", incremental_time, len(rules),
+               "rules", per_minute=True)
+        # Screening can select other rules, so it only speeds up the learning
+        # if it does not learn more rules
+        screened_time, rules, trainer = train(make, screening=SCREENING)
+        report(u"screen the candidates (%d%% of the samples)" % (SCREENING * 100),
+               screened_time, len(rules), "rules", per_minute=True)
+        _, _, trainer = train(make, check_screening=True, screening=SCREENING)
+        sulci_logger.info(u"%d candidates screened out, %d of %d selections changed "
+                          u"by the screening" % (trainer.screened_out,
+                          trainer.screening_changes, trainer.screening_checks), "WHITE")
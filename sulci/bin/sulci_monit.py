@@ -12,6 +12,9 @@ from sulci.trainers import SemanticalTrainer, LemmatizerTrainer, LexicalTrainer,
                                                    ContextualTrainer, POSTrainer
 from sulci.lemmatizer import Lemmatizer
 from sulci.utils import load_file
+from sulci.rules_templates import LexicalTemplateGenerator, \
+                                  ContextualTemplateGenerator, LemmatizerTemplateGenerator
+from sulci.profiling import compile_rules, prune_rules
 from sulci_cli import SulciBaseCommand
 
 class Command(SulciBaseCommand):
@@ -104,6 +107,22 @@ class Command(SulciBaseCommand):
             default=None,
             help="Specify a file path when needed. Relative to /sulci/"
         )
+        self.parser.add_argument(
+            "-R",
+            "--rules_profile",
+            action="store_true",
+            dest="rules_profile",
+            help="Profile the tagger and lemmatizer rules on the corpus. "
+                 "Use -l to limit the number of rules displayed."
+        )
+        self.parser.add_argument(
+            "-P",
+            "--prune_rules",
+            action="store_true",
+            dest="prune_rules",
+            help="Write the rules files without the rules useless on the "
+                 "corpus, as corpus/*.pruned.rls"
+        )
         self.parser.add_argument(
             "-i",
             "--case_insensitive",
@@ -146,12 +165,61 @@ class Command(SulciBaseCommand):
                 )
             else:
                 corpus.check(L, self.USE_LEMMES)
+        if self.RULES_PROFILE or self.PRUNE_RULES:
+            self.profile_rules(C, L, P, M)
         if self.DISPLAY_ERRORS:
             T = POSTrainer(P,C)
             T.display_errors()
         if self.IPDB:
             import ipdb; ipdb.set_trace()
 
+    def profile_rules(self, corpus, lexicon, tagger, lemmatizer):
+        tokens = corpus.tokens
+        tagger.start_profiling()
+        tagger.tag_all(tokens)
+        profiles = tagger.stop_profiling()
+        lemmatizer_tokens = lemmatizer.tokens
+        for token in lemmatizer_tokens:
+            # The lemmatizer rules are checked with the right tags
+            token.tag = token.verified_tag
+        lemmatizer.start_profiling()
+        lemmatizer.do(lemmatizer_tokens)
+        profiles["lemmatizer"] = lemmatizer.stop_profiling()
+        for kind in ("lexical", "contextual", "lemmatizer"):
+            profiles[kind].report(self.LIMIT)
+        if not self.PRUNE_RULES:
+            return
+
+        def tagging_errors(lexical_rules, contextual_rules):
+            for token in tokens:
+                tagger.tag(token)
+            tagger.apply_rules(tokens, compile_rules(LexicalTemplateGenerator,
+                                                     lexical_rules, lexicon=lexicon))
+            tagger.apply_rules(tokens, compile_rules(ContextualTemplateGenerator,
+                                                     contextual_rules))
+            return len([t for t in tokens if t.tag != t.verified_tag])
+
+        def lemmatizing_errors(rules):
+            for token in lemmatizer_tokens:
+                token.lemme = token.original
+            lemmatizer.do(lemmatizer_tokens,
+                          [LemmatizerTemplateGenerator.uncompile(r) for r in rules])
+            return len([t for t in lemmatizer_tokens if t.lemme != t.verified_lemme])
+
+        lexical_rules = profiles["lexical"].rules
+        contextual_rules = profiles["contextual"].rules
+        checks = {
+            "lexical": lambda rules: tagging_errors(rules, contextual_rules),
+            "contextual": lambda rules: tagging_errors(lexical_rules, rules),
+            "lemmatizer": lemmatizing_errors,
+        }
+        for kind in ("lexical", "contextual", "lemmatizer"):
+            profile = profiles[kind]
+            removed = prune_rules(profile, checks[kind])
+            path = profile.save_pruned(removed)
+            sulci_logger.info(u"%d of %d %s rules removed in %s" % (
+                len(removed), len(profile), kind, path), "BLUE", True)
+
 if __name__ == '__main__':
     command = Command()
     command.handle()
\ No newline at end of file
@@ -10,6 +10,7 @@ from sulci.log import sulci_logger
 from sulci.trainers import SemanticalTrainer, LemmatizerTrainer, LexicalTrainer,\
                                            ContextualTrainer, GlobalPMITrainer
 from sulci.lemmatizer import Lemmatizer
+from sulci.rules_templates import RulesArtifact
 from sulci.base import UseDB
 from sulci import config
 
@@ -31,6 +32,27 @@ class Command(SulciBaseCommand):
             dest="lexicon",
             help="Build the lexicon"
         )
+        self.parser.add_argument(
+            "-X",
+            "--compile_lexicon",
+            action="store_true",
+            dest="compile_lexicon",
+            help="Build the compiled lexicon (lexicon.lxb), loaded by mmap"
+        )
+        self.parser.add_argument(
+            "-L",
+            "--lemme_table",
+            action="store_true",
+            dest="lemme_table",
+            help="Build the table of the lemmes of the known forms (lemmes.lmb)"
+        )
+        self.parser.add_argument(
+            "-R",
+            "--rules_artifact",
+            action="store_true",
+            dest="rules_artifact",
+            help="Build the artifact of the parsed rules (rules.artifact)"
+        )
         self.parser.add_argument(
             "-e",
             "--lexical",
@@ -54,6 +76,22 @@ class Command(SulciBaseCommand):
             default=None,
             help="Trainer mode : master, slave, or full (default)"
         )
+        self.parser.add_argument(
+            "--screening",
+            action="store",
+            type=float,
+            dest="screening",
+            default=None,
+            help="Screen the candidate rules on this fraction of the samples (eg. 0.2)"
+        )
+        self.parser.add_argument(
+            "--screening_margin",
+            action="store",
+            type=float,
+            dest="screening_margin",
+            default=None,
+            help="Fully test the screened rules within this score of the best one"
+        )
         self.parser.add_argument(
             "-r",
             "--lemmatizer",
@@ -108,6 +146,10 @@ class Command(SulciBaseCommand):
             help="Add lemme also when preparing a text for POS indexing"
         )
 
+    def configure_screening(self, trainer):
+        if self.SCREENING_MARGIN is not None:
+            trainer.screening_margin = self.SCREENING_MARGIN
+
     def handle(self, *args, **options):
         with UseDB(config.TRAINING_DATABASE):
             sulci_logger.info(u"STARTING TRAINING WITH DATABASE «%s»" % config.TRAINING_DATABASE, "RED", True)
@@ -117,6 +159,12 @@ class Command(SulciBaseCommand):
             P = PosTagger(lexicon=L)
             if self.LEXICON:
                 L.make(self.FORCE)
+            if self.COMPILE_LEXICON:
+                L.compile()
+            if self.LEMME_TABLE:
+                M.compile_table(C.tokens)
+            if self.RULES_ARTIFACT:
+                RulesArtifact.build()
             if self.SUBPROCESSES:
                 import subprocess
                 training_kind = self.LEXICAL and "-e"\
@@ -136,13 +184,16 @@ class Command(SulciBaseCommand):
                 # Wait to leave time to slave to launch
                 time.sleep(1)
             if self.LEXICAL:
-                T = LexicalTrainer(P, C, self.MODE)
+                T = LexicalTrainer(P, C, self.MODE, screening=self.SCREENING)
+                self.configure_screening(T)
                 T.do()
             elif self.CONTEXTUAL:
-                T = ContextualTrainer(P, C, self.MODE)
+                T = ContextualTrainer(P, C, self.MODE, screening=self.SCREENING)
+                self.configure_screening(T)
                 T.do()
             elif self.LEMMATIZER:
-                T = LemmatizerTrainer(M, self.MODE)
+                T = LemmatizerTrainer(M, self.MODE, screening=self.SCREENING)
+                self.configure_screening(T)
                 T.do()
             elif self.PMI:
                 T = Thesaurus()
@@ -0,0 +1,447 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Columnar representation of a text.
+
+Instead of a graph of Token and Sample objects, a ColumnarText stores the text
+as parallel arrays of integer ids (words, tags, lemmes, and the verified ones
+for training), of integers (offsets and features), plus the boundaries of the
+samples. The ids come from a Vocabulary, where each string is interned once:
+by default the one shared by the process, which only grows.
+
+TokenView and SampleView give access to a position of the arrays with the
+Token and Sample API, so the taggers and the rules can still be used. The
+tagging and the lemmatization of a ColumnarText read the columns, and only
+build views for the rules looking at the context of a token.
+"""
+from array import array
+from bisect import bisect_right
+from collections import defaultdict
+
+from sulci.base import TextManager, Sample, Token
+from sulci.rules_templates import LexicalTemplateGenerator
+
+
+class Vocabulary(object):
+    """
+    Interned strings, each one with an integer id.
+    None has always the id 0 (eg. for the missing verified tags).
+    """
+
+    def __init__(self):
+        self.ids = {None: 0}
+        self.strings = [None]
+
+    def __len__(self):
+        return len(self.strings)
+
+    def __contains__(self, string):
+        return string in self.ids
+
+    def __getitem__(self, id):
+        return self.strings[id]
+
+    def intern(self, string):
+        """
+        Return the id of string, adding it to the vocabulary if needed.
+        """
+        try:
+            return self.ids[string]
+        except KeyError:
+            id = self.ids[string] = len(self.strings)
+            self.strings.append(string)
+            return id
+
+    def decode(self, ids):
+        return tuple(self.strings[id] for id in ids)
+
+# Shared by the texts built without a vocabulary. It only grows: a long
+# running process should give a Vocabulary to each of its corpora, or call
+# reset_vocabulary from time to time.
+VOCABULARY = Vocabulary()
+
+
+def reset_vocabulary():
+    """
+    Replace the shared vocabulary by an empty one, and return the old one.
+    The texts already built keep the old vocabulary, so their ids are still
+    valid, and it is freed with the last of them.
+    """
+    global VOCABULARY
+    old, VOCABULARY = VOCABULARY, Vocabulary()
+    return old
+
+
+class ColumnarText(TextManager):
+    """
+    A text stored as parallel arrays of vocabulary ids (COLUMNS) and of
+    integers (INT_COLUMNS, where -1 is None).
+    The token at index i has the word words[i], the tag tags[i], etc., and the
+    sample n is made of the tokens bounds[n] to bounds[n + 1].
+    The stemms of the tokens, which are objects, are in the stemms dict, by
+    token index.
+    """
+    COLUMNS = ("words", "tags", "lemmes", "verified_tags", "verified_lemmes")
+    INT_COLUMNS = ("starts", "ends", "features")
+
+    def __init__(self, vocabulary=None):
+        self.vocabulary = vocabulary or VOCABULARY
+        for column in self.COLUMNS + self.INT_COLUMNS:
+            setattr(self, column, array("i"))
+        self.bounds = array("i", [0])
+        self.stemms = {}
+
+    @classmethod
+    def from_tokens(cls, tokens, vocabulary=None):
+        """
+        Build a columnar text from tokens, given as in TextManager.iter_samples
+        (eg. a generator of strings, or of word/TAG/lemme in training mode).
+        """
+        text = cls(vocabulary)
+        # Each sample is converted as soon as it is complete, so only one
+        # sample of Token objects is in memory at a time.
+        for sample in text.iter_samples(tokens):
+            text.append_sample(sample)
+        return text
+
+    @classmethod
+    def from_samples(cls, samples, vocabulary=None):
+        """
+        Build a columnar text from samples of Token objects, eg. the samples
+        of a StemmedText or a TextCorpus.
+        """
+        text = cls(vocabulary)
+        for sample in samples:
+            text.append_sample(sample)
+        return text
+
+    def append_sample(self, sample):
+        intern = self.vocabulary.intern
+        for token in sample:
+            self.words.append(intern(token.original))
+            self.tags.append(intern(token.tag))
+            self.lemmes.append(intern(token.lemme))
+            self.verified_tags.append(intern(token.verified_tag))
+            self.verified_lemmes.append(intern(token.verified_lemme))
+            for column, value in ((self.starts, token.start), (self.ends, token.end),
+                                  (self.features, token.features)):
+                column.append(-1 if value is None else value)
+        self.bounds.append(len(self.words))
+
+    def __len__(self):
+        return len(self.words)
+
+    def __iter__(self):
+        for sample_index, index in self.positions():
+            yield TokenView(self, index, sample_index)
+
+    def positions(self):
+        """
+        Yield the (sample index, token index) of each token.
+        """
+        bounds = self.bounds
+        for sample_index in xrange(len(bounds) - 1):
+            for index in xrange(bounds[sample_index], bounds[sample_index + 1]):
+                yield sample_index, index
+
+    @property
+    def tokens(self):
+        """
+        Views of the tokens, built at each call.
+        """
+        return list(self)
+
+    @property
+    def samples(self):
+        """
+        Views of the samples, built at each call.
+        """
+        return [SampleView(self, idx) for idx in xrange(len(self.bounds) - 1)]
+
+    def sample_index(self, index):
+        """
+        Return the index of the sample of the token at index.
+        """
+        return bisect_right(self.bounds, index) - 1
+
+    def column(self, name, start=0, end=None):
+        """
+        Return the strings of a column, eg. text.column("lemmes").
+        """
+        strings = self.vocabulary.strings
+        return [strings[id] for id in getattr(self, name)[start:end]]
+
+    def default_tag_all(self, postagger):
+        """
+        Set the default tag of each token, computing it once per word.
+        """
+        intern = self.vocabulary.intern
+        strings = self.vocabulary.strings
+        tags_by_word = {}
+        tags = self.tags
+        for index, word in enumerate(self.words):
+            if word not in tags_by_word:
+                tags_by_word[word] = intern(postagger.default_tag(strings[word]))
+            tags[index] = tags_by_word[word]
+
+    def lexical_tag_all(self, postagger):
+        """
+        Apply the lexical rules of postagger, as PosTagger.cached_lexical_tag
+        does: the runs of the rules only depending on the word are computed
+        once per word and tag (and kept in the LexicalCache if enabled), a
+        TokenView is only built to test the rules depending on the context,
+        whose context keys are computed once per token and template.
+        """
+        if postagger.profiles is not None:
+            postagger.lexical_tag(self.tokens)
+            return
+        rules = postagger.compiled_rules(LexicalTemplateGenerator, lexicon=postagger.lexicon)
+        end = len(rules)
+        cache = postagger.lexical_cache
+        intern = self.vocabulary.intern
+        strings = self.vocabulary.strings
+        words, tags = self.words, self.tags
+        runs_by_word = {}
+        for sample_index, index in self.positions():
+            word = words[index]
+            try:
+                runs = runs_by_word[word]
+            except KeyError:
+                runs = runs_by_word[word] = {} if cache is None else cache.entry(strings[word])[1]
+            token = None
+            contexts = {}
+            tag = strings[tags[index]]
+            idx = 0
+            matched = False
+            hit = True
+            while True:
+                key = (tag, idx)
+                try:
+                    tag, idx, run_matched = runs[key]
+                except KeyError:
+                    if token is None:
+                        token = TokenView(self, index, sample_index)
+                    run = runs[key] = postagger.word_rules_run(token, tag, idx, rules)
+                    tag, idx, run_matched = run
+                    hit = False
+                matched = matched or run_matched
+                if idx == end:
+                    break
+                # This rule depends on the context, it's tested on the token
+                template, from_tag, to_tag, complement = rules[idx]
+                if token is None:
+                    token = TokenView(self, index, sample_index)
+                try:
+                    keys = contexts[template]
+                except KeyError:
+                    keys = contexts[template] = template.complement_keys(token)
+                if template.rule_key(complement) in keys:
+                    tag = to_tag
+                    matched = True
+                idx += 1
+            if cache is not None:
+                if hit:
+                    cache.hits += 1
+                else:
+                    cache.misses += 1
+            if matched:
+                tags[index] = intern(tag)
+
+    def contextual_tag_all(self, postagger):
+        """
+        Apply the contextual rules of postagger with its transducer, only
+        building a TokenView for the tokens whose tag starts a rule.
+        """
+        if postagger.profiles is not None:
+            postagger.contextual_tag(self.tokens)
+            return
+        transducer = postagger.transducer
+        transitions = transducer.transitions
+        intern = self.vocabulary.intern
+        strings = self.vocabulary.strings
+        tags = self.tags
+        for sample_index, index in self.positions():
+            if strings[tags[index]] not in transitions:
+                continue
+            tag, matched = transducer.transduce(TokenView(self, index, sample_index))
+            if matched:
+                tags[index] = intern(tag)
+
+    def tag_all(self, postagger, lexical=True, contextual=True):
+        """
+        Tag the text with the rules of postagger, as PosTagger.tag_all does
+        with Token objects, but over the columns.
+        It is about as fast as tagging Token objects, not faster (see the
+        memory benchmark): the contextual rules still read the neighbors of
+        the tokens through TokenViews.
+        """
+        self.default_tag_all(postagger)
+        if lexical:
+            self.lexical_tag_all(postagger)
+        if contextual:
+            self.contextual_tag_all(postagger)
+
+    def lemmatize(self, lemmatizer):
+        """
+        Lemmatize the text with lemmatizer.
+        The lemme of a token only depends on its word, tag and current lemme,
+        so it is computed once per distinct (word, tag, lemme) ids.
+        """
+        if lemmatizer.profile is not None:
+            lemmatizer.do(self.tokens)
+            return
+        lemmes = self.lemmes
+        keys = zip(self.words, self.tags, lemmes)
+        firsts = {}  # key: index of its first token
+        todo = []
+        for sample_index, index in self.positions():
+            if keys[index] not in firsts:
+                firsts[keys[index]] = index
+                todo.append(TokenView(self, index, sample_index))
+        lemmatizer.do(todo)
+        for index, key in enumerate(keys):
+            lemmes[index] = lemmes[firsts[key]]
+
+    def ngrams_counts(self, length, column="lemmes"):
+        """
+        Count the n-grams of ids of this column, inside each sample.
+        Use vocabulary.decode to get back the strings of an n-gram.
+        """
+        ids = getattr(self, column)
+        counts = defaultdict(int)
+        bounds = self.bounds
+        for idx in xrange(len(bounds) - 1):
+            sample = ids[bounds[idx]:bounds[idx + 1]]
+            for ngram in zip(*[sample[i:] for i in xrange(length)]):
+                counts[ngram] += 1
+        return counts
+
+
+def _column_property(name, doc):
+
+    def getter(self):
+        return self.text.vocabulary.strings[getattr(self.text, name)[self.index]]
+
+    def setter(self, value):
+        getattr(self.text, name)[self.index] = self.text.vocabulary.intern(value)
+
+    return property(getter, setter, doc=doc)
+
+
+def _int_column_property(name, doc):
+
+    def getter(self):
+        value = getattr(self.text, name)[self.index]
+        return None if value == -1 else value
+
+    def setter(self, value):
+        getattr(self.text, name)[self.index] = -1 if value is None else value
+
+    return property(getter, setter, doc=doc)
+
+
+class TokenView(Token):
+    """
+    A token of a ColumnarText: the values are read from, and written to, the
+    arrays of the text.
+    """
+    __slots__ = ("text", "index", "sample_index", "_parent")
+
+    def __init__(self, text, index, sample_index=None):
+        self.text = text
+        self.index = index
+        if sample_index is None:
+            sample_index = text.sample_index(index)
+        self.sample_index = sample_index
+        self._parent = None
+
+    original = _column_property("words", "Raw string of the token.")
+    tag = _column_property("tags", "POS tag of the token.")
+    lemme = _column_property("lemmes", "Lemme of the token.")
+    verified_tag = _column_property("verified_tags", "Tag given in training mode.")
+    verified_lemme = _column_property("verified_lemmes", "Lemme given in training mode.")
+    start = _int_column_property("starts", "Offset of the token in the text.")
+    end = _int_column_property("ends", "Offset of the end of the token in the text.")
+    features = _int_column_property("features", "See Token.compute_features.")
+
+    @property
+    def stemm(self):
+        return self.text.stemms.get(self.index)
+
+    @stemm.setter
+    def stemm(self, value):
+        self.text.stemms[self.index] = value
+
+    @property
+    def id(self):
+        return self.index
+
+    @property
+    def parent(self):
+        if self._parent is None:
+            self._parent = SampleView(self.text, self.sample_index)
+        return self._parent
+
+    @property
+    def position(self):
+        return self.index - self.text.bounds[self.sample_index]
+
+    def get_neighbors(self, *args):
+        """
+        Same as Token.get_neighbors, with the bounds of the sample read in
+        the text instead of going through a SampleView.
+        """
+        bounds = self.text.bounds
+        start = bounds[self.sample_index]
+        end = bounds[self.sample_index + 1]
+        neighbors = []
+        for idx in args:
+            index = self.index + idx
+            if not start <= index < end:
+                return []
+            neighbors.append(TokenView(self.text, index, self.sample_index))
+        return neighbors
+
+
+class SampleView(Sample):
+    """
+    A sample of a ColumnarText.
+    """
+    __slots__ = ("text", "index")
+
+    def __init__(self, text, index):
+        self.text = text
+        self.index = index
+
+    @property
+    def id(self):
+        return self.index
+
+    @property
+    def parent(self):
+        return self.text
+
+    @property
+    def tokens(self):
+        start = self.text.bounds[self.index]
+        return [self.token(idx) for idx in xrange(start, self.text.bounds[self.index + 1])]
+
+    def token(self, index):
+        token = TokenView(self.text, index, self.index)
+        token._parent = self
+        return token
+
+    def __len__(self):
+        return self.text.bounds[self.index + 1] - self.text.bounds[self.index]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.tokens[key]
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError("sample index out of range")
+        return self.token(self.text.bounds[self.index] + key)
+
+    def append(self, item):
+        raise TypeError("Samples of a ColumnarText can't be modified.")
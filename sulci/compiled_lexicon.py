@@ -0,0 +1,373 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Binary format of the lexicon, read through mmap (and base of the other
+compiled files, see CompiledFile).
+
+The lexicon.lxc file is parsed into a dict of LexiconEntity, and its affixes
+and factors computed, in each process using it. The compiled lexicon
+(lexicon.lxb, built by `sulci_train.py -X`) stores all of them as tables of
+uint32 and UTF-8 strings, which are read in place: opening it takes no
+time, the pages are shared by all the processes, and only the entries used
+are decoded.
+
+Layout (little endian): the header (magic, version, size and mtime of the
+lexicon.lxc it was built from, then (offset, size) of each section), then the
+sections:
+
+* words: string table of the words, sorted by UTF-8 bytes (as by chars)
+* hash: open addressing table (CRC32, linear probing) of word index + 1
+* entries: for each word, its first pair index (and the end, at the end)
+* pairs: (tag index, lemme index), in the order of the lexicon line
+* tags, lemmes, prefixes, suffixes: string tables
+* factor_text, factor_suffixes: the FactorIndex of the words
+
+A string table is its count, count + 1 offsets, then the UTF-8 strings.
+"""
+import os
+import mmap
+import struct
+import tempfile
+from zlib import crc32
+
+from sulci.tries import FactorIndex
+from sulci.utils import get_dir
+from sulci.log import sulci_logger
+
+UINT = struct.Struct("<I")
+
+
+def word_hash(word):
+    return crc32(word) & 0xffffffff
+
+
+def lexicon_paths(path):
+    """
+    Return the absolute paths of the lexicon.lxc and the lexicon.lxb of a
+    Lexicon.PATH.
+    """
+    pwd = not path.startswith("/") and get_dir() or ""
+    return "%s%s/lexicon.lxc" % (pwd, path), "%s%s/lexicon.lxb" % (pwd, path)
+
+
+def source_signature(*paths):
+    """
+    Return the (size, mtime, ...) of the files a compiled file is built from.
+    """
+    final = ()
+    for path in paths:
+        stat = os.stat(path)
+        final += (stat.st_size, stat.st_mtime)
+    return final
+
+
+class UIntTable(object):
+    """
+    Sequence of the uint32 of a section of data.
+    """
+
+    def __init__(self, data, offset, size):
+        self.data = data
+        self.offset = offset
+        self.length = size // UINT.size
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, idx):
+        if not 0 <= idx < self.length:
+            raise IndexError(idx)
+        return UINT.unpack_from(self.data, self.offset + idx * UINT.size)[0]
+
+
+class StringTable(object):
+    """
+    Sequence of the strings of a section of data, decoded on access.
+    """
+
+    def __init__(self, data, offset, size):
+        self.data = data
+        self.length = UINT.unpack_from(data, offset)[0]
+        self.offsets = UIntTable(data, offset + UINT.size,
+                                 (self.length + 1) * UINT.size)
+        self.start = offset + (self.length + 2) * UINT.size
+
+    def __len__(self):
+        return self.length
+
+    def raw(self, idx):
+        """
+        Return the UTF-8 string at idx.
+        """
+        offsets = self.offsets
+        return self.data[self.start + offsets[idx]:self.start + offsets[idx + 1]]
+
+    def __getitem__(self, idx):
+        return self.raw(idx).decode("utf-8")
+
+    def __iter__(self):
+        for idx in xrange(self.length):
+            yield self[idx]
+
+
+def pack_uints(values):
+    return struct.pack("<%dI" % len(values), *values)
+
+
+def pack_strings(strings):
+    raw = [s.encode("utf-8") for s in strings]
+    offsets = [0]
+    for s in raw:
+        offsets.append(offsets[-1] + len(s))
+    return pack_uints([len(raw)] + offsets) + "".join(raw)
+
+
+def pack_hash(keys):
+    """
+    Return the open addressing table of keys (index + 1 by slot).
+    """
+    size = 2
+    while size < len(keys) * 2:
+        size *= 2
+    table = [0] * size
+    for idx, key in enumerate(keys):
+        slot = word_hash(key.encode("utf-8")) & (size - 1)
+        while table[slot]:
+            slot = (slot + 1) & (size - 1)
+        table[slot] = idx + 1
+    return pack_uints(table)
+
+
+def find_key(keys, table, key):
+    """
+    Return the index of key in the string table keys, using the hash table,
+    or -1.
+    """
+    if isinstance(key, unicode):
+        key = key.encode("utf-8")
+    mask = len(table) - 1
+    slot = word_hash(key) & mask
+    while True:
+        idx = table[slot]
+        if not idx:
+            return -1
+        if keys.raw(idx - 1) == key:
+            return idx - 1
+        slot = (slot + 1) & mask
+
+
+class CompiledFile(object):
+    """
+    Base of the files read through mmap: a header (MAGIC, VERSION, the
+    signature of the files it was built from, the (offset, size) of each
+    section), then the SECTIONS, aligned on uint32.
+    Once read, each section is an attribute: a StringTable for the
+    STRING_SECTIONS, a buffer for the BUFFER_SECTIONS, else an UIntTable.
+    """
+    MAGIC = None
+    VERSION = None
+    SECTIONS = ()
+    STRING_SECTIONS = ()
+    BUFFER_SECTIONS = ()
+    SIGNATURE_SIZE = 2  # Number of values of the signature
+
+    @classmethod
+    def header(cls):
+        return struct.Struct("<8sI" + "d" * cls.SIGNATURE_SIZE + "II" * len(cls.SECTIONS))
+
+    @classmethod
+    def write(cls, path, signature, sections):
+        """
+        Write the file at path, sections is a dict {name: string}.
+        The file is written under a unique temporary name in the same
+        directory, then renamed, so concurrent builds and readers never see
+        a partial file.
+        """
+        header = cls.header()
+        positions = []
+        offset = header.size
+        for name in cls.SECTIONS:
+            offset += -offset % UINT.size  # Aligned on uint32
+            positions += [offset, len(sections[name])]
+            offset += len(sections[name])
+        content = header.pack(cls.MAGIC, cls.VERSION, *(tuple(signature) + tuple(positions)))
+        for idx, name in enumerate(cls.SECTIONS):
+            content += "\0" * (positions[idx * 2] - len(content))
+            content += sections[name]
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".")
+        try:
+            f = os.fdopen(fd, "wb")
+            try:
+                f.write(content)
+            finally:
+                f.close()
+            os.chmod(tmp_path, 0644)  # mkstemp creates it readable by its owner only
+            os.rename(tmp_path, path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+    def __init__(self, data):
+        header = self.header()
+        magic, version = struct.unpack_from("<8sI", data, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError("Not a %s, or another version" % self.__class__.__name__)
+        values = header.unpack_from(data, 0)[2:]
+        self.signature = values[:self.SIGNATURE_SIZE]
+        values = values[self.SIGNATURE_SIZE:]
+        self.data = data
+        for idx, name in enumerate(self.SECTIONS):
+            offset, size = values[idx * 2:idx * 2 + 2]
+            if name in self.BUFFER_SECTIONS:
+                table = buffer(data, offset, size)
+            elif name in self.STRING_SECTIONS:
+                table = StringTable(data, offset, size)
+            else:
+                table = UIntTable(data, offset, size)
+            setattr(self, name, table)
+
+    @classmethod
+    def open_file(cls, path, signature, command):
+        """
+        Return the instance for the file at path, or None if it is not
+        built, or if signature is not the one it was built with (command
+        builds it again).
+        """
+        try:
+            f = open(path, "rb")
+        except IOError:
+            return None
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            f.close()
+        try:
+            compiled = cls(data)
+        except (ValueError, struct.error):
+            sulci_logger.info(u"Invalid or old %s, run %s" % (path, command), "RED")
+            return None
+        if compiled.signature != signature:
+            sulci_logger.info(u"%s is outdated, run %s" % (path, command), "RED")
+            return None
+        return compiled
+
+
+def compile_lexicon(path, entries, prefixes, suffixes, signature):
+    """
+    Write the compiled lexicon at path.
+    entries is a dict {word: [(tag, lemme), ...]}, with the tags in the order
+    of the lexicon line, prefixes and suffixes the affixes of the words,
+    signature the (size, mtime) of their lexicon.lxc.
+    """
+    words = sorted(entries, key=lambda w: w.encode("utf-8"))
+    tags = sorted(set(tag for pairs in entries.itervalues() for tag, _ in pairs))
+    lemmes = sorted(set(lemme for pairs in entries.itervalues() for _, lemme in pairs))
+    tag_ids = dict((tag, idx) for idx, tag in enumerate(tags))
+    lemme_ids = dict((lemme, idx) for idx, lemme in enumerate(lemmes))
+    starts = [0]
+    pairs = []
+    for word in words:
+        for tag, lemme in entries[word]:
+            pairs += [tag_ids[tag], lemme_ids[lemme]]
+        starts.append(len(pairs) // 2)
+    factors = FactorIndex(words)
+    sections = {
+        "words": pack_strings(words),
+        "hash": pack_hash(words),
+        "entries": pack_uints(starts),
+        "pairs": pack_uints(pairs),
+        "tags": pack_strings(tags),
+        "lemmes": pack_strings(lemmes),
+        "prefixes": pack_strings(sorted(prefixes)),
+        "suffixes": pack_strings(sorted(suffixes)),
+        "factor_text": factors.text,
+        "factor_suffixes": pack_uints(factors.suffixes),
+    }
+    CompiledLexicon.write(path, signature, sections)
+
+
+class CompiledLexicon(CompiledFile):
+    """
+    The compiled lexicon, used as the dict {word: LexiconEntity} of the
+    lexicon. The entities are decoded on first access, and kept.
+    """
+    MAGIC = "SULCILXB"
+    VERSION = 2  # To be incremented when the format changes
+    SECTIONS = ("words", "hash", "entries", "pairs", "tags", "lemmes",
+                "prefixes", "suffixes", "factor_text", "factor_suffixes")
+    STRING_SECTIONS = ("words", "tags", "lemmes", "prefixes", "suffixes")
+    BUFFER_SECTIONS = ("factor_text",)
+
+    def __init__(self, data):
+        super(CompiledLexicon, self).__init__(data)
+        self._entities = {}
+        self._tags = list(self.tags)
+        self._lemmes = {}
+
+    @classmethod
+    def open(cls, path):
+        """
+        Return the CompiledLexicon of the lexicon at path (a Lexicon.PATH), or
+        None if it is not built, or older than its lexicon.lxc.
+        """
+        source_path, compiled_path = lexicon_paths(path)
+        return cls.open_file(compiled_path, source_signature(source_path),
+                             u"sulci_train.py -X")
+
+    def index(self, word):
+        """
+        Return the index of word, or -1 if it is not in the lexicon.
+        """
+        return find_key(self.words, self.hash, word)
+
+    def entity(self, idx):
+        """
+        Decode the LexiconEntity of the word at idx.
+        """
+        from sulci.lexicon import LexiconEntity  # Which imports this module
+        tags = []
+        for pair in xrange(self.entries[idx], self.entries[idx + 1]):
+            lemme = self.pairs[pair * 2 + 1]
+            if not lemme in self._lemmes:
+                self._lemmes[lemme] = self.lemmes[lemme]
+            tags.append((self._tags[self.pairs[pair * 2]], self._lemmes[lemme]))
+        return LexiconEntity.from_tags(self.words[idx], tags)
+
+    def get(self, word, default=None):
+        try:
+            return self[word]
+        except KeyError:
+            return default
+
+    def __getitem__(self, word):
+        try:
+            return self._entities[word]
+        except KeyError:
+            idx = self.index(word)
+            if idx == -1:
+                raise KeyError(word)
+            entity = self._entities[word] = self.entity(idx)
+            return entity
+
+    def __contains__(self, word):
+        return word in self._entities or self.index(word) != -1
+
+    def __len__(self):
+        return len(self.words)
+
+    def __iter__(self):
+        return iter(self.words)
+
+    def keys(self):
+        return list(self)
+
+    def iteritems(self):
+        for word in self:
+            yield word, self[word]
+
+    def items(self):
+        return list(self.iteritems())
+
+    @property
+    def factors(self):
+        return FactorIndex.from_tables(self.factor_text, self.factor_suffixes)
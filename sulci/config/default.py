@@ -1,6 +1,7 @@
 SULCI_CONTENT_PROPERTY = "content"
 SULCI_KEYWORDS_PROPERTY = "keywords"
 DEBUG = False
+LEXICAL_CACHE_SIZE = 50000  # Words kept by the PosTagger lexical cache, 0 to disable
 DATABASES = {
     "liberation": {
         "host": "localhost",
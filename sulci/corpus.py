@@ -186,6 +186,7 @@ class TextCorpus(TextManager, CorpusMonitor):
     VALID_EXT = ".crp"
     PENDING_EXT = ".pdg"
     LEXICON_EXT = ".lxc.lem.crp"
+    TRAINING = True
 
     def __init__(self, path=None):
         """
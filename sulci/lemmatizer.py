@@ -1,9 +1,92 @@
 #!/usr/bin/env python
 # -*- coding:Utf-8 -*-
 
-from sulci.base import TextManager
+import time
+from bisect import bisect_left
+from itertools import chain
+
+from sulci.base import TextManager, Sample, Token
 from sulci.log import sulci_logger
+from sulci.batch import BatchProcessor
+from sulci.profiling import RulesProfile
 from sulci.rules_templates import LemmatizerTemplateGenerator
+from sulci.lemme_table import LemmeTable
+
+
+class LemmatizerRulesIndex(object):
+    """
+    The compiled lemmatizer rules, indexed so a token only tests the rules
+    which can change it: by tag, and, for the rules needing a suffix
+    (CHANGESUFFIX), in a trie of the reversed suffixes.
+
+    A rule only depends on the tag and the lemme of one token, so applying
+    all the rules to each token in turn, in the rules order, gives the same
+    lemmes as applying each rule to all the tokens.
+    """
+    RULES = None  # Key of the rules list in a trie node
+
+    def __init__(self, rules):
+        self.rules = []
+        self.by_tag = {}  # tag: [indexes of the rules only testing the tag]
+        self.tries = {}  # tag: trie of reversed suffixes, nodes {char: node}
+        for idx, (name, args) in enumerate(rules):
+            template, _ = LemmatizerTemplateGenerator.get_instance(name)
+            self.rules.append((template, args))
+            tag = args[0]  # The first argument of all the templates is the tag
+            suffix = template.indexed_suffix(args)
+            if suffix is None:
+                self.by_tag.setdefault(tag, []).append(idx)
+            else:
+                node = self.tries.setdefault(tag, {})
+                for char in reversed(suffix):
+                    node = node.setdefault(char, {})
+                node.setdefault(self.RULES, []).append(idx)
+
+    def next_rule(self, tag, lemme, start):
+        """
+        Return the index of the first rule, from start, which applies to a
+        token with tag and lemme, or None.
+        """
+        final = None
+        indexes = self.by_tag.get(tag)
+        if indexes:
+            idx = bisect_left(indexes, start)
+            if idx < len(indexes):
+                final = indexes[idx]
+        node = self.tries.get(tag)
+        if node is None:
+            return final
+        # As lemme[-len(suffix):] == suffix, an empty suffix only matches an
+        # empty lemme
+        nodes = [node] if not lemme else []
+        for char in reversed(lemme):
+            node = node.get(char)
+            if node is None:
+                break
+            nodes.append(node)
+        for node in nodes:
+            indexes = node.get(self.RULES)
+            if indexes:
+                idx = bisect_left(indexes, start)
+                if idx < len(indexes) and (final is None or indexes[idx] < final):
+                    final = indexes[idx]
+        return final
+
+    def apply(self, token):
+        """
+        Apply the rules to token, return whether one of them applied.
+        """
+        idx = self.next_rule(token.tag, token.lemme, 0)
+        applied = idx is not None
+        while idx is not None:
+            template, args = self.rules[idx]
+            template.apply_token(token, args)
+            idx = self.next_rule(token.tag, token.lemme, idx + 1)
+        return applied
+
+    def apply_all(self, tokens):
+        for token in tokens:
+            self.apply(token)
 
 
 class Lemmatizer(TextManager):
@@ -12,12 +95,16 @@ class Lemmatizer(TextManager):
     """
     PATH = "corpus"
     VALID_EXT = ".lem.crp"
+    TRAINING = True
+    _tables = {}  # LemmeTable (or None if not built) by lexicon path
 
     def __init__(self, lexicon):
         self._tokens = None
         self._raw_content = None
         self._len = None
         self.lexicon = lexicon
+        self.profile = None
+        self._index = None
 
     def __len__(self):
         if self._len is None:
@@ -45,18 +132,117 @@ class Lemmatizer(TextManager):
             self.tokens  # Load tokens and samples
         return self._samples
 
-    def do(self, token):
+    def do(self, token, rules=None):
         """
         A Token object or a list of token objects is expected.
         Return the token or the list.
+        rules are the compiled rules to use instead of the current ones (see
+        LemmatizerTemplateGenerator.uncompile).
         """
         tks = token if hasattr(token, "__iter__") else [token]
-        rules = LemmatizerTemplateGenerator.load()  # Cache me
-        for rule in rules:
-            template, _ = LemmatizerTemplateGenerator.get_instance(rule)
-            template.apply_rule(tks, rule)
-        # We force lemme if word is in lexicon with the current POS tag
-        for tk in tks:
-            if tk in self.lexicon and tk.tag in self.lexicon[tk]:
-                tk.lemme = self.lexicon[tk][tk.tag]
+        table = None
+        if rules is None:
+            rules = LemmatizerTemplateGenerator.load_compiled()
+            table = self.table
+        profile = self.profile
+        todo = tks
+        if profile is not None:
+            # Rule by rule, to time them
+            for idx, (name, args) in enumerate(rules):
+                template, _ = LemmatizerTemplateGenerator.get_instance(name)
+                # The first argument of all the templates is the tag
+                candidates = [tk for tk in tks if tk.tag == args[0]]
+                lemmes = [tk.lemme for tk in candidates]
+                before = time.time()
+                template.apply_uncompiled(tks, args)
+                profile.record_lemmes(idx, time.time() - before, candidates, lemmes)
+        else:
+            if table is not None:
+                # The lemme of a known form, not lemmatized yet, is in the table
+                todo = []
+                for tk in tks:
+                    known = tk.lemme == tk.original and table.get(tk.original, tk.tag)
+                    if not known:
+                        todo.append(tk)
+                        continue
+                    tk.lemme, changed = known
+                    if changed:
+                        # Maybe we should do this only in training mode
+                        tk.sample.reset_trainer_status()
+            self.rules_index(rules).apply_all(todo)
+        for tk in todo:
+            self.force_lexicon_lemme(tk)
         return tks if hasattr(token, "__iter__") else tks[0]
+
+    def force_lexicon_lemme(self, tk):
+        # We force lemme if word is in lexicon with the current POS tag
+        if tk in self.lexicon and tk.tag in self.lexicon[tk]:
+            tk.lemme = self.lexicon[tk][tk.tag]
+
+    @property
+    def table(self):
+        """
+        The LemmeTable of the lexicon, or None if it is not built (see
+        compile_table).
+        """
+        path = self.lexicon.PATH
+        if not path in self._tables:
+            self._tables[path] = LemmeTable.open(path, LemmatizerTemplateGenerator.RULES_FILE)
+        return self._tables[path]
+
+    def compile_table(self, tokens=()):
+        """
+        Build the LemmeTable of the (word, tag) of the lexicon, of the
+        lemmatizer corpus and of tokens (eg. the POS corpus), with the current
+        rules. Return the number of forms.
+        """
+        forms = set()
+        for word, entity in self.lexicon.items():
+            for tag in entity.tags:
+                forms.add((word, tag))
+        for tk in chain(self.tokens, tokens):
+            if tk.verified_tag is not None:
+                forms.add((tk.original, tk.verified_tag))
+        index = self.rules_index(LemmatizerTemplateGenerator.load_compiled())
+        sample = Sample(0)
+        lemmes = {}
+        for word, tag in forms:
+            tk = Token(len(sample), word)
+            sample.append(tk)
+            tk.tag = tag
+            changed = index.apply(tk)
+            self.force_lexicon_lemme(tk)
+            lemmes[(tk.original, tag)] = (tk.lemme, changed)
+        path = LemmeTable.build(self.lexicon.PATH, LemmatizerTemplateGenerator.RULES_FILE,
+                                lemmes)
+        self._tables.pop(self.lexicon.PATH, None)
+        sulci_logger.info(u"Lemme table %s (%d forms)" % (path, len(lemmes)), "WHITE")
+        return len(lemmes)
+
+    def rules_index(self, rules):
+        """
+        Return the LemmatizerRulesIndex of the compiled rules, kept for the
+        current ones.
+        """
+        if self._index is None or self._index[0] is not rules:
+            self._index = (rules, LemmatizerRulesIndex(rules))
+        return self._index[1]
+
+    def start_profiling(self):
+        """
+        Record the usage of each rule (see RulesProfile) until stop_profiling
+        is called.
+        """
+        self.profile = RulesProfile(LemmatizerTemplateGenerator)
+        return self.profile
+
+    def stop_profiling(self):
+        profile, self.profile = self.profile, None
+        return profile
+
+    def do_batch(self, items, processes=None):
+        """
+        Lemmatize many tagged samples, or texts with samples, over a pool of
+        processes (see sulci.batch). Return the items, in the same order.
+        """
+        return BatchProcessor(lemmatizer=self, processes=processes).process(items)
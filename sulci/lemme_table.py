@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lemmes of the known forms, computed ahead of time.
+
+While the lemme of a token is still its original, the lemme the Lemmatizer
+gives it only depends on its word and its tag. The lemme table (lemmes.lmb,
+next to the lexicon.lxc, built by `sulci_train.py -L`) stores it for all the
+(word, tag) of the lexicon and of the corpus, with the current rules and
+lexicon. The Lemmatizer then only runs the rules for the other forms.
+
+It is a compiled file (see sulci.compiled_lexicon.CompiledFile):
+
+* keys: string table of the "word<TAB>tag"
+* hash: open addressing table of the keys
+* values: for each key, its lemme index * 2, + 1 if a rule changed it
+* lemmes: string table
+"""
+from sulci.compiled_lexicon import CompiledFile, pack_strings, pack_uints, \
+                                   pack_hash, find_key, source_signature
+from sulci.utils import get_dir
+
+
+class LemmeTable(CompiledFile):
+    """
+    The lemmes of the (word, tag) known when the table was built.
+    """
+    MAGIC = "SULCILMB"
+    VERSION = 1  # To be incremented when the format changes
+    SECTIONS = ("keys", "hash", "values", "lemmes")
+    STRING_SECTIONS = ("keys", "lemmes")
+    SIGNATURE_SIZE = 4  # The lexicon.lxc and the lemmatizer rules
+
+    def __init__(self, data):
+        super(LemmeTable, self).__init__(data)
+        self._lemmes = {}
+        self._found = {}  # The values already read, by (word, tag)
+
+    @staticmethod
+    def paths(path, rules_file):
+        """
+        Return the absolute paths of the files the table of a Lexicon.PATH
+        depends on (its lexicon.lxc and rules_file), and of the table.
+        """
+        pwd = not path.startswith("/") and get_dir() or ""
+        return ("%s%s/lexicon.lxc" % (pwd, path), get_dir() + rules_file,
+                "%s%s/lemmes.lmb" % (pwd, path))
+
+    @staticmethod
+    def key(word, tag):
+        return u"%s\t%s" % (word, tag)
+
+    @classmethod
+    def build(cls, path, rules_file, lemmes):
+        """
+        Write the table of the lexicon at path (a Lexicon.PATH).
+        lemmes is a dict {(word, tag): (lemme, changed by a rule)}, computed
+        with the rules of rules_file.
+        """
+        lexicon_path, rules_path, table_path = cls.paths(path, rules_file)
+        signature = source_signature(lexicon_path, rules_path)
+        forms = sorted(lemmes)
+        keys = [cls.key(word, tag) for word, tag in forms]
+        strings = sorted(set(lemme for lemme, _ in lemmes.itervalues()))
+        ids = dict((lemme, idx) for idx, lemme in enumerate(strings))
+        values = []
+        for form in forms:
+            lemme, changed = lemmes[form]
+            values.append(ids[lemme] * 2 + bool(changed))
+        cls.write(table_path, signature, {
+            "keys": pack_strings(keys),
+            "hash": pack_hash(keys),
+            "values": pack_uints(values),
+            "lemmes": pack_strings(strings),
+        })
+        return table_path
+
+    @classmethod
+    def open(cls, path, rules_file):
+        """
+        Return the LemmeTable of the lexicon at path, or None if it is not
+        built, or if the lexicon or the rules changed since.
+        """
+        lexicon_path, rules_path, table_path = cls.paths(path, rules_file)
+        return cls.open_file(table_path, source_signature(lexicon_path, rules_path),
+                             u"sulci_train.py -L")
+
+    def __len__(self):
+        return len(self.keys)
+
+    def get(self, word, tag):
+        """
+        Return the (lemme, changed by a rule) of word with tag, or None if it
+        is not in the table.
+        """
+        found = self._found.get((word, tag))
+        if found is not None:
+            return found
+        idx = find_key(self.keys, self.hash, self.key(word, tag))
+        if idx == -1:
+            return None
+        value = self.values[idx]
+        lemme = self._lemmes.get(value // 2)
+        if lemme is None:
+            lemme = self._lemmes[value // 2] = self.lemmes[value // 2]
+        found = self._found[(word, tag)] = (lemme, value % 2 == 1)
+        return found
@@ -15,6 +15,9 @@ from base import TextManager
 from utils import load_file, save_to_file
 from sulci.log import sulci_logger
 from corpus import Corpus
+from sulci.tries import LexiconTries, FactorIndex
+from sulci.compiled_lexicon import CompiledLexicon, compile_lexicon, \
+                                   lexicon_paths, source_signature
 
 
 class Lexicon(TextManager):
@@ -23,6 +26,11 @@ class Lexicon(TextManager):
     """
 
     _loaded = {}
+    _tries = {}
+    _factors = {}
+    _afixes = {}
+    MAX_PREFIX_LENGTH = 3
+    MAX_SUFFIX_LENGTH = 5
 
     def __init__(self, path="corpus"):
         self.CORPUS_EXT = ".lxc.lem.crp"
@@ -30,14 +38,13 @@ class Lexicon(TextManager):
         self.PENDING_EXT = ".pdg"
         self.PATH = path
         self._raw_content = ""
-        self._prefixes = None
-        self._suffixes = None
-        self.factors = set()
 
     def __iter__(self):
         return self.loaded.__iter__()
 
     def __getitem__(self, item):
+        if not isinstance(item, basestring):  # Token, or a view of one
+            item = item.original
         return self.loaded.__getitem__(item)
 
     def __len__(self):
@@ -47,7 +54,7 @@ class Lexicon(TextManager):
         return self.loaded.items()
 
     def __contains__(self, key):
-        if isinstance(key, object) and key.__class__.__name__ == "Token":
+        if not isinstance(key, basestring):  # Token, or a view of one
             key = key.original
         return key in self.loaded
 
@@ -56,34 +63,48 @@ class Lexicon(TextManager):
         """
         Load lexicon in RAM, from file.
 
-        The representation will be a dict {"word1": [{tag1 : lemme1}]}
+        The representation will be a dict {"word1": [{tag1 : lemme1}]}, or
+        the CompiledLexicon, which is used the same way, if it is built (see
+        compile).
         """
         if not self.PATH in self._loaded:  # Caching and lazy loading
-            sulci_logger.debug("Loading lexicon...", "RED", True)
-            lx = load_file("%s/lexicon.lxc" % self.PATH)
-            self._loaded[self.PATH] = {}
-            for line in lx.split("\n"):
-                if line:
-                    lexicon_entity = LexiconEntity(line)
-                    self.add_factors(lexicon_entity.word)
-                    self._loaded[self.PATH][lexicon_entity.word] = lexicon_entity
+            compiled = CompiledLexicon.open(self.PATH)
+            if compiled is not None:
+                self._loaded[self.PATH] = compiled
+            else:
+                sulci_logger.debug("Loading lexicon...", "RED", True)
+                lx = load_file("%s/lexicon.lxc" % self.PATH)
+                self._loaded[self.PATH] = {}
+                for line in lx.split("\n"):
+                    if line:
+                        lexicon_entity = LexiconEntity(line)
+                        self._loaded[self.PATH][lexicon_entity.word] = lexicon_entity
         return self._loaded[self.PATH]
 
-    def add_factors(self, token):
+    @property
+    def tries(self):
+        """
+        The LexiconTries of the words, shared by the lexicons of this path.
+        """
+        if not self.PATH in self._tries:
+            self._tries[self.PATH] = LexiconTries(self.loaded)
+        return self._tries[self.PATH]
+
+    @property
+    def factors(self):
         """
-        Build the list of factors (pieces of word).
+        The FactorIndex of the words (pieces of word, eg. `"chant" in
+        lexicon.factors`), shared by the lexicons of this path.
 
         These factors are used by the POStagger, to determine if an
         unnown word could be a derivate of another.
         """
-        prefix = token
-        while prefix:
-            suffix = prefix
-            while suffix:
-                if not suffix == token:  # Don't add the initial graph
-                    self.factors.add(suffix)
-                suffix = suffix[1:]
-            prefix = prefix[:-1]
+        if not self.PATH in self._factors:
+            if isinstance(self.loaded, CompiledLexicon):
+                self._factors[self.PATH] = self.loaded.factors
+            else:
+                self._factors[self.PATH] = FactorIndex(sorted(self.loaded))
+        return self._factors[self.PATH]
 
     def make(self, force=False):
         """
@@ -148,15 +169,36 @@ class Lexicon(TextManager):
         ext = force and self.VALID_EXT or self.PENDING_EXT
         save_to_file("%s/lexicon%s" % (self.PATH, ext), unicode(final_d))
 
-    def create_afixes(self):
+    def compile(self):
+        """
+        Build the compiled lexicon (lexicon.lxb) of the lexicon.lxc, with its
+        affixes and factors. See sulci.compiled_lexicon.
+        """
+        source_path, compiled_path = lexicon_paths(self.PATH)
+        signature = source_signature(source_path)
+        entries = {}
+        for line in load_file(source_path).split("\n"):
+            if line:
+                word, tags = LexiconEntity.parse(line)
+                entries[word] = tags
+        prefixes, suffixes = self.create_afixes(entries)
+        compile_lexicon(compiled_path, entries, prefixes, suffixes, signature)
+        sulci_logger.info(u"Compiled lexicon %s (%d words)" % (compiled_path, len(entries)),
+                          "WHITE")
+
+    def create_afixes(self, words=None):
         """
         We determinate here the most frequent prefixes and suffixes.
+
+        Return the sets (prefixes, suffixes) of words (default: the lexicon).
         """
         prefixes = defaultdict(int)
         suffixes = defaultdict(int)
-        max_prefix_length = 3
-        max_suffix_length = 5
-        for tokenstring, _ in self.items():
+        max_prefix_length = self.MAX_PREFIX_LENGTH
+        max_suffix_length = self.MAX_SUFFIX_LENGTH
+        if words is None:
+            words = self.loaded
+        for tokenstring in words:
             tlen = len(tokenstring)
             for i in xrange(1, min(max_prefix_length + 1, tlen)):
                 prefix = tokenstring[0:i]
@@ -165,24 +207,35 @@ class Lexicon(TextManager):
                 suffix = tokenstring[tlen - i:tlen]
                 suffixes[suffix] += len(suffix)
         #We make a set, to speed contains, so sorted doesn't meens nothing
-        self._prefixes = set(key for key, value in \
-                         sorted(((k, v) for k, v in prefixes.items() if v > len(k) * 2),
-                         key=itemgetter(1), reverse=True))
-        self._suffixes = set(key for key, value in \
-                         sorted(((k, v) for k, v in suffixes.items() if v > len(k) * 2),
-                         key=itemgetter(1), reverse=True))
+        prefixes = set(key for key, value in \
+                   sorted(((k, v) for k, v in prefixes.items() if v > len(k) * 2),
+                   key=itemgetter(1), reverse=True))
+        suffixes = set(key for key, value in \
+                   sorted(((k, v) for k, v in suffixes.items() if v > len(k) * 2),
+                   key=itemgetter(1), reverse=True))
+        return prefixes, suffixes
+
+    @property
+    def afixes(self):
+        """
+        The (prefixes, suffixes) of the words, shared by the lexicons of this
+        path.
+        """
+        if not self.PATH in self._afixes:
+            if isinstance(self.loaded, CompiledLexicon):
+                self._afixes[self.PATH] = (set(self.loaded.prefixes),
+                                           set(self.loaded.suffixes))
+            else:
+                self._afixes[self.PATH] = self.create_afixes()
+        return self._afixes[self.PATH]
 
     @property
     def prefixes(self):
-        if self._prefixes is None:
-            self.create_afixes()
-        return self._prefixes
+        return self.afixes[0]
 
     @property
     def suffixes(self):
-        if self._suffixes is None:
-            self.create_afixes()
-        return self._suffixes
+        return self.afixes[1]
 
     def get_entry(self, entry):
         if entry in self:
@@ -208,14 +261,36 @@ class LexiconEntity(object):
     """
 
     def __init__(self, raw_data, **kwargs):
+        # Initalize data from original line
+        self.set_tags(*self.parse(raw_data))
+
+    @staticmethod
+    def parse(raw_data):
+        """
+        Return the word of a lexicon line, and its [(tag, lemme), ...].
+        """
+        word, tags = raw_data.split("\t")
+        final = []
+        for one_tag in tags.split():
+            tag, lemme = one_tag.split("/")
+            final.append((tag, lemme))
+        return word, final
+
+    @classmethod
+    def from_tags(cls, word, tags):
+        """
+        Create the entity of word, from its [(tag, lemme), ...].
+        """
+        entity = cls.__new__(cls)
+        entity.set_tags(word, tags)
+        return entity
+
+    def set_tags(self, word, tags):
+        self.word = word
         self.default_tag = None
         self.default_lemme = None
-        # Initalize data from original line
-        self.word, tags = raw_data.split("\t")
         self.tags = dict()
-        tags = tags.split()
-        for one_tag in tags:
-            tag, lemme = one_tag.split("/")
+        for tag, lemme in tags:
             if self.default_tag is None:
                 self.default_tag = tag
             if self.default_lemme is None:
@@ -23,6 +23,7 @@ class SulciForm(forms.Form):
     limit = forms.IntegerField(initial=15, required=False, help_text="(int, default=15) Limit number of returnerd descriptors")
     corpus = forms.ChoiceField(choices=CORPUS, required=False, help_text="(string, default=liberation) Corpus to use. Available choices: liberation, lemondediplo, rezo")
     keyentities = forms.BooleanField(required=False, help_text="(boolean, default=false) Return also the extracted entities from the content")
+    highlight = forms.BooleanField(required=False, help_text="(boolean, default=false) Return also the spans (start, end) of the extracted entities in the content")
     debug = forms.BooleanField(required=False, help_text="(boolean, default=false) Return a HTML debug info")
 
     def clean_min_score(self):
@@ -49,6 +50,12 @@ class SulciForm(forms.Form):
             self.cleaned_data["keyentities"] = False
         return self.cleaned_data["keyentities"]
 
+    def clean_highlight(self):
+        highlight = self.cleaned_data.get("highlight", None)
+        if not highlight:
+            self.cleaned_data["highlight"] = False
+        return self.cleaned_data["highlight"]
+
     def clean_debug(self):
         debug = self.cleaned_data.get("debug", None)
         if not debug:
@@ -89,9 +96,14 @@ class WSView(object):
                         keyentities = [(unicode(k), round(k.frequency_relative_pmi_confidence * 100, 2)) for k in sorted_ke]
                     else:
                         keyentities = None
+                    if form.cleaned_data['highlight']:
+                        highlight = [(unicode(k), k.raw_spans) for k in S.keyentities]
+                    else:
+                        highlight = None
                     c = {
                         "descriptors": descriptors,
                         "keyentities": keyentities,
+                        "highlight": highlight,
                     }
                     if form.cleaned_data["debug"]:
                         S.debug()
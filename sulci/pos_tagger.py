@@ -1,18 +1,95 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import time
+
+from collections import OrderedDict
+
 from sulci.rules_templates import ContextualTemplateGenerator, LexicalTemplateGenerator
 from sulci.base import Token
+from sulci.transducer import ContextualTransducer
 from sulci.textutils import modern_istitle
+from sulci.batch import BatchProcessor
+from sulci.profiling import RulesProfile
+from sulci.compiled_lexicon import lexicon_paths, source_signature
+from sulci import config
+
+
+class LexicalCache(object):
+    """
+    Bounded LRU cache of the lexical tagging of the words, shared by all the
+    documents.
+
+    For each word, it keeps its default tag, and the runs of lexical rules that
+    only depend on the word: {(tag, rule index): (tag, index of the next rule
+    depending on the context, whether a rule matched)}. The rules depending on
+    the neighbours of the token (goodleft, goodright) are always tested on the
+    token itself, so the result is exactly the one of the rules applied one
+    after the other.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.signature = None
+        self.clear()
+
+    def clear(self):
+        self.words = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def check(self, signature):
+        """
+        Empty the cache if the lexicon or the rules have changed.
+        """
+        if signature != self.signature:
+            self.clear()
+            self.signature = signature
+
+    def entry(self, word):
+        """
+        Return the [default tag, runs] of word, and mark it as recently used.
+        """
+        try:
+            entry = self.words.pop(word)
+        except KeyError:
+            entry = [None, {}]
+            if len(self.words) >= self.size:
+                self.words.popitem(last=False)
+        self.words[word] = entry
+        return entry
+
+    def hit_rate(self):
+        """
+        Proportion of the tokens tagged without testing any rule only
+        depending on the word.
+        """
+        total = self.hits + self.misses
+        return total and 1.0 * self.hits / total or 0.0
+
+    def stats(self):
+        return {"words": len(self.words), "hits": self.hits,
+                "misses": self.misses, "hit_rate": self.hit_rate()}
 
 
 class PosTagger(object):
     """
     Part-of-speech tagger.
     """
+    _lexical_caches = {}  # One by lexicon path, shared by the taggers
 
-    def __init__(self, lexicon):
+    def __init__(self, lexicon, cache_size=None):
+        """
+        cache_size is the number of words kept in the lexical cache (default
+        config.LEXICAL_CACHE_SIZE), 0 disables it.
+        """
         self.lexicon = lexicon
+        self._compiled_rules = {}
+        self._transducer = None
+        self.profiles = None
+        if cache_size is None:
+            cache_size = config.LEXICAL_CACHE_SIZE
+        self.cache_size = cache_size
 
     def default_tag(self, token):
         if isinstance(token, Token):
@@ -26,26 +103,210 @@ class PosTagger(object):
         else:
             return "SBC:sg"
 
+    def compiled_rules(self, generator, **kwargs):
+        """
+        Return the rules of the generator as (template, from_tag, to_tag,
+        complement) tuples, uncompiled once for all.
+        The rules are compiled again if the generator reloads them.
+        """
+        rules = generator.load_compiled()
+        cached = self._compiled_rules.get(generator)
+        if cached is None or cached[0] is not rules:
+            compiled = []
+            for from_tag, to_tag, name, complement in rules:
+                template, _ = generator.get_instance(name, **kwargs)
+                compiled.append((template, from_tag, to_tag, complement))
+            cached = self._compiled_rules[generator] = (rules, compiled)
+        return cached[1]
+
+    def apply_rules(self, tokens, rules, profile=None):
+        """
+        Apply compiled rules, in order, to a list of tokens.
+
+        The positions of the tokens are indexed by their current tag, so a
+        rule only tests the tokens tagged with its from_tag (or all of them if
+        it has none), instead of scanning the whole list.
+        The rules whose complement only depends on the word are tested once
+        per distinct word.
+        The complements only look at the words and the verified tags, never at
+        the current tags, so the tokens a rule changes do not depend on the
+        order they are changed in: this gives the same result as
+        RuleTemplate.apply_rule, rule after rule.
+        profile is an optional RulesProfile recording the usage of each rule.
+        """
+        by_tag = {}
+        for idx, token in enumerate(tokens):
+            by_tag.setdefault(token.tag, set()).add(idx)
+        for rule_idx, (template, from_tag, to_tag, complement) in enumerate(rules):
+            if profile is not None:
+                before = time.time()
+            if from_tag:
+                candidates = by_tag.get(from_tag)
+                if not candidates:
+                    if profile is not None:
+                        profile.record(rule_idx, time.time() - before, 0)
+                    continue
+            else:
+                candidates = xrange(len(tokens))
+            if template.word_based:
+                tested = {}
+                matches = []
+                for idx in candidates:
+                    token = tokens[idx]
+                    try:
+                        match = tested[token.original]
+                    except KeyError:
+                        match = tested[token.original] = template.test_complement(token, complement)
+                    if match:
+                        matches.append(idx)
+            else:
+                matches = [idx for idx in candidates
+                           if template.test_complement(tokens[idx], complement)]
+            if profile is not None:
+                profile.record_tags(rule_idx, time.time() - before, len(candidates),
+                                    [tokens[idx] for idx in matches], to_tag)
+            for idx in matches:
+                token = tokens[idx]
+                by_tag[token.tag].discard(idx)
+                by_tag.setdefault(to_tag, set()).add(idx)
+                token.tag = to_tag
+                # Maybe we should do this only in training mode
+                token.sample.reset_trainer_status()
+
+    @property
+    def lexical_cache(self):
+        """
+        The LexicalCache of the lexicon, or None if disabled.
+        It is emptied when the lexicon.lxc file changes (size or mtime), or
+        when the lexical rules are loaded again.
+        """
+        if not self.cache_size or self.profiles is not None:
+            return None
+        cache = self._lexical_caches.get(self.lexicon.PATH)
+        if cache is None:
+            cache = self._lexical_caches[self.lexicon.PATH] = LexicalCache(self.cache_size)
+        LexicalTemplateGenerator.load()
+        source_path, _ = lexicon_paths(self.lexicon.PATH)
+        cache.check((LexicalTemplateGenerator.load_version, source_signature(source_path)))
+        return cache
+
+    def word_rules_run(self, token, tag, start, rules):
+        """
+        Apply the rules, from the start index, until one depends on the
+        context of the token.
+        Return the tag, the index of this rule (or len(rules)), and whether a
+        rule matched.
+        """
+        matched = False
+        for idx in xrange(start, len(rules)):
+            template, from_tag, to_tag, complement = rules[idx]
+            if from_tag and tag != from_tag:
+                continue
+            if not template.word_based:
+                return tag, idx, matched
+            if template.test_complement(token, complement):
+                tag = to_tag
+                matched = True
+        return tag, len(rules), matched
+
+    def cached_lexical_tag(self, tokens, cache, default_tag=False):
+        """
+        Same as apply_rules with the lexical rules (and default tag if
+        default_tag is True), using the LexicalCache.
+        """
+        rules = self.compiled_rules(LexicalTemplateGenerator, lexicon=self.lexicon)
+        end = len(rules)
+        for token in tokens:
+            entry = cache.entry(token.original)
+            hit = True
+            if default_tag:
+                if entry[0] is None:
+                    entry[0] = self.default_tag(token)
+                    hit = False
+                token.tag = entry[0]
+            runs = entry[1]
+            tag = token.tag
+            idx = 0
+            matched = False
+            while True:
+                try:
+                    tag, idx, run_matched = runs[(tag, idx)]
+                except KeyError:
+                    run = runs[(tag, idx)] = self.word_rules_run(token, tag, idx, rules)
+                    tag, idx, run_matched = run
+                    hit = False
+                matched = matched or run_matched
+                if idx == end:
+                    break
+                # This rule depends on the context, it's tested on the token
+                template, from_tag, to_tag, complement = rules[idx]
+                if template.test_complement(token, complement):
+                    tag = to_tag
+                    matched = True
+                idx += 1
+            if hit:
+                cache.hits += 1
+            else:
+                cache.misses += 1
+            if matched:
+                token.tag = tag
+                # Maybe we should do this only in training mode
+                token.sample.reset_trainer_status()
+
     def lexical_tag(self, token):
         """
         Apply lexical tag to a token or list of tokens
         """
         tks = token if hasattr(token, "__iter__") else [token]
-        rules = LexicalTemplateGenerator.load()
-        for rule in rules:
-            template, _ = LexicalTemplateGenerator.get_instance(rule, self.lexicon)
-            template.apply_rule(tks, rule)
+        cache = self.lexical_cache
+        if cache is not None:
+            self.cached_lexical_tag(tks, cache)
+        else:
+            rules = self.compiled_rules(LexicalTemplateGenerator, lexicon=self.lexicon)
+            profile = self.profiles and self.profiles["lexical"]
+            self.apply_rules(list(tks), rules, profile)
         # Return a list if a list was given
         return tks if hasattr(token, "__iter__") else tks[0]
 
+    @property
+    def transducer(self):
+        """
+        The contextual rules compiled into a ContextualTransducer.
+        """
+        rules = self.compiled_rules(ContextualTemplateGenerator)
+        if self._transducer is None or self._transducer[0] is not rules:
+            self._transducer = (rules, ContextualTransducer(rules))
+        return self._transducer[1]
+
     def contextual_tag(self, token):
         tks = token if hasattr(token, "__iter__") else [token]
-        rules = ContextualTemplateGenerator.load()
-        for rule in rules:
-            template, _ = ContextualTemplateGenerator.get_instance(rule)
-            template.apply_rule(tks, rule)
+        if self.profiles is not None:
+            # The transducer applies all the rules at once, use the rules one
+            # after the other to profile them
+            self.apply_rules(list(tks), self.compiled_rules(ContextualTemplateGenerator),
+                             self.profiles["contextual"])
+        else:
+            self.transducer.apply(tks)
         return tks if hasattr(token, "__iter__") else tks[0]
 
+    def start_profiling(self):
+        """
+        Record the usage of each lexical and contextual rule (see RulesProfile)
+        until stop_profiling is called. The taggings are slower meanwhile.
+        """
+        self.profiles = {
+            "lexical": RulesProfile(LexicalTemplateGenerator),
+            "contextual": RulesProfile(ContextualTemplateGenerator),
+        }
+        return self.profiles
+
+    def stop_profiling(self):
+        """
+        Return the profiles recorded since start_profiling.
+        """
+        profiles, self.profiles = self.profiles, None
+        return profiles
+
     def get_tag(self, tokens):
         final = []
         for token in tokens:
@@ -58,9 +319,23 @@ class PosTagger(object):
         #manage final and just lexical modes
 
     def tag_all(self, tokens, lexical=True, contextual=True):
-        for tk in tokens:
-            self.tag(tk)
-        if lexical:
-            self.lexical_tag(tokens)
+        cache = lexical and self.lexical_cache
+        if cache:
+            # The default tags are cached too
+            self.cached_lexical_tag(tokens, cache, default_tag=True)
+        else:
+            for tk in tokens:
+                self.tag(tk)
+            if lexical:
+                self.lexical_tag(tokens)
         if contextual:
             self.contextual_tag(tokens)
+
+    def tag_batch(self, items, processes=None, lexical=True, contextual=True):
+        """
+        Tag many samples, or texts with samples, over a pool of processes (see
+        sulci.batch). Return the items, in the same order.
+        """
+        processor = BatchProcessor(self, processes=processes, lexical=lexical,
+                                   contextual=contextual)
+        return processor.process(items)
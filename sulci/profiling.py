@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Usage of the rules of the PosTagger and the Lemmatizer, and pruning of the
+rules that are useless on the corpus.
+
+Start a profile with PosTagger.start_profiling or Lemmatizer.start_profiling,
+process some texts, then look at the RulesProfile returned by
+stop_profiling.
+"""
+from operator import itemgetter
+
+from sulci.utils import load_file, save_to_file
+from sulci.log import sulci_logger
+
+
+class RulesProfile(object):
+    """
+    For each rule of a generator, in the order they are applied: the time
+    spent applying it, the tokens it tested (candidates), and the ones it
+    changed.
+    For the tokens with a verified value (the corpus), the changes are also
+    counted as good (the value is now the verified one) or bad (it was the
+    verified one).
+    """
+
+    def __init__(self, generator):
+        self.generator = generator
+        self.rules = generator.load()
+        size = len(self.rules)
+        self.durations = [0.0] * size
+        self.candidates = [0] * size
+        self.changed = [0] * size
+        self.good = [0] * size
+        self.bad = [0] * size
+
+    def __len__(self):
+        return len(self.rules)
+
+    def record(self, idx, duration, candidates, changed=0, good=0, bad=0):
+        self.durations[idx] += duration
+        self.candidates[idx] += candidates
+        self.changed[idx] += changed
+        self.good[idx] += good
+        self.bad[idx] += bad
+
+    def record_tags(self, idx, duration, candidates, matches, to_tag):
+        """
+        Record a tagger rule, matches are the tokens it is about to tag
+        to_tag.
+        """
+        changed = good = bad = 0
+        for token in matches:
+            if token.tag == to_tag:
+                continue
+            changed += 1
+            if token.verified_tag == to_tag:
+                good += 1
+            elif token.verified_tag == token.tag:
+                bad += 1
+        self.record(idx, duration, candidates, changed, good, bad)
+
+    def record_lemmes(self, idx, duration, candidates, lemmes):
+        """
+        Record a lemmatizer rule, once applied: lemmes are the lemmes of the
+        candidates before.
+        """
+        changed = good = bad = 0
+        for token, lemme in zip(candidates, lemmes):
+            if token.lemme == lemme:
+                continue
+            changed += 1
+            if token.verified_lemme == token.lemme:
+                good += 1
+            elif token.verified_lemme == lemme:
+                bad += 1
+        self.record(idx, duration, len(candidates), changed, good, bad)
+
+    def dead_rules(self):
+        """
+        Indexes of the rules that never changed a token.
+        """
+        return [idx for idx in xrange(len(self)) if not self.changed[idx]]
+
+    def neutral_rules(self):
+        """
+        Indexes of the rules that changed tokens, but made as many errors as
+        they fixed, or more.
+        """
+        return [idx for idx in xrange(len(self))
+                if self.changed[idx] and self.good[idx] <= self.bad[idx]]
+
+    def report(self, limit=None):
+        """
+        Log the rules, the most time consuming first.
+        """
+        sulci_logger.info(u"%s: %d rules, %.3f s, %d dead, %d neutral" % (
+            self.generator.__name__, len(self), sum(self.durations),
+            len(self.dead_rules()), len(self.neutral_rules())), "YELLOW", True)
+        by_duration = sorted(enumerate(self.durations), key=itemgetter(1), reverse=True)
+        for idx, duration in by_duration[:limit]:
+            sulci_logger.info(u"%8.4f s %8d candidates %6d changed %6d good %6d bad  %s" % (
+                duration, self.candidates[idx], self.changed[idx], self.good[idx],
+                self.bad[idx], self.rules[idx]), "WHITE")
+
+    def pruned_path(self):
+        return self.generator.RULES_FILE.replace(".rls", ".pruned.rls")
+
+    def save_pruned(self, removed, path=None):
+        """
+        Write the rules file without the rules at the removed indexes, the
+        other lines are kept as is.
+        Return the path of the file.
+        """
+        path = path or self.pruned_path()
+        removed = set(removed)
+        lines = []
+        idx = 0  # Index of the rule of the line, a rule can be there twice
+        for line in load_file(self.generator.RULES_FILE).split(u"\n"):
+            if self.generator.parse_rules(line):
+                if idx in removed:
+                    line = None
+                idx += 1
+            if line is not None:
+                lines.append(line)
+        save_to_file(path, u"\n".join(lines))
+        return path
+
+
+def compile_rules(generator, rules, **kwargs):
+    """
+    Compile rules of a PosTagger generator, as PosTagger.compiled_rules does.
+    """
+    final = []
+    for rule in rules:
+        from_tag, to_tag, name, complement = generator.uncompile(rule)
+        template, _ = generator.get_instance(name, **kwargs)
+        final.append((template, from_tag, to_tag, complement))
+    return final
+
+
+def prune_rules(profile, count_errors):
+    """
+    Return the indexes of the rules of profile to remove: the dead ones, and
+    the neutral ones if the corpus has no more errors without them.
+    count_errors(rules) must return the number of errors on the corpus the
+    profile was recorded on, when using these rules instead of the current
+    ones. As the dead rules did not change any token of this corpus, removing
+    them gives the same result.
+    """
+    dead = profile.dead_rules()
+    neutral = profile.neutral_rules()
+    if not neutral:
+        return dead
+    reference = count_errors(profile.rules)
+    removed = set(dead + neutral)
+    pruned = [rule for idx, rule in enumerate(profile.rules) if idx not in removed]
+    errors = count_errors(pruned)
+    sulci_logger.info(u"%s: %d errors with all the rules, %d without the dead "
+                      u"and neutral ones" % (profile.generator.__name__, reference, errors),
+                      "WHITE")
+    if errors > reference:
+        return dead
+    return sorted(removed)
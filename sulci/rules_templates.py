@@ -1,20 +1,110 @@
 #!/usr/bin/env python
 # -*- coding:utf-8 -*-
 
+import os
+import tempfile
+import cPickle as pickle
+
 from operator import itemgetter
 from GenericCache.GenericCache import GenericCache
 
-from utils import load_file, save_to_file, log
+from utils import load_file, save_to_file, log, get_dir
 from base import RetrievableObject
 
 # Cache
 cache = GenericCache()
 
 
+class RulesArtifact(object):
+    """
+    The rules files, parsed once and stored in a versioned binary file (built
+    by `sulci_train.py -R`), so they are loaded at startup without any
+    parsing.
+    The rules of a generator are parsed again, in memory only, if the artifact
+    is not built, or if its rules file has changed since.
+    """
+    PATH = "corpus/rules.artifact"
+    VERSION = 1  # To be incremented when the compiled rules format changes
+    _entries = None
+
+    @classmethod
+    def path(cls):
+        return (not cls.PATH.startswith("/") and get_dir() or "") + cls.PATH
+
+    @staticmethod
+    def signature(generator):
+        stat = os.stat(get_dir() + generator.RULES_FILE)
+        return (stat.st_size, stat.st_mtime)
+
+    @classmethod
+    def entries(cls):
+        if cls._entries is None:
+            cls._entries = {}
+            try:
+                f = open(cls.path(), "rb")
+                try:
+                    version, entries = pickle.load(f)
+                finally:
+                    f.close()
+            except IOError:
+                return cls._entries  # Not built
+            except Exception:
+                log("Invalid rules artifact, run sulci_train.py -R", "RED")
+                return cls._entries
+            if version == cls.VERSION:
+                cls._entries = entries
+        return cls._entries
+
+    @classmethod
+    def parse(cls, generator):
+        rules = generator.parse_rules(load_file(generator.RULES_FILE))
+        compiled = [generator.uncompile(rule) for rule in rules]
+        return cls.signature(generator), rules, compiled
+
+    @classmethod
+    def build(cls, generators=None):
+        """
+        Parse the rules files of the generators (default: all of them), and
+        write the artifact.
+        """
+        if generators is None:
+            generators = (ContextualTemplateGenerator, LexicalTemplateGenerator,
+                          LemmatizerTemplateGenerator)
+        entries = dict((generator.__name__, cls.parse(generator))
+                       for generator in generators)
+        path = cls.path()
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            f = os.fdopen(fd, "wb")
+            try:
+                pickle.dump((cls.VERSION, entries), f, pickle.HIGHEST_PROTOCOL)
+            finally:
+                f.close()
+            os.rename(tmp_path, path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        cls._entries = entries
+        return path
+
+    @classmethod
+    def get(cls, generator):
+        """
+        Return the rules of a generator, and their compiled form (see the
+        generator.uncompile methods).
+        """
+        entries = cls.entries()
+        entry = entries.get(generator.__name__)
+        if entry is None or entry[0] != cls.signature(generator):
+            entry = entries[generator.__name__] = cls.parse(generator)
+        return entry[1], entry[2]
+
+
 class RuleTemplate(RetrievableObject):
     """
     Class for managing rules creation and analysis.
     """
+    word_based = False  # True if test_complement only depends on the word
 
     def __init__(self, pk, **kwargs):
         self.id = pk
@@ -78,10 +168,8 @@ class RuleTemplate(RetrievableObject):
 
         # Sorting using the rapport good / bad,
         # Giving advantage to the more numerous, if rapport is close.
-        coeff = 0.1  # The lower the coeff, the stronger the rules with bad = 0
-        g = lambda good, bad: (float(good) / (float(good) + float(bad))) * ((float(good) / MAX) ** coeff)
         try:
-            return sorted([(r[0], g(r[1], r[2])) for r in rules if r[1] / max(r[2], 1) >= minval], key=itemgetter(1), reverse=True)[0]
+            return sorted([(r[0], cls.score(r[1], r[2], MAX)) for r in rules if r[1] / max(r[2], 1) >= minval], key=itemgetter(1), reverse=True)[0]
         except IndexError:
             return None, None
         # Sorting with the difference between good and bad,
@@ -89,6 +177,24 @@ class RuleTemplate(RetrievableObject):
         # Adding 0.1 to prevent from division by 0.
 #        return sorted([(r[0], (r[1] - r[2] - (r[2] / (r[1] + 0.1)))) for r in rules], key=itemgetter(1), reverse=True)[0]
 
+    @classmethod
+    def score(cls, good, bad, MAX):
+        """
+        Score of a rule for select_one.
+        """
+        coeff = 0.1  # The lower the coeff, the stronger the rules with bad = 0
+        return (float(good) / (float(good) + float(bad))) * ((float(good) / MAX) ** coeff)
+
+    @classmethod
+    def best_score(cls, good, MAX, minval=2):
+        """
+        Return the best score select_one can give to a rule correcting good
+        errors (whatever its bad), or None if it can not select it.
+        """
+        if good < minval:
+            return None
+        return cls.score(good, 0, MAX)
+
     def make_rules(self, token):
         comp = self.get_complement(token)
         if len(comp) > 0:
@@ -111,7 +217,10 @@ class RuleTemplate(RetrievableObject):
 class ContextualTemplateGenerator(type):
 
     register = dict()
+    RULES_FILE = "corpus/contextual_rules.rls"
     _loaded_rules = None
+    _compiled_rules = None
+    load_version = 0  # Incremented each time the rules are loaded
 
     def __new__(mcs, name, base, dict):
         theclass = type.__new__(mcs, name, base, dict)
@@ -143,17 +252,36 @@ class ContextualTemplateGenerator(type):
         save_to_file("corpus/contextual_rules.pdg",
                      "\n".join(rule for rule, score in rules))
 
+    @classmethod
+    def parse_rules(cls, content):
+        return [r for r in content.split(u"\n") if len(r) > 1]
+
+    @classmethod
+    def uncompile(cls, rule):
+        """
+        Return the (from_tag, to_tag, template name, complement) of a rule.
+        """
+        return ContextualBaseTemplate.uncompile_rule(rule)
+
     @classmethod
     def load(cls):
         """
-        Load rules from config file.
+        Load rules from config file (through the RulesArtifact).
         """
         if cls._loaded_rules is None:
             log("Loading contextual rules...", "CYAN", True)
-            lx = load_file("corpus/contextual_rules.rls")
-            cls._loaded_rules = [r for r in lx.split(u"\n") if len(r) > 1]
+            cls._loaded_rules, cls._compiled_rules = RulesArtifact.get(cls)
+            cls.load_version += 1
         return cls._loaded_rules
 
+    @classmethod
+    def load_compiled(cls):
+        """
+        Load the rules, uncompiled, in the same order.
+        """
+        cls.load()
+        return cls._compiled_rules
+
 
 class ContextualBaseTemplate(RuleTemplate):
     """
@@ -170,6 +298,21 @@ class ContextualBaseTemplate(RuleTemplate):
         comp = " ".join(unicode(c) for c in complement)
         return u"%s %s %s %s" % (from_tag, to_tag, self.__class__.__name__, comp)
 
+    def rule_key(self, complement):
+        """
+        Hashable key of a rule complement, see complement_keys.
+        """
+        return tuple(complement)
+
+    def complement_keys(self, token):
+        """
+        Return the keys matching the context of token: test_complement is
+        True if rule_key(complement) is one of them.
+        Used by the ContextualTransducer to find the rules without testing
+        them one by one.
+        """
+        return [tuple(self.get_complement(token))]
+
     @classmethod
     def uncompile_rule(self, rule):
         try:
@@ -183,7 +326,10 @@ class ContextualBaseTemplate(RuleTemplate):
 class LexicalTemplateGenerator(type):
 
     register = dict()
+    RULES_FILE = "corpus/lexical_rules.rls"
     _loaded_rules = None  # caching
+    _compiled_rules = None
+    load_version = 0  # Incremented each time the rules are loaded
 
     def __new__(mcs, name, base, dict):
         theclass = type.__new__(mcs, name, base, dict)
@@ -213,18 +359,35 @@ class LexicalTemplateGenerator(type):
                      for rule, score
                      in sorted(rules, key=itemgetter(1), reverse=True)))
 
+    @classmethod
+    def parse_rules(cls, content):
+        final = []
+        for line in content.split(u"\n"):
+            els = line.split(u"\t")
+            if els[0] != u"":
+                final.append(els[0])
+        return final
+
+    @classmethod
+    def uncompile(cls, rule):
+        """
+        Return the (from_tag, to_tag, template name, complement) of a rule.
+        """
+        return LexicalBaseTemplate.uncompile_rule(rule)
+
     @classmethod
     def load(cls):
         if cls._loaded_rules is None:
             log("Loading lexical rules...", "CYAN", True)
-            cls._loaded_rules = []
-            lx = load_file("corpus/lexical_rules.rls")
-            for line in lx.split(u"\n"):
-                els = line.split(u"\t")
-                if els[0] != u"":
-                    cls._loaded_rules.append(els[0])
+            cls._loaded_rules, cls._compiled_rules = RulesArtifact.get(cls)
+            cls.load_version += 1
         return cls._loaded_rules
 
+    @classmethod
+    def load_compiled(cls):
+        cls.load()
+        return cls._compiled_rules
+
 
 class LexicalBaseTemplate(RuleTemplate):
     """
@@ -232,6 +395,7 @@ class LexicalBaseTemplate(RuleTemplate):
     """
     __metaclass__ = LexicalTemplateGenerator
     _uncompiled_rules = {}
+    word_based = True
 
     def __init__(self, pk, **kwargs):
         self.id = pk
@@ -275,6 +439,14 @@ class LexicalBaseTemplate(RuleTemplate):
 
 
 class ProximityCheckTemplate(LexicalBaseTemplate):
+    word_based = False  # Looks at the neighbors
+
+    def rule_key(self, complement):
+        return complement
+
+    def complement_keys(self, token):
+        # The complement is one of the neighbors words
+        return self.get_complement(token)
 
     def compile_rule(self, from_tag, to_tag, complement):
         """
@@ -330,15 +502,9 @@ class deletesuf(LexiconCheckTemplate):
 
     def get_complement(self, token):
         """
-        Return a tuple of afix, ceased_token.
+        Return the (affix, ceased_token) where ceased_token is in the lexicon.
         """
-        final = []
-        tlen = len(token.original)
-        for i in xrange(1, min(5 + 1, tlen)):
-            affix = token.original[tlen - i:tlen]
-            ceased_tk = token.original[:i]
-            final.append((affix, ceased_tk))
-        return final
+        return self.lexicon.tries.deleted_suffixes(token.original, 5)
 
     def test_complement(self, token, complement):
         """
@@ -367,13 +533,10 @@ class deletepref(LexiconCheckTemplate):
     """
 
     def get_complement(self, token):
-        final = []
-        tlen = len(token.original)
-        for i in xrange(1, min(5, tlen)):
-            ceased_tk = token.original[i:]
-            affix = token.original[0:i]
-            final.append((affix, ceased_tk))
-        return final
+        """
+        Return the (affix, ceased_token) where ceased_token is in the lexicon.
+        """
+        return self.lexicon.tries.deleted_prefixes(token.original, 4)
 
     def test_complement(self, token, complement):
         """
@@ -406,12 +569,15 @@ class addpref(LexiconCheckTemplate):
     """
 
     def get_complement(self, token):
-        final = []
-        if token.original in self.lexicon.factors:
-            for affix in self.lexicon.prefixes:
-                increased_tk = self.modified_token(token, affix)
-                final.append((affix, increased_tk))
-        return final
+        """
+        Return the (affix, increased_token) where affix is one of the lexicon
+        prefixes, and increased_token is in the lexicon.
+        """
+        prefixes = self.lexicon.prefixes
+        return [(affix, increased_tk) for affix, increased_tk
+                in self.lexicon.tries.added_prefixes(token.original,
+                                                         self.lexicon.MAX_PREFIX_LENGTH)
+                if affix in prefixes]
 
     def modified_token(self, token, complement):
         return complement + token.original
@@ -439,12 +605,15 @@ class addsuf(LexiconCheckTemplate):
     """
 
     def get_complement(self, token):
-        final = []
-        if token.original in self.lexicon.factors:
-            for affix in self.lexicon.suffixes:
-                increased_tk = self.modified_token(token, affix)
-                final.append((affix, increased_tk))
-        return final
+        """
+        Return the (affix, increased_token) where affix is one of the lexicon
+        suffixes, and increased_token is in the lexicon.
+        """
+        suffixes = self.lexicon.suffixes
+        return [(affix, increased_tk) for affix, increased_tk
+                in self.lexicon.tries.added_suffixes(token.original,
+                                                         self.lexicon.MAX_SUFFIX_LENGTH)
+                if affix in suffixes]
 
     def modified_token(self, token, complement):
         return token.original + complement
@@ -616,6 +785,12 @@ class OrTemplate(ContextualBaseTemplate):
 #        print complement, self.get_complement(token)
         return complement[0] in self.get_complement(token)
 
+    def rule_key(self, complement):
+        return complement[0]
+
+    def complement_keys(self, token):
+        return self.get_complement(token)
+
     def make_rules(self, token):
         nb = self.get_complement(token)
         final = []
@@ -821,7 +996,10 @@ class WDPREVTAG(TagWordBasedTemplate):
 class LemmatizerTemplateGenerator(type):
 
     register = dict()
+    RULES_FILE = "corpus/lemmatizer_rules.rls"
     _loaded_rules = None
+    _compiled_rules = None
+    load_version = 0  # Incremented each time the rules are loaded
 
     def __new__(mcs, name, base, dict):
         theclass = type.__new__(mcs, name, base, dict)
@@ -852,18 +1030,36 @@ class LemmatizerTemplateGenerator(type):
                      in rules))
 #                     in sorted(rules, key=itemgetter(1), reverse=True)))
 
+    @classmethod
+    def parse_rules(cls, content):
+        final = []
+        for line in content.split(u"\n"):
+            els = line.split(u"\t")
+            if els[0] != u"":
+                final.append(els[0])
+        return final
+
+    @classmethod
+    def uncompile(cls, rule):
+        """
+        Return the template name of a rule, and its uncompiled arguments.
+        """
+        name = rule.split(" ")[1]
+        return name, cls.register[name].uncompile_rule(rule)
+
     @classmethod
     def load(cls):
         if cls._loaded_rules is None:
             log("Loading lemmatizer rules...", "CYAN", True)
-            lx = load_file("corpus/lemmatizer_rules.rls")
-            cls._loaded_rules = []
-            for line in lx.split(u"\n"):
-                els = line.split(u"\t")
-                if els[0] != u"":
-                    cls._loaded_rules.append(els[0])
+            cls._loaded_rules, cls._compiled_rules = RulesArtifact.get(cls)
+            cls.load_version += 1
         return cls._loaded_rules
 
+    @classmethod
+    def load_compiled(cls):
+        cls.load()
+        return cls._compiled_rules
+
 
 class LemmatizerBaseTemplate(RetrievableObject):
     """
@@ -891,9 +1087,39 @@ class LemmatizerBaseTemplate(RetrievableObject):
         from_tag = self.uncompile_rule(rule)[0]
         return token.tag == from_tag
 
-    def uncompile_rule(self, rule):
+    @classmethod
+    def uncompile_rule(cls, rule):
         return rule.split(" ")
 
+    def apply_rule(self, tokens, rule):
+        self.apply_uncompiled(tokens, self.uncompile_rule(rule))
+
+    def apply_uncompiled(self, tokens, args):
+        """
+        Apply the rule, given by the result of uncompile_rule.
+        """
+        pass  # Must be overwrited
+
+    def apply_token(self, token, args):
+        """
+        Apply the rule to one candidate token.
+        """
+        pass  # Must be overwrited
+
+    def indexed_suffix(self, args):
+        """
+        Return the suffix the lemme must end with for the rule to apply, or
+        None if the tag is the only condition (see LemmatizerRulesIndex).
+        """
+        return None
+
+    def max_good(self, args, lemmes):
+        """
+        Return the most tokens the rule can correct, lemmes being the counts
+        of the verified lemmes of the tokens with its tag.
+        """
+        return sum(lemmes.itervalues())
+
     def __unicode__(self):
         return u"<%s %s>" % (self.__class__.__name__, self.id)
 
@@ -926,12 +1152,16 @@ class MAKELOWER(LemmatizerBaseTemplate):
         else:
             return -1
 
-    def apply_rule(self, tokens, rule):
+    def apply_uncompiled(self, tokens, args):
+        tag = args[0]
         for token in tokens:
-            if self.is_candidate(token, rule):
-                token.lemme = token.lemme.lower()
-                # Maybe we should do this only in training mode
-                token.sample.reset_trainer_status()
+            if token.tag == tag:
+                self.apply_token(token, args)
+
+    def apply_token(self, token, args):
+        token.lemme = token.lemme.lower()
+        # Maybe we should do this only in training mode
+        token.sample.reset_trainer_status()
 
 
 class CHANGESUFFIX(LemmatizerBaseTemplate):
@@ -954,7 +1184,8 @@ class CHANGESUFFIX(LemmatizerBaseTemplate):
     def compile_rule(self, tag, to_delete, to_add):
         return '''%s %s "%s" "%s"''' % (tag, self.__class__.__name__, to_delete, to_add)
 
-    def uncompile_rule(self, rule):
+    @classmethod
+    def uncompile_rule(cls, rule):
         els = rule.split(" ")
         return els[0], els[2][1:-1], els[3][1:-1]
 
@@ -973,13 +1204,24 @@ class CHANGESUFFIX(LemmatizerBaseTemplate):
         else:
             return -1
 
-    def apply_rule(self, tokens, rule):
-        tag, to_delete, to_add = self.uncompile_rule(rule)
+    def apply_uncompiled(self, tokens, args):
+        tag, to_delete, to_add = args
         for token in tokens:
-            if self.is_candidate(token, rule):
-                token.lemme = token.lemme[:-len(to_delete)] + to_add
-                # Maybe we should do this only in training mode
-                token.sample.reset_trainer_status()
+            if token.tag == tag and token.lemme[-len(to_delete):] == to_delete:
+                self.apply_token(token, args)
+
+    def apply_token(self, token, args):
+        tag, to_delete, to_add = args
+        token.lemme = token.lemme[:-len(to_delete)] + to_add
+        # Maybe we should do this only in training mode
+        token.sample.reset_trainer_status()
+
+    def indexed_suffix(self, args):
+        return args[1]
+
+    def max_good(self, args, lemmes):
+        # The new lemme ends with to_add
+        return sum(count for lemme, count in lemmes.iteritems() if lemme.endswith(args[2]))
 
 
 class FORCELEMME(LemmatizerBaseTemplate):
@@ -1005,10 +1247,16 @@ class FORCELEMME(LemmatizerBaseTemplate):
         else:
             return -1
 
-    def apply_rule(self, tokens, rule):
-        tag, _, lemme = self.uncompile_rule(rule)
+    def apply_uncompiled(self, tokens, args):
+        tag = args[0]
         for token in tokens:
-            if self.is_candidate(token, rule):
-                token.lemme = lemme
-                # Maybe we should do this only in training mode
-                token.sample.reset_trainer_status()
+            if token.tag == tag:
+                self.apply_token(token, args)
+
+    def apply_token(self, token, args):
+        token.lemme = args[2]
+        # Maybe we should do this only in training mode
+        token.sample.reset_trainer_status()
+
+    def max_good(self, args, lemmes):
+        return lemmes.get(args[2], 0)
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+All tests regarding sulci.columnar module.
+"""
+
+import unittest
+
+from sulci import columnar
+from sulci.columnar import Vocabulary, ColumnarText, TokenView, SampleView, \
+                           reset_vocabulary
+from sulci.textmining import StemmedText
+from sulci.pos_tagger import PosTagger
+from sulci.textutils import iter_tokens
+
+__all__ = ["VocabularyTest", "ColumnarTextTest"]
+
+
+class VocabularyTest(unittest.TestCase):
+
+    def test_intern(self):
+        vocabulary = Vocabulary()
+        self.assertEqual(vocabulary.intern(None), 0)
+        id = vocabulary.intern(u"chat")
+        self.assertEqual(vocabulary.intern(u"chat"), id)
+        self.assertNotEqual(vocabulary.intern(u"chien"), id)
+        self.assertEqual(vocabulary[id], u"chat")
+        self.assertEqual(len(vocabulary), 3)
+
+    def test_reset_vocabulary(self):
+        text = ColumnarText.from_tokens([u"Un", u"ornithorynque", u"."])
+        self.assertTrue(text.vocabulary is columnar.VOCABULARY)
+        old = reset_vocabulary()
+        self.assertTrue(old is text.vocabulary)
+        self.assertNotIn(u"ornithorynque", columnar.VOCABULARY)
+        # The ids of the texts already built are still valid
+        self.assertEqual(text.column("words"), [u"Un", u"ornithorynque", u"."])
+        other = ColumnarText.from_tokens([u"Un", u"chat"])
+        self.assertTrue(other.vocabulary is columnar.VOCABULARY)
+        self.assertNotIn(u"ornithorynque", other.vocabulary)
+
+
+class ColumnarTextTest(unittest.TestCase):
+
+    def setUp(self):
+        self.text = ColumnarText.from_tokens(
+            [u"Un", u"chat", u".", u"Un", u"chien", u"noir", u"."],
+            Vocabulary()
+        )
+
+    def test_samples(self):
+        self.assertEqual(len(self.text), 7)
+        self.assertEqual(list(self.text.bounds), [0, 3, 7])
+        samples = self.text.samples
+        self.assertEqual([len(s) for s in samples], [3, 4])
+        self.assertTrue(isinstance(samples[1], SampleView))
+        self.assertEqual([t.original for t in samples[1]], [u"Un", u"chien", u"noir", u"."])
+
+    def test_token_view(self):
+        token = self.text.samples[1][2]
+        self.assertTrue(isinstance(token, TokenView))
+        self.assertEqual(token.original, u"noir")
+        self.assertEqual(token.position, 2)
+        self.assertEqual(token.parent.id, 1)
+        self.assertEqual([t.original for t in token.get_neighbors(-1, 1)], [u"chien", u"."])
+        self.assertEqual(token.next_bigram, None)
+        self.assertTrue(token.parent.is_token(u"chien", 1))
+
+    def test_token_view_writes_in_columns(self):
+        token = self.text.samples[0][1]
+        token.tag = u"SBC:sg"
+        token.lemme = u"chat"
+        self.assertEqual(self.text.column("tags")[1], u"SBC:sg")
+        self.assertEqual(self.text.samples[0][1].tag, u"SBC:sg")
+        self.assertEqual(self.text.column("lemmes", 0, 3), [u"Un", u"chat", u"."])
+
+    def test_token_view_caches_its_sample(self):
+        token = list(self.text)[4]
+        self.assertEqual(token.sample_index, 1)
+        self.assertEqual(token.position, 1)
+        self.assertTrue(token.parent is token.parent)
+        sample = self.text.samples[1]
+        self.assertTrue(sample[0].parent is sample)
+
+    def test_token_view_maps_token_attributes(self):
+        token = self.text.samples[1][1]
+        self.assertEqual((token.start, token.end, token.features, token.stemm),
+                         (None, None, None, None))
+        token.start, token.end = 10, 15
+        token.compute_features()
+        token.stemm = u"stemm"
+        same = TokenView(self.text, 4)
+        self.assertEqual((same.start, same.end), (10, 15))
+        self.assertEqual(same.features, token.features)
+        self.assertNotEqual(same.features, None)
+        self.assertEqual(same.stemm, u"stemm")
+        self.assertEqual(self.text.samples[0][1].stemm, None)
+
+    def test_offsets_from_samples(self):
+        stemmed = StemmedText(u"Le chat dort.")
+        text = ColumnarText.from_samples(stemmed.samples)
+        self.assertEqual([(t.start, t.end) for t in text],
+                         [(t.start, t.end) for t in stemmed.tokens])
+
+    def test_training_tokens(self):
+        text = ColumnarText.from_tokens([u"Un/DTN:sg/un", u"chat/SBC:sg"], Vocabulary())
+        self.assertEqual(text.column("words"), [u"Un", u"chat"])
+        self.assertEqual(text.column("verified_tags"), [u"DTN:sg", u"SBC:sg"])
+        self.assertEqual(text.column("verified_lemmes"), [u"un", u"chat"])
+
+    def test_ngrams_counts(self):
+        counts = self.text.ngrams_counts(2, "words")
+        self.assertEqual(counts[(self.text.vocabulary.intern(u"Un"),
+                                 self.text.vocabulary.intern(u"chien"))], 1)
+        # N-grams don't cross the samples boundaries
+        decoded = [self.text.vocabulary.decode(ngram) for ngram in counts]
+        self.assertNotIn((u".", u"Un"), decoded)
+        self.assertEqual(sum(counts.values()), 5)
+
+    def test_same_tags_and_lemmes_as_stemmedtext(self):
+        raw = u"Le chat noir mange une souris. Il dort dans le jardin."
+        stemmed = StemmedText(raw)
+        text = ColumnarText.from_tokens(iter_tokens(raw))
+        text.tag_all(stemmed.postagger)
+        text.lemmatize(stemmed.lemmatizer)
+        self.assertEqual(text.column("tags"), [t.tag for t in stemmed.tokens])
+        self.assertEqual(text.column("lemmes"), [t.lemme for t in stemmed.tokens])
+
+    def test_same_tags_and_lemmes_without_lexical_cache(self):
+        raw = u"Le chat mange. Le chat dort. Le chien noir dort dans le jardin."
+        stemmed = StemmedText(raw)
+        postagger = PosTagger(stemmed.lexicon, cache_size=0)
+        text = ColumnarText.from_tokens(iter_tokens(raw))
+        text.tag_all(postagger)
+        text.lemmatize(stemmed.lemmatizer)
+        self.assertEqual(text.column("tags"), [t.tag for t in stemmed.tokens])
+        self.assertEqual(text.column("lemmes"), [t.lemme for t in stemmed.tokens])
+
+if __name__ == "__main__":
+    unittest.main()
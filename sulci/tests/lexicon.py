@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+All tests regarding sulci.lexicon and the tries of its words.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from sulci.lexicon import Lexicon
+from sulci.compiled_lexicon import CompiledLexicon
+from sulci.tries import WordTrie, LexiconTries, FactorIndex
+from sulci.base import Token
+from sulci.rules_templates import LexicalTemplateGenerator
+
+__all__ = ["WordTrieTest", "LexiconTriesTest", "FactorIndexTest",
+           "CompiledLexiconTest"]
+
+
+class WordTrieTest(unittest.TestCase):
+
+    def setUp(self):
+        self.trie = WordTrie([u"chant", u"chanter", u"chanteur", u"chat"])
+
+    def test_contains(self):
+        self.assertTrue(u"chant" in self.trie)
+        self.assertFalse(u"chan" in self.trie)
+        self.assertFalse(u"chien" in self.trie)
+
+    def test_ends(self):
+        self.assertEqual(self.trie.ends(u"chanteurs"), [5, 8])
+        self.assertEqual(self.trie.ends(u"chanteur", 6), [8])
+        self.assertEqual(self.trie.ends(u"chanteur", 0, 7), [5])
+
+    def test_completions(self):
+        self.assertEqual(sorted(self.trie.completions(u"chant", 3)), [u"er", u"eur"])
+        self.assertEqual(self.trie.completions(u"chant", 2), [u"er"])
+        self.assertEqual(self.trie.completions(u"cho", 3), [])
+
+
+class LexiconTriesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tries = LexiconTries([u"faire", u"refaire", u"défaire", u"fait", u"fa"])
+
+    def test_added_affixes(self):
+        self.assertEqual(sorted(self.tries.added_prefixes(u"faire", 3)),
+                         [(u"dé", u"défaire"), (u"re", u"refaire")])
+        self.assertEqual(sorted(self.tries.added_suffixes(u"fa", 3)),
+                         [(u"ire", u"faire"), (u"it", u"fait")])
+
+    def test_deleted_affixes(self):
+        self.assertEqual(self.tries.deleted_prefixes(u"refaire", 4), [(u"re", u"faire")])
+        self.assertEqual(self.tries.deleted_suffixes(u"faire", 5), [(u"ire", u"fa")])
+        self.assertEqual(self.tries.deleted_suffixes(u"faire", 2), [])
+
+    def test_same_complements_as_lexicon_lookups(self):
+        lexicon = Lexicon()
+        for word in [u"mangeaient", u"retrouver", u"président", u"partis"]:
+            template, _ = LexicalTemplateGenerator.get_instance("deletepref", lexicon=lexicon)
+            expected = [(word[:i], word[i:]) for i in xrange(1, min(5, len(word)))
+                        if word[i:] in lexicon]
+            self.assertEqual(sorted(template.get_complement(Token(0, word))), sorted(expected))
+            template, _ = LexicalTemplateGenerator.get_instance("addsuf", lexicon=lexicon)
+            expected = [(affix, word + affix) for affix in lexicon.suffixes
+                        if word + affix in lexicon]
+            self.assertEqual(sorted(template.get_complement(Token(0, word))), sorted(expected))
+
+
+class FactorIndexTest(unittest.TestCase):
+
+    def factors(self, words):
+        """
+        The pieces of words, as Lexicon.add_factors used to store them.
+        """
+        final = set()
+        for word in words:
+            for start in xrange(len(word)):
+                for end in xrange(start + 1, len(word) + 1):
+                    if end - start < len(word):
+                        final.add(word[start:end])
+        return final
+
+    def test_contains(self):
+        index = FactorIndex([u"chant", u"chat", u"enchanter"])
+        self.assertTrue(u"han" in index)
+        self.assertTrue(u"chant" in index)  # Piece of enchanter
+        self.assertFalse(u"chat" in index)  # Only the whole word
+        self.assertFalse(u"tch" in index)  # Not across words
+        self.assertFalse(u"" in index)
+
+    def test_same_factors_as_set(self):
+        words = [u"a", u"ab", u"abab", u"ba", u"bab", u"défaire", u"faire"]
+        index = FactorIndex(words)
+        factors = self.factors(words)
+        candidates = factors | set(words) | set(w + u"a" for w in words)
+        for candidate in candidates:
+            self.assertEqual(candidate in index, candidate in factors, candidate)
+
+    def test_shared_by_lexicons(self):
+        self.assertTrue(Lexicon().factors is Lexicon().factors)
+        self.assertTrue(u"anger" in Lexicon().factors)
+
+
+class CompiledLexiconTest(unittest.TestCase):
+
+    LINES = [u"chanter\tVNCFF/chanter", u"chanté\tPAR:sg/chanter ADJ:sg/chanté",
+             u"chantés\tPAR:pl/chanter", u"enchanter\tVNCFF/enchanter",
+             u"ré\tSBC:sg/ré SBC:sg/ré2", u"été\tVNCFF/être SBC:sg/été"]
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        with open(os.path.join(self.path, "lexicon.lxc"), "w") as f:
+            f.write(u"\n".join(self.LINES).encode("utf-8"))
+        self.text = Lexicon(self.path).loaded
+        Lexicon._loaded.pop(self.path)
+        Lexicon(self.path).compile()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        for cache in (Lexicon._loaded, Lexicon._afixes, Lexicon._factors):
+            cache.pop(self.path, None)
+
+    def test_same_entries(self):
+        compiled = Lexicon(self.path).loaded
+        self.assertTrue(isinstance(compiled, CompiledLexicon))
+        self.assertEqual(sorted(compiled), sorted(self.text))
+        for word, entity in self.text.items():
+            self.assertTrue(word in compiled)
+            for attr in ("word", "tags", "default_tag", "default_lemme"):
+                self.assertEqual(getattr(compiled[word], attr), getattr(entity, attr))
+        self.assertFalse(u"chant" in compiled)
+        self.assertRaises(KeyError, compiled.__getitem__, u"chant")
+
+    def test_same_afixes_and_factors(self):
+        lexicon = Lexicon(self.path)
+        self.assertEqual(lexicon.afixes, lexicon.create_afixes(self.text))
+        self.assertTrue(u"chant" in lexicon.factors)
+        self.assertTrue(u"chanter" in lexicon.factors)
+        self.assertFalse(u"été" in lexicon.factors)
+
+    def test_no_temporary_file_left(self):
+        self.assertEqual(sorted(os.listdir(self.path)), ["lexicon.lxb", "lexicon.lxc"])
+        Lexicon(self.path).compile()  # Replaces the compiled file
+        self.assertEqual(sorted(os.listdir(self.path)), ["lexicon.lxb", "lexicon.lxc"])
+
+    def test_outdated(self):
+        with open(os.path.join(self.path, "lexicon.lxc"), "a") as f:
+            f.write(u"\nchantre\tSBC:sg/chantre".encode("utf-8"))
+        self.assertEqual(CompiledLexicon.open(self.path), None)
+        self.assertTrue(u"chantre" in Lexicon(self.path))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""
+All tests regarding sulci.pos_tagger.PosTagger class.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from sulci.lexicon import Lexicon
+from sulci.pos_tagger import PosTagger, LexicalCache
+from sulci.rules_templates import LexicalTemplateGenerator, ContextualTemplateGenerator, \
+                                  LemmatizerTemplateGenerator, RulesArtifact
+from sulci.textmining import StemmedText
+from sulci.lemmatizer import Lemmatizer, LemmatizerRulesIndex
+from sulci.lemme_table import LemmeTable
+from sulci.corpus import TextCorpus
+from sulci.batch import BatchProcessor
+from sulci.profiling import RulesProfile, prune_rules
+from sulci.utils import load_file, get_dir
+from sulci.benchmarks import corpus_files
+
+__all__ = ["PosTaggerRulesTest", "ContextualTransducerTest", "RulesArtifactTest",
+           "LexicalCacheTest", "BatchTest",
+           "RulesProfileTest", "LemmatizerRulesIndexTest", "LemmeTableTest"]
+
+
+class PosTaggerRulesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.lexicon = Lexicon()
+        self.tagger = PosTagger(lexicon=self.lexicon)
+        self.raw = u"Le président a rapidement annoncé une réforme des retraites. " \
+                   u"Les syndicats, très mécontents, manifestaient déjà à Paris."
+
+    def tokens(self):
+        return StemmedText(self.raw, self.tagger, lexicon=self.lexicon).tokens
+
+    def test_same_tags_as_rule_by_rule(self):
+        expected = self.tokens()
+        for token in expected:
+            self.tagger.tag(token)
+        for rule in LexicalTemplateGenerator.load():
+            template, _ = LexicalTemplateGenerator.get_instance(rule, self.lexicon)
+            template.apply_rule(expected, rule)
+        for rule in ContextualTemplateGenerator.load():
+            template, _ = ContextualTemplateGenerator.get_instance(rule)
+            template.apply_rule(expected, rule)
+        tokens = self.tokens()
+        self.tagger.tag_all(tokens)
+        self.assertEqual([t.tag for t in tokens], [t.tag for t in expected])
+
+    def test_compiled_rules_are_cached(self):
+        rules = self.tagger.compiled_rules(ContextualTemplateGenerator)
+        self.assertEqual(len(rules), len(ContextualTemplateGenerator.load()))
+        self.assertIs(self.tagger.compiled_rules(ContextualTemplateGenerator), rules)
+
+
+class ContextualTransducerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tagger = PosTagger(lexicon=Lexicon())
+
+    def assertSameAsSequential(self, tokens):
+        self.tagger.tag_all(tokens, contextual=False)
+        tags = [t.tag for t in tokens]
+        for rule in ContextualTemplateGenerator.load():
+            template, _ = ContextualTemplateGenerator.get_instance(rule)
+            template.apply_rule(tokens, rule)
+        expected = [t.tag for t in tokens]
+        self.assertNotEqual(expected, tags)  # Some rules must have matched
+        for token, tag in zip(tokens, tags):
+            token.tag = tag
+        self.tagger.contextual_tag(tokens)
+        self.assertEqual([t.tag for t in tokens], expected)
+
+    def test_same_tags_as_sequential_rules(self):
+        raw = u"Il est en général assez droit, soit gauche. Les enfants les voient."
+        self.assertSameAsSequential(StemmedText(raw, self.tagger).tokens)
+
+    def test_same_tags_as_sequential_rules_in_training(self):
+        # The tag based rules use the verified tags
+        self.assertSameAsSequential(TextCorpus(corpus_files()[0]).tokens)
+
+
+class RulesArtifactTest(unittest.TestCase):
+
+    def test_compiled_rules(self):
+        for generator in (ContextualTemplateGenerator, LexicalTemplateGenerator,
+                          LemmatizerTemplateGenerator):
+            rules = generator.load()
+            self.assertEqual(generator.load_compiled(),
+                             [generator.uncompile(rule) for rule in rules])
+
+    def test_rules_are_parsed_again_if_the_file_changed(self):
+        generator = ContextualTemplateGenerator
+        rules, compiled = RulesArtifact.get(generator)
+        RulesArtifact.entries()[generator.__name__] = ((0, 0), [], [])
+        self.assertEqual(RulesArtifact.get(generator), (rules, compiled))
+
+    def test_only_built_explicitly(self):
+        path, default_path = tempfile.mkdtemp(), RulesArtifact.PATH
+        try:
+            RulesArtifact.PATH = os.path.join(path, "rules.artifact")
+            RulesArtifact._entries = None
+            expected = RulesArtifact.get(LemmatizerTemplateGenerator)
+            self.assertEqual(os.listdir(path), [])  # Parsed in memory only
+            RulesArtifact.build()
+            self.assertEqual(os.listdir(path), ["rules.artifact"])
+            RulesArtifact._entries = None
+            self.assertTrue(LemmatizerTemplateGenerator.__name__ in RulesArtifact.entries())
+            self.assertEqual(RulesArtifact.get(LemmatizerTemplateGenerator), expected)
+        finally:
+            RulesArtifact.PATH = default_path
+            RulesArtifact._entries = None
+            shutil.rmtree(path)
+
+
+class LexicalCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.lexicon = Lexicon()
+        self.raw = u"Les enfants des voisins mangeaient rapidement. " \
+                   u"Les enfants des voisins mangeaient rapidement."
+
+    def tags(self, tagger):
+        tokens = StemmedText(self.raw, tagger, lexicon=self.lexicon).tokens
+        tagger.tag_all(tokens, contextual=False)
+        return [t.tag for t in tokens]
+
+    def test_same_tags_as_without_cache(self):
+        tagger = PosTagger(lexicon=self.lexicon)
+        self.assertTrue(tagger.lexical_cache is not None)
+        expected = self.tags(PosTagger(lexicon=self.lexicon, cache_size=0))
+        self.assertEqual(self.tags(tagger), expected)
+        # Now from the cache
+        self.assertEqual(self.tags(tagger), expected)
+        self.assertTrue(tagger.lexical_cache.hit_rate() > 0)
+
+    def test_cache_is_shared_and_invalidated(self):
+        tagger = PosTagger(lexicon=self.lexicon)
+        cache = tagger.lexical_cache
+        self.assertIs(PosTagger(lexicon=self.lexicon).lexical_cache, cache)
+        cache.entry(u"mot")
+        cache.check(None)  # Eg. new rules
+        self.assertEqual(cache.stats()["words"], 0)
+
+    def test_cache_is_invalidated_when_the_lexicon_file_changes(self):
+        path = tempfile.mkdtemp()
+        try:
+            shutil.copy(get_dir() + "corpus/lexicon.lxc", path)
+            tagger = PosTagger(lexicon=Lexicon(path))
+            tagger.lexical_cache.entry(u"mot")
+            self.assertEqual(tagger.lexical_cache.stats()["words"], 1)
+            # Same size, other mtime, eg. an entry edited in place
+            stat = os.stat(os.path.join(path, "lexicon.lxc"))
+            os.utime(os.path.join(path, "lexicon.lxc"), (stat.st_atime, stat.st_mtime + 10))
+            self.assertEqual(tagger.lexical_cache.stats()["words"], 0)
+        finally:
+            shutil.rmtree(path)
+            PosTagger._lexical_caches.pop(path, None)
+
+    def test_cache_is_invalidated_when_the_rules_are_loaded_again(self):
+        tagger = PosTagger(lexicon=self.lexicon)
+        tagger.lexical_cache.entry(u"mot")
+        LexicalTemplateGenerator._loaded_rules = None
+        self.assertEqual(tagger.lexical_cache.stats()["words"], 0)
+
+    def test_lru(self):
+        cache = LexicalCache(2)
+        cache.entry(u"un")[0] = u"DTN:sg"
+        cache.entry(u"deux")
+        cache.entry(u"un")
+        cache.entry(u"trois")
+        self.assertEqual(list(cache.words), [u"un", u"trois"])
+        self.assertEqual(cache.entry(u"un")[0], u"DTN:sg")
+
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.lexicon = Lexicon()
+        self.tagger = PosTagger(lexicon=self.lexicon)
+        self.lemmatizer = Lemmatizer(self.lexicon)
+
+    def values(self, texts):
+        return [[(t.original, t.tag, t.lemme) for t in text.tokens] for text in texts]
+
+    def test_same_results_as_in_process(self):
+        texts = [TextCorpus(path) for path in corpus_files()[:3]]
+        for text in texts:
+            self.tagger.tag_all(text.tokens)
+            self.lemmatizer.do(text.tokens)
+        expected = self.values(texts)
+        for text in texts:
+            for token in text.tokens:
+                token.tag = token.lemme = None
+        with BatchProcessor(self.tagger, self.lemmatizer, processes=2) as processor:
+            self.assertEqual(processor.process(texts), texts)
+        self.assertEqual(self.values(texts), expected)
+
+    def test_samples_of_a_text(self):
+        raw = u"Le chat dort. Les enfants mangent. Il pleut sur Paris."
+        expected = StemmedText(raw, self.tagger, self.lemmatizer, self.lexicon)
+        text = StemmedText(raw, self.tagger, self.lemmatizer, self.lexicon)
+        for token in text.tokens:
+            token.tag = None
+        self.tagger.tag_batch(text.samples, processes=2)
+        self.assertEqual([t.tag for t in text.tokens], [t.tag for t in expected.tokens])
+
+class RulesProfileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.lexicon = Lexicon()
+        self.tagger = PosTagger(lexicon=self.lexicon)
+
+    def test_same_tags_when_profiling(self):
+        corpus = TextCorpus(corpus_files()[0])
+        self.tagger.tag_all(corpus.tokens)
+        expected = [t.tag for t in corpus.tokens]
+        profiles = self.tagger.start_profiling()
+        self.tagger.tag_all(corpus.tokens)
+        self.assertIs(self.tagger.stop_profiling(), profiles)
+        self.assertEqual([t.tag for t in corpus.tokens], expected)
+        contextual = profiles["contextual"]
+        self.assertEqual(len(contextual), len(ContextualTemplateGenerator.load()))
+        self.assertTrue(sum(contextual.changed) > 0)
+        self.assertTrue(sum(contextual.good) >= sum(contextual.bad))
+        for kind in ("lexical", "contextual"):
+            profile = profiles[kind]
+            for idx in xrange(len(profile)):
+                self.assertTrue(profile.good[idx] + profile.bad[idx]
+                                <= profile.changed[idx] <= profile.candidates[idx])
+
+    def test_lemmatizer_profile(self):
+        lemmatizer = Lemmatizer(self.lexicon)
+        text = StemmedText(u"Les enfants mangent des pommes.", self.tagger, lemmatizer,
+                           self.lexicon)
+        tokens = text.tokens
+        for token in tokens:
+            token.lemme = token.original
+        profile = lemmatizer.start_profiling()
+        lemmatizer.do(tokens)
+        self.assertIs(lemmatizer.stop_profiling(), profile)
+        self.assertEqual([t.lemme for t in tokens], [t.lemme for t in text.tokens])
+        self.assertTrue(sum(profile.changed) > 0)
+
+    def test_prune_rules(self):
+        profile = RulesProfile(LemmatizerTemplateGenerator)
+        profile.changed = [1] * len(profile)
+        profile.good = [1] * len(profile)
+        profile.changed[0] = 0  # Dead
+        profile.good[1] = 0  # Neutral
+        self.assertEqual(prune_rules(profile, lambda rules: 10), [0, 1])
+        self.assertEqual(prune_rules(profile, lambda rules: 10 + (len(rules) < len(profile))),
+                         [0])
+        path = os.path.join(tempfile.mkdtemp(), "rules.rls")
+        profile.save_pruned([0, 1], path)
+        rules = LemmatizerTemplateGenerator.parse_rules(load_file(path))
+        self.assertEqual(rules, profile.rules[2:])
+
+
+class LemmatizerRulesIndexTest(unittest.TestCase):
+
+    def test_same_lemmes_as_rule_by_rule(self):
+        lemmatizer = Lemmatizer(Lexicon())
+        tokens = TextCorpus(corpus_files(".lem.crp")[0]).tokens
+        results = []
+        for indexed in (False, True):
+            for token in tokens:
+                token.tag = token.verified_tag
+                token.lemme = token.original
+            if indexed:
+                lemmatizer.rules_index(LemmatizerTemplateGenerator.load_compiled()).apply_all(tokens)
+            else:
+                for name, args in LemmatizerTemplateGenerator.load_compiled():
+                    template, _ = LemmatizerTemplateGenerator.get_instance(name)
+                    template.apply_uncompiled(tokens, args)
+            results.append([t.lemme for t in tokens])
+        self.assertEqual(results[0], results[1])
+
+    def test_next_rule(self):
+        index = LemmatizerRulesIndex([
+            ("CHANGESUFFIX", ("SBC:pl", "s", "")),
+            ("MAKELOWER", ("SBC:pl",)),
+            ("CHANGESUFFIX", ("SBC:pl", "aux", "al")),
+            ("CHANGESUFFIX", ("ADJ:pl", "s", "")),
+        ])
+        self.assertEqual(index.next_rule("SBC:pl", u"chevaux", 0), 1)
+        self.assertEqual(index.next_rule("SBC:pl", u"chevaux", 2), 2)
+        self.assertEqual(index.next_rule("SBC:pl", u"chats", 0), 0)
+        self.assertEqual(index.next_rule("SBC:pl", u"chats", 2), None)
+        self.assertEqual(index.next_rule("VNCFF", u"chats", 0), None)
+
+
+class LemmeTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        shutil.copy(get_dir() + "corpus/lexicon.lxc", self.path)
+        self.lexicon = Lexicon(self.path)
+        self.lemmatizer = Lemmatizer(self.lexicon)
+        self.lemmatizer.compile_table()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        Lexicon._loaded.pop(self.path, None)
+        Lemmatizer._tables.pop(self.path, None)
+
+    def lemmes(self, raw):
+        text = StemmedText(raw, PosTagger(lexicon=self.lexicon), self.lemmatizer,
+                           self.lexicon)
+        for token in text.tokens:
+            token.lemme = token.original
+        self.lemmatizer.do(text.tokens)
+        return [t.lemme for t in text.tokens]
+
+    def test_same_lemmes_as_rules(self):
+        raw = u"Les enfants mangeaient des pommes. Les chevaux du Président sont arrivés."
+        self.assertTrue(self.lemmatizer.table is not None)
+        self.assertEqual(self.lemmatizer.table.get(u"enfants", u"SBC:pl"),
+                         (u"enfant", True))
+        expected = self.lemmes(raw)
+        Lemmatizer._tables[self.path] = None  # Rules only
+        self.assertEqual(self.lemmes(raw), expected)
+
+    def test_outdated(self):
+        with open(os.path.join(self.path, "lexicon.lxc"), "a") as f:
+            f.write(u"\nchevals\tSBC:pl/chevals".encode("utf-8"))
+        self.assertEqual(LemmeTable.open(self.path, LemmatizerTemplateGenerator.RULES_FILE),
+                         None)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,7 +6,8 @@ import argparse
 
 os.environ["SULCI_CONFIG_MODULE"] = "sulci.config.example"
 
-from sulci.tests import textutils, sample, token, stemmedtext, semanticaltagger
+from sulci.tests import textutils, sample, token, stemmedtext, semanticaltagger, \
+                        thesaurus, columnar, postagger, lexicon, trainers
 
 
 if __name__ == "__main__":
@@ -36,7 +37,7 @@ if __name__ == "__main__":
     else:
         # Run all the tests
         suites = []
-        for mod in [textutils, sample, token, stemmedtext, semanticaltagger]:
+        for mod in [textutils, sample, token, stemmedtext, semanticaltagger, thesaurus, columnar, postagger, lexicon, trainers]:
             suite = unittest.TestLoader().loadTestsFromModule(mod)
             suites.append(suite)
         suite = unittest.TestSuite(suites)
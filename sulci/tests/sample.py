@@ -5,9 +5,9 @@ All tests regarding sulci.base.Sample class.
 
 import unittest
 
-from sulci.base import Token, Sample
+from sulci.base import Token, Sample, MEANING
 
-__all__ = ["SampleGenericTest", "SampleAppendTokenTest"]
+__all__ = ["SampleGenericTest", "SampleAppendTokenTest", "SampleMeaningWordsTest"]
 
 
 class SampleGenericTest(unittest.TestCase):
@@ -35,5 +35,29 @@ class SampleAppendTokenTest(unittest.TestCase):
         sample = Sample("xxx")
         self.assertRaises(ValueError, sample.append, "bla")
 
+
+class SampleMeaningWordsTest(unittest.TestCase):
+
+    def make_sample(self):
+        sample = Sample("xxx")
+        for original, tag in ((u"Le", u"DTN:sg"), (u"chat", u"SBC:sg"), (u"dort", u"VCJ:sg")):
+            token = Token(original, original=original)
+            token.tag = tag
+            token.lemme = original
+            sample.append(token)
+        return sample
+
+    def test_should_count_with_the_predicate(self):
+        self.assertEqual(self.make_sample().meaning_words_count(), 2)
+
+    def test_should_count_with_the_computed_features(self):
+        sample = self.make_sample()
+        for token in sample:
+            token.compute_features()
+        self.assertEqual(sample.meaning_words_count(), 2)
+        # The flag is used, the predicate is not called again
+        sample[0].features |= MEANING
+        self.assertEqual(sample.meaning_words_count(), 3)
+
 if __name__ == "__main__":
     unittest.main()
@@ -63,3 +63,36 @@ class FilteredNgramsTests(unittest.TestCase):
             tuple(stemm.main_occurrence.lemme for stemm in ngrams[0][0]),
             (u"mot", u"dingue")
         )
+
+
+class KeyEntitySpansTests(unittest.TestCase):
+
+    def test_spans(self):
+        content = (u"<p>Une phrase avec un <b>mot</b> dingue.</p>"
+                   u"<p>Une autre phrase avec le m&ecirc;me mot dingue.</p>")
+        S = SemanticalTagger(content)
+        keyentity = [k for k in S.keyentities
+                     if [s.main_occurrence.lemme for s in k] == [u"mot", u"dingue"]][0]
+        self.assertEqual(len(keyentity.occurrences), 2)
+        normalized = S.text.normalized_text
+        self.assertEqual([normalized[s:e] for s, e in keyentity.spans],
+                         [u"mot dingue", u"mot dingue"])
+        self.assertEqual([content[s:e] for s, e in keyentity.raw_spans],
+                         [u"mot</b> dingue", u"mot dingue"])
+
+
+class IncrementalTests(unittest.TestCase):
+
+    def keyentities(self, S):
+        return sorted((unicode(k), sorted(k._confidences.items())) for k in S.keyentities)
+
+    def test_same_keyentities_as_full_run(self):
+        first = (u"Une phrase avec un mot dingue. Le mot dingue revient. "
+                 u"Une autre phrase avec le même mot dingue.")
+        edited = (u"Une phrase avec un mot dingue. Le mot dingue revient. "
+                  u"Une phrase ajoutée. Une autre phrase avec le même mot dingue.")
+        previous = SemanticalTagger(first)
+        S = SemanticalTagger(edited, previous=previous)
+        self.assertEqual(S.text.reanalyzed_samples, 1)
+        self.assertEqual(self.keyentities(S), self.keyentities(SemanticalTagger(edited)))
+        self.assertEqual(S.ngrams(), SemanticalTagger(edited).ngrams())
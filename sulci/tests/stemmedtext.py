@@ -2,7 +2,9 @@
 
 import unittest
 
-from sulci.textmining import StemmedText
+from sulci.base import Sample, TrainerSample
+from sulci.corpus import TextCorpus
+from sulci.textmining import StemmedText, Stemm
 
 
 class InstantiateTextTests(unittest.TestCase):
@@ -25,3 +27,72 @@ class InstantiateTextTests(unittest.TestCase):
     def test_exclamation_point_is_a_sentence_delimiter(self):
         text = StemmedText("One sentence! Another.")
         self.assertEqual(len(text.samples), 2)
+
+    def test_samples_are_built_lazily(self):
+        text = StemmedText("One sentence. Another.")
+        consumed = []
+
+        def tokens():
+            for token in ["One", "sentence", ".", "Another", "."]:
+                consumed.append(token)
+                yield token
+
+        samples = text.iter_samples(tokens())
+        first = samples.next()
+        self.assertEqual([t.original for t in first], ["One", "sentence", "."])
+        # Only the first token of the next sample has been read
+        self.assertEqual(len(consumed), 4)
+        self.assertEqual([t.original for t in samples.next()], ["Another", "."])
+        self.assertRaises(StopIteration, samples.next)
+
+    def test_words(self):
+        text = StemmedText("One sentence. Another.")
+        self.assertEqual(len(text), 5)
+        self.assertEqual([t.original for t in text],
+                         ["One", "sentence", ".", "Another", "."])
+        self.assertEqual(text.words, list(text))
+
+    def test_samples_have_no_trainer_status(self):
+        text = StemmedText("One sentence. Another.")
+        sample = text.samples[0]
+        self.assertEqual(type(sample), Sample)
+        self.assertFalse(hasattr(sample, "_trainer_processed"))
+        self.assertFalse(hasattr(sample[0], "__dict__"))
+        sample.reset_trainer_status()  # Called by the rules, does nothing
+
+    def test_training_texts_have_trainer_samples(self):
+        text = TextCorpus()
+        text.content = u"Un/DTN:sg/un chat/SBC:sg ./. Un/DTN:sg chien/SBC:sg ./."
+        self.assertEqual(len(text.samples), 2)
+        sample = text.samples[0]
+        self.assertTrue(isinstance(sample, TrainerSample))
+        for token in sample:
+            token.tag = token.verified_tag
+        sample[1].tag = u"SBP:sg"
+        self.assertEqual(sample.get_errors(), [sample[1]])
+        sample.set_trained_position(1)
+        self.assertEqual(sample.get_errors(), [])
+        sample.reset_trainer_status()
+        self.assertEqual(sample.get_errors(), [sample[1]])
+
+    def test_tokens_pk_is_their_index(self):
+        text = StemmedText("One sentence. Another.")
+        self.assertEqual([t.id for t in text], range(5))
+        self.assertEqual([s.id for s in text.samples], [0, 1])
+
+    def test_stemms_are_stored_by_tuple(self):
+        text = StemmedText("One sentence. Another.")
+        stemm = text.words[1].stemm
+        self.assertIs(text._store_stemm[stemm.id], stemm)
+        self.assertEqual(Stemm.get_or_create(stemm.id, text, text=text), (stemm, False))
+        self.assertEqual(Stemm.get_or_create(list(stemm.id), text, text=text), (stemm, False))
+        self.assertEqual(Stemm.make_pk(u"a  b"), (u"a", u"b"))
+
+    def test_unchanged_samples_are_not_analyzed_again(self):
+        previous = StemmedText(u"Le chat dort. Les enfants mangent.")
+        text = StemmedText(u"Les enfants mangent. Le chien dort. Le chat dort.",
+                           previous=previous)
+        self.assertEqual(text.reanalyzed_samples, 1)
+        expected = StemmedText(text.normalized_text)
+        self.assertEqual([(t.tag, t.lemme, t.start) for t in text],
+                         [(t.tag, t.lemme, t.start) for t in expected])
@@ -2,7 +2,9 @@
 
 import unittest
 
-from sulci.textutils import modern_istitle, normalize_text, tokenize_text, strip_tags, unescape_entities
+from sulci.textutils import modern_istitle, normalize_text, tokenize_text, strip_tags, unescape_entities, \
+                            iter_tokens, iter_token_spans, normalize_text_with_offsets, extract_text, \
+                            edit_distance, edit_distances, lev, MAX_SUBSTITUTIONS
 
 __all__ = [
     "TextUtilsTests",
@@ -26,6 +28,23 @@ class TextUtilsTests(unittest.TestCase):
         self.assertEqual(unescape_entities('&#x0027;'), u"'")
         self.assertEqual(unescape_entities('l&#39;acc&egrave;s'), u"l'accès")
 
+    def test_extract_text(self):
+        self.assertEqual(extract_text(u'<p class="chapo">Just a <b>test</b></p>'), u"Just a test")
+        self.assertEqual(extract_text(u'l&#39;acc&egrave;s &#x0027;&apos;'), u"l'accès ''")
+        self.assertEqual(extract_text(u'<!DOCTYPE html><!-- <b>no</b> -->Just a test'), u"Just a test")
+        self.assertEqual(extract_text(u'Just <SCRIPT>if (a<b) {};</script>a <style>p > b {}</STYLE>test'),
+                         u"Just a test")
+        # Entities are decoded once, and only in the text
+        self.assertEqual(extract_text(u'&lt;b&gt; &amp;eacute; &unknown; &#xZZ;'), u"<b> &eacute; &unknown; &#xZZ;")
+        # Malformed markup
+        self.assertEqual(extract_text(u'a < b et c > d'), u"a < b et c > d")
+        self.assertEqual(extract_text(u'Just a test<script>document.write("'), u"Just a test")
+        self.assertEqual(extract_text(u'Just a test<a href="'), u'Just a test<a href="')
+        self.assertEqual(extract_text(u"Le ratio a<b est faible. Le reste de l'article reste."),
+                         u"Le ratio a<b est faible. Le reste de l'article reste.")
+        self.assertEqual(extract_text(u"Le ratio a<b est faible. <p>Le reste</p>"),
+                         u"Le ratio a<b est faible. Le reste")
+
     def test_modern_istitle(self):
         self.assertTrue(modern_istitle("al-Assad"))
         self.assertTrue(modern_istitle("el-Assad"))
@@ -58,6 +77,76 @@ class TextUtilsTests(unittest.TestCase):
         self.failIf(normalize_text(u'camion-citerne') != u'camion-citerne')
         self.failIf(normalize_text(u"est-ce\n") != u"est - ce\n")
 
+    def test_normalize_text_overlapping_substitutions(self):
+        self.assertEqual(normalize_text(u'Il dit "oui", puis "non".'), u'Il dit «oui», puis «non».')
+        # The char following an opening quote is consumed
+        self.assertEqual(normalize_text(u'""a'), u'«»a')
+        self.assertEqual(normalize_text(u'a"""'), u'a«»"')
+        # The char following an inverted pronoun is consumed
+        self.assertEqual(normalize_text(u'dis-le-moi!'), u'dis - le-moi!')
+        self.assertEqual(normalize_text(u'dis-le-t-il'), u'dis - le - t - il')
+        self.assertEqual(normalize_text(u'mange-t-elle-t-il'), u'mange - t - elle - t - il')
+
+    def test_normalize_text_max_substitutions(self):
+        normalized = normalize_text(u' "a' * (MAX_SUBSTITUTIONS + 8))
+        self.assertEqual(normalized.count(u"«"), MAX_SUBSTITUTIONS)
+        self.assertEqual(normalized.count(u'"'), 8)
+        normalized = normalize_text(u"a-t-il " * (MAX_SUBSTITUTIONS + 8))
+        self.assertEqual(normalized.count(u" - t - "), MAX_SUBSTITUTIONS)
+
+    def test_iter_tokens(self):
+        text = u'<p>Il dit "qu’il viendra".\nViendra-t-il ? 2 000 000 &euro;</p>'
+        self.assertEqual(list(iter_tokens(text)), tokenize_text(normalize_text(text)))
+
+    def test_iter_token_spans(self):
+        text = u"Un point.\nViendra - t - il ?"
+        spans = list(iter_token_spans(text))
+        self.assertEqual([t for t, s, e in spans], tokenize_text(text))
+        for token, start, end in spans:
+            self.assertEqual(text[start:end], token)
+
+    def test_normalize_text_with_offsets(self):
+        raw = u'<p>L&#39;&eacute;t&eacute; "chaud", dit-il, viendra-t-il ?</p>'
+        normalized, offsets = normalize_text_with_offsets(raw)
+        self.assertEqual(normalized, normalize_text(raw))
+
+        def raw_of(token):
+            start = normalized.index(token)
+            start, end = offsets.source_span(start, start + len(token))
+            return raw[start:end]
+        self.assertEqual(raw_of(u"été"), u"&eacute;t&eacute;")
+        self.assertEqual(raw_of(u"«chaud»"), u'"chaud"')
+        self.assertEqual(raw_of(u"il,"), u"il,")
+        self.assertEqual(raw_of(u" - t - "), u"-t-")
+        self.assertEqual(raw_of(u"?"), u"?")
+        raw = u"<p>Le ratio a<b est faible.</p>"
+        normalized, offsets = normalize_text_with_offsets(raw)
+        self.assertEqual(normalized, u"Le ratio a<b est faible.")
+        start = normalized.index(u"a<b")
+        self.assertEqual(offsets.source_span(start, start + 3), (12, 15))
+
+    def test_edit_distance(self):
+        self.assertEqual(edit_distance(u"chat", u"chat"), 0)
+        self.assertEqual(edit_distance(u"", u"chat"), 4)
+        self.assertEqual(edit_distance(u"chat", u"chats"), 1)
+        self.assertEqual(edit_distance(u"chien", u"chat"), 3)
+        self.assertEqual(edit_distance(u"kitten", u"sitting"), 3)
+        self.assertEqual(edit_distance(u"sitting", u"kitten"), 3)
+        self.assertEqual(lev(u"kitten", u"sitting"), 3)
+
+    def test_edit_distance_with_max_distance(self):
+        self.assertEqual(edit_distance(u"kitten", u"sitting", 3), 3)
+        self.assertEqual(edit_distance(u"kitten", u"sitting", 2), 3)
+        self.assertEqual(edit_distance(u"kitten", u"sitting", 0), 1)
+        self.assertEqual(edit_distance(u"a", u"abcdef", 2), 3)
+        self.assertEqual(edit_distance(u"abcdef", u"fedcba", 1), 2)
+
+    def test_edit_distances(self):
+        candidates = [u"ministère", u"ministre", u"monastère", u"mystère"]
+        self.assertEqual(edit_distances(u"ministres", candidates, 2),
+                         [(u"ministère", 2), (u"ministre", 1)])
+        self.assertEqual(len(edit_distances(u"ministres", candidates)), 4)
+
     def test_tokenize_text(self):
 
         def do(t, out):  # shortener
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+All tests regarding sulci.thesaurus.DescriptorIndex class.
+"""
+
+import unittest
+
+from sulci.thesaurus import DescriptorIndex
+
+__all__ = ["DescriptorIndexTest"]
+
+
+class DescriptorIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = DescriptorIndex([
+            u"ministère de la Culture",
+            u"ministre",
+            u"ministère",
+            u"mystère",
+            u"Gbagbo",
+            u"UE",
+        ])
+
+    def test_search_should_return_closest_first(self):
+        self.assertEqual(self.index.search(u"ministres"),
+                         [(u"ministre", 1), (u"ministère", 2)])
+
+    def test_search_should_be_case_insensitive(self):
+        self.assertEqual(self.index.search(u"Ministère de la culture", 0),
+                         [(u"ministère de la Culture", 0)])
+        self.assertEqual(self.index.search(u"gbagbo", 1), [(u"Gbagbo", 0)])
+
+    def test_search_should_respect_max_distance_and_limit(self):
+        self.assertEqual(self.index.search(u"ministère de la Culturel", 1),
+                         [(u"ministère de la Culture", 1)])
+        self.assertEqual(self.index.search(u"monastère", 1), [])
+        self.assertEqual(len(self.index.search(u"monastère", 3, limit=1)), 1)
+
+    def test_search_short_queries(self):
+        self.assertEqual(self.index.search(u"UK", 1), [(u"UE", 1)])
+
+    def test_add(self):
+        self.index.add(u"Ouattara")
+        self.index.add(u"ouattara")  # No duplicates
+        self.assertEqual(len(self.index), 7)
+        self.assertEqual(self.index.search(u"Ouatara"), [(u"Ouattara", 1)])
+
+if __name__ == "__main__":
+    unittest.main()
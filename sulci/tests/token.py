@@ -5,7 +5,8 @@ All tests regarding sulci.base.Token class.
 
 import unittest
 
-from sulci.base import Token, Sample
+from sulci.base import Token, Sample, MEANING, MEANING_ALONE, TOOL_WORD, \
+                       VERB, ETRE, AVOIR, TITLE
 from sulci.textmining import Stemm
 
 __all__ = [
@@ -14,6 +15,7 @@ __all__ = [
     "TokenGetNeighborsTest",
     'TokenNeighborsBigramTest',
     'TokenComparisonTests',
+    'TokenFeaturesTest',
 ]
 
 
@@ -131,5 +133,42 @@ class TokenComparisonTests(unittest.TestCase):
         self.assertTrue(token2 == stemme1)
         self.assertFalse(token2 == stemme2)
 
+
+class TokenFeaturesTest(unittest.TestCase):
+
+    def make(self, original, tag, lemme=None, position=1):
+        token = Token("xxx", original=original, position=position)
+        token.tag = tag
+        token.lemme = lemme or original
+        return token
+
+    def assertSameAsPredicates(self, token):
+        features = token.compute_features()
+        self.assertEqual(token.features, features)
+        self.assertEqual(bool(features & MEANING), token.has_meaning())
+        self.assertEqual(bool(features & MEANING_ALONE), token.has_meaning_alone())
+        self.assertEqual(bool(features & TOOL_WORD), token.is_tool_word())
+        self.assertEqual(bool(features & VERB), token.is_verb())
+        self.assertEqual(bool(features & ETRE), token.is_etre())
+        self.assertEqual(bool(features & AVOIR), token.is_avoir())
+        self.assertEqual(bool(features & TITLE), token.istitle())
+        return features
+
+    def test_features(self):
+        self.assertEqual(self.assertSameAsPredicates(self.make(u"Paris", u"SBP:sg")),
+                         MEANING | MEANING_ALONE | TITLE)
+        self.assertEqual(self.assertSameAsPredicates(self.make(u"mange", u"VCJ:sg", u"manger")),
+                         MEANING | MEANING_ALONE | VERB)
+        self.assertEqual(self.assertSameAsPredicates(self.make(u"est", u"ECJ:sg", u"\xeatre")),
+                         ETRE | TOOL_WORD)
+        self.assertEqual(self.assertSameAsPredicates(self.make(u"a", u"ACJ:sg", u"avoir")),
+                         AVOIR | TOOL_WORD)
+        self.assertEqual(self.assertSameAsPredicates(self.make(u"le", u"DTN:sg")), TOOL_WORD)
+        self.assertEqual(self.assertSameAsPredicates(self.make(u"3", u"NUM")), MEANING)
+        # Usual words at the beginning of a sample
+        self.assertEqual(self.assertSameAsPredicates(self.make(u"Toujours", u"ADV", position=0)),
+                         TOOL_WORD)
+        self.assertSameAsPredicates(self.make(u"Toujours", u"ADV"))
+
 if __name__ == "__main__":
     unittest.main()
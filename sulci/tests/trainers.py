@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+All tests regarding sulci.trainers rules trainers.
+"""
+
+import unittest
+
+from sulci.lexicon import Lexicon
+from sulci.pos_tagger import PosTagger
+from sulci.lemmatizer import Lemmatizer
+from sulci.corpus import Corpus, TextCorpus
+from sulci.trainers import ContextualTrainer, LemmatizerTrainer
+from sulci.utils import load_file
+
+
+class RulesCountsTest(unittest.TestCase):
+    """
+    The trainers must learn the same rules, testing all the rules (or all the
+    candidates) at each step or not.
+    """
+
+    def contextual_trainer(self, incremental):
+        corpus = Corpus()
+        corpus._texts = [TextCorpus("corpus/557656.crp")]
+        return ContextualTrainer(PosTagger(lexicon=Lexicon()), corpus,
+                                 incremental=incremental)
+
+    def lemmatizer_trainer(self, incremental, size=None):
+        lemmatizer = Lemmatizer(Lexicon())
+        lemmatizer._raw_content = u" ".join(load_file("corpus/557456.lxc.lem.crp").split()[:size])
+        return LemmatizerTrainer(lemmatizer, incremental=incremental)
+
+    def test_contextual(self):
+        trainer = self.contextual_trainer(True)
+        rules = trainer.train(export=False)
+        self.assertTrue(rules)
+        self.assertTrue(trainer.counts.full_tests > 0)
+        self.assertEqual(rules, self.contextual_trainer(False).train(export=False))
+
+    def test_all_candidates_tested(self):
+        trainer = self.contextual_trainer(True)
+        rules = trainer.train(export=False)
+        self.assertTrue(trainer.skipped_tests > 0)
+        trainer = self.contextual_trainer(True)
+        trainer.max_good = lambda rule: len(trainer.tokens)  # No pruning
+        self.assertEqual(trainer.train(export=False), rules)
+        self.assertEqual(trainer.skipped_tests, 0)
+
+    def test_screening(self):
+        trainer = self.lemmatizer_trainer(True)
+        trainer.screening = 0.5
+        trainer.check_screening = True
+        rules = trainer.train(export=False)
+        self.assertTrue(rules)
+        self.assertTrue(trainer.screening_checks > 0)
+        self.assertTrue(trainer.screening_changes <= trainer.screening_checks)
+        # A margin above any score: the same rules as without screening
+        trainer = self.lemmatizer_trainer(True)
+        trainer.screening = 0.5
+        trainer.screening_margin = 2
+        self.assertEqual(trainer.train(export=False),
+                         self.lemmatizer_trainer(True).train(export=False))
+        self.assertEqual(trainer.screened_out, 0)
+
+    def test_screening_small_corpus(self):
+        # One sample: the screening sample can't be empty, it is the whole
+        # corpus, so the estimated scores are the real ones
+        trainer = self.lemmatizer_trainer(True, 32)
+        self.assertEqual(len(trainer.samples), 1)
+        trainer.screening = 0.5
+        rules = trainer.train(export=False)
+        self.assertEqual(len(trainer.screening_tokens), len(trainer.tokens))
+        self.assertTrue(rules)
+        self.assertEqual(rules, self.lemmatizer_trainer(True, 32).train(export=False))
+
+    def test_lemmatizer(self):
+        rules = self.lemmatizer_trainer(True).train(export=False)
+        self.assertTrue(rules)
+        self.assertEqual(rules, self.lemmatizer_trainer(False).train(export=False))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,14 +5,13 @@ import math
 
 from operator import itemgetter
 
-from GenericCache.GenericCache import GenericCache
-from GenericCache.decorators import cached
-
 from limpyd import fields
 
 from sulci.utils import uniqify, sort, product
-from sulci.textutils import lev, normalize_text, words_occurrences
-from sulci.base import RetrievableObject, Token, TextManager
+from sulci.textutils import normalize_text, normalize_text_with_offsets, \
+                            words_occurrences
+from sulci.base import RetrievableObject, Token, TextManager, MEANING, \
+                       MEANING_ALONE, VERB, ETRE, AVOIR, TITLE
 from sulci.pos_tagger import PosTagger
 from sulci.lexicon import Lexicon
 from sulci.thesaurus import Trigger, Thesaurus
@@ -21,15 +20,17 @@ from sulci.log import sulci_logger
 from sulci.base import BaseRedisModel
 from sulci import config
 
-#Cache
-cache = GenericCache()
-
 
 class StemmedText(TextManager):
     """
     Basic text class, with tokens, samples, etc.
     """
-    def __init__(self, text, pos_tagger=None, lemmatizer=None, lexicon=None):
+    def __init__(self, text, pos_tagger=None, lemmatizer=None, lexicon=None,
+                 previous=None):
+        """
+        previous is an optional StemmedText of a previous version of the same
+        text: its sentences left unchanged are not tagged and lemmatized again.
+        """
         self._raw_text = text
         self.normalized_text = normalize_text(text)
         if len(self.normalized_text) == 0:
@@ -39,55 +40,120 @@ class StemmedText(TextManager):
             raise ValueError("Can't process an empty text.")
         self.samples = []
         self.keyentities = []
+        self._len = None
+        self._raw_offsets = None
+        self._analyses = None
+        self._medium_word_count = None
+        self.reanalyzed_samples = 0
         self.lexicon = lexicon or Lexicon()
         self.postagger = pos_tagger or PosTagger(lexicon=self.lexicon)
         self.lemmatizer = lemmatizer or Lemmatizer(self.lexicon)
-        self.make()
+        self.make(previous)
         self._stemms = None
 
     def __iter__(self):
-        return self.words.__iter__()
+        return self.iter_words()
 
     def __len__(self):
-        return len(self.words)
+        if self._len is None:
+            self._len = self.words_count()
+        return self._len
 
-    def make(self):
+    def make(self, previous=None):
         """
         Text is expected to be tokenized.
         And filtered ?
+        Tokens and samples are created lazily, and each sample is tagged and
+        lemmatized as soon as it is complete: as the rules only look at the
+        neighbours of a token inside its sample, this gives the same result
+        as processing the whole text at once.
+        For the same reason, a sample with the same tokens as a sample of the
+        previous text takes its tags and lemmes.
         """
-        self.samples, self.tokens = self.instantiate_text(self.tokenize(self.normalized_text))
-        self.postagger.tag_all(self.tokens)
-        self.create_stemm()
-
-    def create_stemm(self):
         self._stemms = set()  # A set because order don't mind
                               # And we want no duplicates
-        self.lemmatizer.do(self.tokens)
-        for tkn in self.tokens:
+        analyses = previous.analyses if previous is not None else {}
+        for sample in self.iter_samples(self.iter_token_spans(self.normalized_text)):
+            analysis = analyses.get(self.sample_key(sample))
+            if analysis is None:
+                self.postagger.tag_all(sample)
+                self.lemmatizer.do(sample.tokens)
+                self.reanalyzed_samples += 1
+            else:
+                for tkn, (tag, lemme) in zip(sample, analysis):
+                    tkn.tag = tag
+                    tkn.lemme = lemme
+            self.create_stemm(sample, lemmatize=False)
+            self.samples.append(sample)
+        sulci_logger.debug("Initial stemms", "BLUE", highlight=True)
+        sulci_logger.debug([unicode(s) for s in self._stemms], "CYAN")
+
+    @staticmethod
+    def sample_key(sample):
+        """
+        What the tags and lemmes of a sample depend on.
+        """
+        return tuple((tkn.original, tkn.verified_tag) for tkn in sample)
+
+    @property
+    def analyses(self):
+        """
+        The (tag, lemme) of the tokens of each sample, by sample_key.
+        """
+        if self._analyses is None:
+            self._analyses = dict(
+                (self.sample_key(sample), [(tkn.tag, tkn.lemme) for tkn in sample])
+                for sample in self.samples
+            )
+        return self._analyses
+
+    def create_stemm(self, tokens, lemmatize=True):
+        if lemmatize:
+            self.lemmatizer.do(tokens)
+        for tkn in tokens:
+            # Tag and lemme are final now
+            tkn.compute_features()
             # We don't take the sg or pl in the tag name
             stm, created = Stemm.get_or_create((unicode(tkn.lemme), tkn.tag.split(u":")[0]), self, original=unicode(tkn.lemme), text=self)
             stm.occurrences.append(tkn)
             tkn.stemm = stm
             self._stemms.add(stm)
-        sulci_logger.debug("Initial stemms", "BLUE", highlight=True)
-        sulci_logger.debug([unicode(s) for s in self._stemms], "CYAN")
 
     @property
-    @cached(cache)
     def medium_word_count(self):
         """
         The medium occurrences count.
         """
-        return float(len(self.words)) / len(set(self.distinct_words()))
+        # Cached on the instance: a cache keyed by the repr of the text would
+        # give the count of a previous text allocated at the same address.
+        if self._medium_word_count is None:
+            self._medium_word_count = float(len(self)) / len(set(self.distinct_words()))
+        return self._medium_word_count
+
+    def raw_span(self, start, end):
+        """
+        Return the span in the raw text of normalized_text[start:end].
+        The mapping is only computed the first time it is needed.
+        """
+        if self._raw_offsets is None:
+            _, self._raw_offsets = normalize_text_with_offsets(self._raw_text)
+        return self._raw_offsets.source_span(start, end)
+
+    def iter_words(self):
+        for sample in self.samples:
+            for word in sample:
+                yield word
 
     @property
     def words(self):
-        return [w for s in self.samples for w in s]
+        return list(self.iter_words())
+
+    # For retrocompatibility.
+    tokens = words
 
     @property
     def meaning_words(self):
-        return [w for s in self.samples for w in s if w.has_meaning()]
+        return [w for w in self.iter_words() if w.features & MEANING]
 
     @property
     def stemms(self):
@@ -108,7 +174,7 @@ class StemmedText(TextManager):
         return sum([s.meaning_words_count() for s in self.samples])
 
     def distinct_words(self):
-        return uniqify(self.words, lambda x: x.original)
+        return uniqify(self.iter_words(), lambda x: x.original)
 
     def distincts_meaning_words(self):
         return uniqify(self.meaning_words, lambda x: x.original)
@@ -118,12 +184,22 @@ class SemanticalTagger(object):
     """
     Main class.
     """
-    def __init__(self, text, thesaurus=None, pos_tagger=None, lemmatizer=None, lexicon=None):
+    def __init__(self, text, thesaurus=None, pos_tagger=None, lemmatizer=None,
+                 lexicon=None, previous=None):
+        """
+        previous is an optional SemanticalTagger of a previous version of the
+        same text (eg. an edited article): only the changed sentences are
+        tagged and lemmatized, and searched for ngrams. The result is the same
+        as without previous.
+        """
         self.thesaurus = thesaurus or Thesaurus()
         if isinstance(text, StemmedText):
             self.text = text
         else:
-            self.text = StemmedText(text, pos_tagger, lemmatizer, lexicon)
+            self.text = StemmedText(text, pos_tagger, lemmatizer, lexicon,
+                                    previous=previous and previous.text)
+        # {(min_length, max_length): {sample_key: ngrams spans}}
+        self._ngrams_spans = dict(previous._ngrams_spans) if previous else {}
         self.keyentities = []
         self.lexicon = lexicon or Lexicon()
         self.postagger = pos_tagger or PosTagger(lexicon=self.lexicon)
@@ -138,19 +214,39 @@ class SemanticalTagger(object):
 
     def ngrams(self, min_length=2, max_length=15):
         final = {}
+        all_spans = self._ngrams_spans.setdefault((min_length, max_length), {})
+        sample_spans = {}
         for idxs, sentence in enumerate(self.text.samples):
-            for begin in range(0, len(sentence)):
-                id_max = min(len(sentence) + 1, begin + max_length + 1)
-                for end in range(begin + min_length, id_max):
-                    g = sentence[begin:end]
-                    # We make the comparison on stemmes
-                    idxg = tuple([w.stemm for w in g])
-                    if not g[0].has_meaning() or not g[len(g) - 1].has_meaning():
-                        continue  # continuing just this for loop. Good ?
-                    if not idxg in final:
-                        final[idxg] = {"count": 1, "stemms": [t.stemm for t in g]}
-                    else:
-                        final[idxg]["count"] += 1
+            key = self.text.sample_key(sentence)
+            spans = all_spans.get(key)
+            if spans is None:
+                spans = self.ngrams_spans(sentence, min_length, max_length)
+            sample_spans[key] = spans
+            for begin, end in spans:
+                g = sentence[begin:end]
+                # We make the comparison on stemmes
+                idxg = tuple([w.stemm for w in g])
+                if not idxg in final:
+                    final[idxg] = {"count": 1, "stemms": [t.stemm for t in g]}
+                else:
+                    final[idxg]["count"] += 1
+        # Only keep the spans of the current sentences
+        self._ngrams_spans[(min_length, max_length)] = sample_spans
+        return final
+
+    def ngrams_spans(self, sentence, min_length=2, max_length=15):
+        """
+        The (begin, end) of the ngrams of a sentence, ie. beginning and ending
+        with a meaning word. They only depend on the tokens of the sentence.
+        """
+        final = []
+        for begin in range(0, len(sentence)):
+            if not sentence[begin].features & MEANING:
+                continue
+            id_max = min(len(sentence) + 1, begin + max_length + 1)
+            for end in range(begin + min_length, id_max):
+                if sentence[end - 1].features & MEANING:
+                    final.append((begin, end))
         return final
 
     def filtered_ngrams(self, min_length=2, max_length=15, min_count=2):
@@ -178,7 +274,8 @@ class SemanticalTagger(object):
                                                   self.text,
                                                   stemms=candidate[0],
                                                   count=candidate[1],
-                                                  text=self.text)
+                                                  text=self.text,
+                                                  thesaurus=self.thesaurus)
             keyentities.append(kp)
         # From frequency
         candidates = self.keystems()
@@ -190,7 +287,8 @@ class SemanticalTagger(object):
                                                   self.text,
                                                   stemms=[candidate],
                                                   count=candidate.count,
-                                                  text=self.text)
+                                                  text=self.text,
+                                                  thesaurus=self.thesaurus)
             keyentities.append(kp)
         self.keyentities = keyentities
         self.deduplicate_keyentities()
@@ -319,7 +417,7 @@ class SemanticalTagger(object):
         sulci_logger.debug("Frequents stemms", "WHITE")
         sulci_logger.debug([(unicode(s), s.count) for s in self.keystems()], "GRAY")
         sulci_logger.debug("Lexical diversity", "WHITE")
-        sulci_logger.debug(1.0 * len(self.text.words) / len(set(self.text.distinct_words())), "GRAY")
+        sulci_logger.debug(1.0 * len(self.text) / len(set(self.text.distinct_words())), "GRAY")
         sulci_logger.debug("Tagged words", "WHITE")
         sulci_logger.debug([(unicode(t), t.tag) for t in self.text.tokens], "GRAY")
         sulci_logger.debug("Sentences", "WHITE")
@@ -360,14 +458,15 @@ class SemanticalTagger(object):
 
 
 class KeyEntity(RetrievableObject):
-    count = 0
-    _confidences = {}
+    __slots__ = ("id", "stemms", "count", "text", "thesaurus", "_confidences",
+                 "_istitle")
 
     def __init__(self, pk, **kwargs):
         self.id = pk
         self.stemms = kwargs["stemms"]
         self.count = kwargs["count"]
         self.text = kwargs["text"]
+        self.thesaurus = kwargs.get("thesaurus")
         self._confidences = {"frequency": None,
                             "title": None,
                             "heuristical_mutual_information": None,
@@ -476,6 +575,39 @@ class KeyEntity(RetrievableObject):
         """
         raise NotImplementedError("This have no sens.")
 
+    @property
+    def occurrences(self):
+        """
+        The sequences of tokens of the text matching this keyentity.
+        """
+        final = []
+        length = len(self.stemms)
+        for token in self.stemms[0].occurrences:
+            sample = token.parent
+            begin = token.position
+            if begin + length > len(sample):
+                continue
+            for idx in xrange(1, length):
+                if sample[begin + idx].stemm is not self.stemms[idx]:
+                    break
+            else:
+                final.append(sample[begin:begin + length])
+        return final
+
+    @property
+    def spans(self):
+        """
+        The (start, end) offsets of the occurrences in the normalized text.
+        """
+        return [(tks[0].start, tks[-1].end) for tks in self.occurrences]
+
+    @property
+    def raw_spans(self):
+        """
+        The (start, end) offsets of the occurrences in the raw text.
+        """
+        return [self.text.raw_span(start, end) for start, end in self.spans]
+
     def istitle(self):
         """
         A keyEntity is a title when all its stemms are title.
@@ -553,7 +685,7 @@ class KeyEntity(RetrievableObject):
         means 1 of confidence, so 0.1
         """
         if self._confidences["frequency"] is None:
-            self._confidences["frequency"] = 1.0 * self.count / len(self.text.words) / 0.1
+            self._confidences["frequency"] = 1.0 * self.count / len(self.text) / 0.1
         return self._confidences["frequency"]
 
     def nrelative_frequency_confidence(self):
@@ -583,10 +715,10 @@ class KeyEntity(RetrievableObject):
         if self._confidences["title"] is None:
             confidence = 1
             factor = 3.0
-            to_test = [n.main_occurrence for n in self if n.main_occurrence.has_meaning()]
+            to_test = [n.main_occurrence for n in self if n.main_occurrence.features & MEANING]
             for item in to_test:
                 # Proportion and occurrences
-                if item.istitle():
+                if item.features & TITLE:
                     confidence += factor / len(to_test) + 0.1
             self._confidences["title"] = confidence
         return self._confidences["title"]
@@ -601,10 +733,9 @@ class KeyEntity(RetrievableObject):
                 if stemm.tag[:3] == "SBP": confidence += 2.5
                 elif stemm.tag[:3] == "ADJ": confidence += 1.7
                 elif stemm.tag[:3] == "SBC": confidence += 1.5
-                elif stemm.main_occurrence.is_verb(): confidence += 1.2
+                elif stemm.main_occurrence.features & VERB: confidence += 1.2
                 elif stemm.tag[:3] == ('ADV'): confidence += 1.0
-                elif stemm.main_occurrence.is_avoir() \
-                     or stemm.main_occurrence.is_etre(): confidence += 0.3
+                elif stemm.main_occurrence.features & (AVOIR | ETRE): confidence += 0.3
                 else:
                     confidence += 0.1
             self._confidences["pos"] = confidence / len(self)
@@ -693,13 +824,14 @@ class KeyEntity(RetrievableObject):
         for the collocation, but if not, is doesn't means that this is not a
         real collocation.
         """
-        if self._confidences["thesaurus"] is None:
-            if self.descriptor is None:
+        if self._confidences.get("thesaurus") is None:
+            sorig = unicode(self)
+            closest = self.thesaurus.search(sorig, limit=1) if self.thesaurus else []
+            if not closest:
                 return 1
             else:
-                sorig = unicode(self)
-                dorig = unicode(self.descriptor)
-                return math.log(max(1, (len(sorig) - lev(dorig, sorig))))
+                descriptor, distance = closest[0]
+                return math.log(max(1, (len(sorig) - distance)))
         return self._confidences["thesaurus"]
 
     def is_duplicate(self, KeyEntity):
@@ -731,7 +863,7 @@ class Stemm(RetrievableObject):
     Should be renamed in Lemm, because we are talking about lemmatisation,
     not stemmatisation.
     """
-    count = 0
+    __slots__ = ("id", "text", "occurrences", "_main_occurrence")
 
     def __init__(self, pk, **kwargs):
         self.id = pk
@@ -766,7 +898,7 @@ class Stemm(RetrievableObject):
         return not self.__eq__(y)
 
     def istitle(self):
-        return self.main_occurrence.istitle()
+        return bool(self.main_occurrence.features & TITLE)
 #        return all([o.istitle() for o in self.occurrences])
         #We try to use the majority instead of all (sometimes a proper name is also a common one)...
 #        return [o.istitle() for o in self.occurrences].count(True) >= len(self.occurrences) / 2
@@ -776,10 +908,10 @@ class Stemm(RetrievableObject):
         return self.main_occurrence.tag
 
     def has_meaning(self):
-        return self.main_occurrence.has_meaning()
+        return bool(self.main_occurrence.features & MEANING)
 
     def has_meaning_alone(self):
-        return self.main_occurrence.has_meaning_alone()
+        return bool(self.main_occurrence.features & MEANING_ALONE)
 
     def has_interest(self):
         """
@@ -4,35 +4,197 @@ Sulci raw text utils.
 """
 import re
 import HTMLParser
+import htmlentitydefs
 
+from bisect import bisect_right
 from collections import defaultdict
 
 
 HTML_PARSER = HTMLParser.HTMLParser()
 
+# Patterns are compiled once, at import time.
+TAGS_PATTERN = re.compile(ur'<[^>]*?>')
+XML_ENTITIES_PATTERN = re.compile(ur"&#\w+;")
+# All that is not text content in a HTML document. No re.I: as each
+# alternative begins with a literal, the engine can jump from "<" to "<".
+HTML_MARKUP_PATTERN = re.compile(ur"""
+                       <[sS][cC][rR][iI][pP][tT]\b[^>]*>.*?(?:</[sS][cC][rR][iI][pP][tT]\s*>|\Z)
+                       |<[sS][tT][yY][lL][eE]\b[^>]*>.*?(?:</[sS][tT][yY][lL][eE]\s*>|\Z)
+                       |<!--.*?(?:-->|\Z)(?#comment)
+                       |<[/!?]?[a-zA-Z][^<>]*>(?#tag, doctype...)
+                       """, re.S | re.U | re.X)
+HTML_ENTITY_PATTERN = re.compile(ur"&(\#[xX][0-9a-fA-F]+|\#[0-9]+|[a-zA-Z][a-zA-Z0-9]{1,7});")
+HTML_ENTITIES = dict((name, unichr(codepoint)) for name, codepoint
+                     in htmlentitydefs.name2codepoint.iteritems())
+HTML_ENTITIES["apos"] = u"'"
+# The historical normalization was calling re.sub with re.U as fourth
+# positional argument, which is `count` (re.U == 32): quotes and inverted
+# pronouns were replaced at most 32 times each, and \W was not unicode aware.
+# We keep this behaviour, to produce exactly the same tokens.
+MAX_SUBSTITUTIONS = 32
+QUOTES_AND_HYPHENS_ALTERNATIVES = (
+    ur'"',
+    ur'\-t\-',
+    ur'\-(?:je|moi|tu|toi|il|le|elle|la|on|nous|vous|ils|elles|les|ci|là|ce)(?=\W)',
+)
+
+
+def _compile_quotes_and_hyphens_patterns():
+    """
+    One pattern for each combination of the substitutions still allowed, keyed
+    by a tuple of booleans: (quotes, "-t-", inverted pronouns).
+    """
+    patterns = {}
+    for quotes in (True, False):
+        for inverted_t in (True, False):
+            for pronouns in (True, False):
+                key = (quotes, inverted_t, pronouns)
+                if any(key):
+                    patterns[key] = re.compile(u"|".join(
+                        alternative for alternative, allowed
+                        in zip(QUOTES_AND_HYPHENS_ALTERNATIVES, key) if allowed
+                    ))
+    return patterns
+
+QUOTES_AND_HYPHENS_PATTERNS = _compile_quotes_and_hyphens_patterns()
+NOT_OPENING_QUOTE_NEXT = u" \n.,!?"
+NOT_CLOSING_QUOTE_PREVIOUS = u" \n"
+TOKENS_PATTERN = re.compile(ur"""
+                  (?=\S)(?#fail fast between tokens)
+                  (?:c'est\-à\-dire(?#special case)
+                  |[A-Z]{1}\.(?#M., R., etc.)
+                  |[\d]+(?:[,. ][\d]+)*(?#Number)
+                  |[\,\.\:\(\)\!\-\?\[\];…«»"%€$]{1}(?#punct. and symbols)
+                  |\w{1}[’\u2019']{1}(?#l' m', etc.)
+                  |qu[’\u2019']{1}(?#qu')
+                  |[\w’\u2019'\-]+(?#All others "words"))
+                  """, re.U | re.X)
+
 
 def strip_tags(value):
     """Returns the given HTML with all tags stripped."""
-    return re.sub(ur'<[^>]*?>', '', value)
+    return TAGS_PATTERN.sub(u'', value)
 
 
-def unescape_entities(text):
+def _unescape_xml(m):
+    # from http://www.w3.org/QA/2008/04/unescape-html-entities-python.html
+    t = m.group(0)
+    try:
+        if t[:3] == "&#x":
+            return unichr(int(t[3:-1], 16))
+        else:
+            return unichr(int(t[2:-1]))
+    except ValueError:
+        return t  # leave as is
 
-    def _unescape_xml(m):
-        # from http://www.w3.org/QA/2008/04/unescape-html-entities-python.html
-        t = m.group(0)
-        try:
-            if t[:3] == "&#x":
-                return unichr(int(t[3:-1], 16))
-            else:
-                return unichr(int(t[2:-1]))
-        except ValueError:
-            return t  # leave as is
 
-    text = re.sub(ur"&#\w+;", _unescape_xml, text)
+def unescape_entities(text):
+    text = XML_ENTITIES_PATTERN.sub(_unescape_xml, text)
     return HTML_PARSER.unescape(text)
 
 
+def _decode_entity(m):
+    """
+    Return the char of an entity, or the entity itself if unknown.
+    """
+    name = m.group(1)
+    try:
+        if name[0] == u"#":
+            if name[1] in u"xX":
+                return unichr(int(name[2:], 16))
+            return unichr(int(name[1:]))
+        return HTML_ENTITIES[name]
+    except (KeyError, ValueError, OverflowError):
+        return m.group(0)
+
+
+def extract_text(html):
+    """
+    Extract the text content of a HTML document: tags and comments are
+    removed, the content of script and style elements is dropped, and then
+    the entities of the text are decoded (once).
+    Unclosed comments, scripts and styles go to the end of the document, but
+    a "<" without its ">" (as in "a<b") is text.
+    This is made by two linear passes, and the tags do not go through any
+    python callback.
+    """
+    if u"<" in html:
+        html = HTML_MARKUP_PATTERN.sub(u"", html)
+    if u"&" in html:
+        html = HTML_ENTITY_PATTERN.sub(_decode_entity, html)
+    return html
+
+
+def _sub_with_edits(pattern, replace, text, edits):
+    """
+    Same as pattern.sub(replace, text), also appending the replacements made
+    to `edits` (see OffsetsMap).
+    """
+    pieces = []
+    pos = 0
+    for match in pattern.finditer(text):
+        replacement = replace(match)
+        if replacement != match.group(0):
+            pieces.append(text[pos:match.start()])
+            pieces.append(replacement)
+            edits.append((match.start(), match.end(), len(replacement)))
+            pos = match.end()
+    pieces.append(text[pos:])
+    return u"".join(pieces)
+
+
+class OffsetsMap(object):
+    """
+    Map the positions in a transformed text to the positions in the text it
+    has been made from.
+
+    The transformation is described by its edits: (start, end, length) tuples,
+    sorted, meaning that source[start:end] has been replaced by `length` chars.
+    The chars produced by an edit are mapped to the whole replaced part of the
+    source. A map can be chained to the map of a previous transformation.
+    """
+
+    def __init__(self, edits, parent=None):
+        self.parent = parent
+        self._starts = []  # Starts of the edits in the transformed text
+        self._edits = []  # (end in the transformed text, source start, source end)
+        delta = 0
+        for start, end, length in edits:
+            self._starts.append(start + delta)
+            self._edits.append((start + delta + length, start, end))
+            delta += length - (end - start)
+
+    def _source_start(self, position):
+        idx = bisect_right(self._starts, position) - 1
+        if idx < 0:
+            return position
+        end, source_start, source_end = self._edits[idx]
+        if position < end:
+            return source_start
+        return source_end + position - end
+
+    def _source_end(self, position):
+        """
+        `position` is exclusive, so we look at the char before it.
+        """
+        idx = bisect_right(self._starts, position - 1) - 1
+        if idx < 0:
+            return position
+        end, source_start, source_end = self._edits[idx]
+        if position <= end:
+            return source_end
+        return source_end + position - end
+
+    def source_span(self, start, end):
+        """
+        Return the span in the source text of transformed_text[start:end].
+        """
+        start, end = self._source_start(start), self._source_end(end)
+        if self.parent is not None:
+            return self.parent.source_span(start, end)
+        return start, end
+
+
 def modern_istitle(word):
     """
     Define if a word is title or not, handling some modern cases.
@@ -79,41 +241,174 @@ def normalize_text(text, language="fr"):
     Tests needed.
     """
     if language == "fr":
-        text = to_unicode(text)
-        text = strip_tags(unescape_entities(text))
-        text = text.replace(u"’", u"'")
+        text = extract_text(to_unicode(text))
         # qu' lorsqu', etc.
-        text = text.replace(u"qu'", u"qu' ")
-        # replacing opening quotes
-        text = re.sub(ur'(")([^ \n\.,!?]){1}', u"\xab\g<2>", text, re.U)
-        text = re.sub(ur'([^ \n]){1}(")', u"\g<1>\xbb", text, re.U)  # replacing closing quotes
-        # Replacing inverted pronouns.
-        text = re.sub(ur"\-t\-", u" - t - ", text, re.U)
-        text = re.sub(ur"\-(je|moi|tu|toi|il|le|elle|la|on|nous|vous|ils|elles|les|ci|là|ce)([\W])", u" - \g<1>\g<2>", text, re.U)
+        text = text.replace(u"’", u"'").replace(u"qu'", u"qu' ")
+        text = normalize_quotes_and_hyphens(text)
     else:
         raise NotImplementedError
     return text
 
 
+def normalize_quotes_and_hyphens(text, edits=None):
+    """
+    Replace opening and closing quotes by « and », and isolate the inverted
+    pronouns (mange-t-elle, dis-je, ce camion-ci...), in one walk.
+
+    This is the fusion of four substitutions that used to be made one after
+    the other: opening quotes, closing quotes, "-t-", and inverted pronouns.
+    Each match of these passes consumed some chars that could not start
+    another match of the same pass, so we keep track of them here.
+
+    If `edits` is a list, the hyphens replacements are appended to it (see
+    OffsetsMap).
+    """
+    pieces = []
+    append = pieces.append
+    opening = closing = inverted_t = pronouns = 0
+    allowed = (True, True, True)
+    search = QUOTES_AND_HYPHENS_PATTERNS[allowed].search
+    # Positions where a match of a pass is forbidden by a previous one
+    opening_blocked = pronoun_blocked = -1
+    last_closing = -2
+    pos = 0
+    match = search(text, pos)
+    while match is not None:
+        start = match.start()
+        found = match.group()
+        append(text[pos:start])
+        if found == u'"':
+            next_char = text[start + 1:start + 2]
+            if opening < MAX_SUBSTITUTIONS and start != opening_blocked \
+               and next_char and not next_char in NOT_OPENING_QUOTE_NEXT:
+                append(u"\xab")
+                opening += 1
+                # The next char has been consumed by this match
+                opening_blocked = start + 1
+            elif closing < MAX_SUBSTITUTIONS and start > 0 \
+               and not text[start - 1] in NOT_CLOSING_QUOTE_PREVIOUS \
+               and last_closing != start - 1:
+                append(u"\xbb")
+                closing += 1
+                last_closing = start
+            else:
+                append(found)
+            pos = start + 1
+        elif found == u"-t-":
+            if inverted_t < MAX_SUBSTITUTIONS:
+                append(u" - t - ")
+                inverted_t += 1
+                if edits is not None:
+                    edits.append((start, start + 1, 3))
+                    edits.append((start + 2, start + 3, 3))
+                pos = start + 3
+            else:
+                # The last hyphen can still introduce a pronoun
+                append(u"-t")
+                pos = start + 2
+        else:  # Inverted pronoun
+            if pronouns < MAX_SUBSTITUTIONS and start != pronoun_blocked:
+                append(u" - %s" % found[1:])
+                pronouns += 1
+                if edits is not None:
+                    edits.append((start, start + 1, 3))
+                # The char after the pronoun has been consumed by this match
+                pronoun_blocked = match.end()
+            else:
+                append(found)
+            pos = match.end()
+        # Once a substitution has reached its limit, stop looking for it
+        current = (opening < MAX_SUBSTITUTIONS or closing < MAX_SUBSTITUTIONS,
+                   inverted_t < MAX_SUBSTITUTIONS,
+                   pronouns < MAX_SUBSTITUTIONS)
+        if current != allowed:
+            allowed = current
+            if not any(allowed):
+                break
+            search = QUOTES_AND_HYPHENS_PATTERNS[allowed].search
+        match = search(text, pos)
+    append(text[pos:])
+    return u"".join(pieces)
+
+
+def normalize_text_with_offsets(text, language="fr"):
+    """
+    Same as normalize_text, but return also an OffsetsMap from the positions
+    in the normalized text to the positions in the raw (unicode) text.
+    """
+    if language == "fr":
+        text = to_unicode(text)
+        offsets = None
+        # The same steps than extract_text
+        steps = (
+            (HTML_MARKUP_PATTERN, lambda m: u""),
+            (HTML_ENTITY_PATTERN, _decode_entity),
+        )
+        for pattern, replace in steps:
+            edits = []
+            text = _sub_with_edits(pattern, replace, text, edits)
+            if edits:
+                offsets = OffsetsMap(edits, offsets)
+        text = text.replace(u"’", u"'")
+        # Same length, but a space is inserted after each qu'
+        edits = [(m.end(), m.end(), 1) for m in re.finditer(u"qu'", text)]
+        if edits:
+            text = text.replace(u"qu'", u"qu' ")
+            offsets = OffsetsMap(edits, offsets)
+        edits = []
+        text = normalize_quotes_and_hyphens(text, edits)
+        if edits:
+            offsets = OffsetsMap(edits, offsets)
+    else:
+        raise NotImplementedError
+    return text, offsets or OffsetsMap([])
+
+
 def tokenize_text(text, language="fr"):
     """
     Split text into a list of tokens.
     """
     if language == "fr":
-        pattern = re.compile(ur"""
-                  c'est\-à\-dire(?#special case)
-                  |[A-Z]{1}\.(?#M., R., etc.)
-                  |[\d]+(?:[,. ][\d]+)*(?#Number)
-                  |[\,\.\:\(\)\!\-\?\[\];…«»"%€$]{1}(?#punct. and symbols)
-                  |\w{1}[’\u2019']{1}(?#l' m', etc.)
-                  |qu[’\u2019']{1}(?#qu')
-                  |[\w’\u2019'\-]+(?#All others "words")
-                  """, re.U | re.X)
+        pattern = TOKENS_PATTERN
     else:
         raise NotImplementedError
     return pattern.findall(text)
 
 
+def iter_tokenize_text(text, language="fr"):
+    """
+    Yield the tokens of a normalized text one by one.
+
+    Same tokens as tokenize_text(text), without building the whole list.
+    """
+    if language == "fr":
+        pattern = TOKENS_PATTERN
+    else:
+        raise NotImplementedError
+    for match in pattern.finditer(text):
+        yield match.group()
+
+
+def iter_token_spans(text, language="fr"):
+    """
+    Same as iter_tokenize_text, but yield (token, start, end) tuples, where
+    start and end are the offsets of the token in the text.
+    """
+    if language == "fr":
+        pattern = TOKENS_PATTERN
+    else:
+        raise NotImplementedError
+    for match in pattern.finditer(text):
+        yield match.group(), match.start(), match.end()
+
+
+def iter_tokens(text, language="fr"):
+    """
+    Normalize a raw text and yield its tokens one by one.
+    """
+    return iter_tokenize_text(normalize_text(text, language), language)
+
+
 def words_occurrences(text):
     occurrences = defaultdict(int)
     for k in text:
@@ -121,44 +416,87 @@ def words_occurrences(text):
     return occurrences
 
 
+def edit_distance(s1, s2, max_distance=None):
+    """
+    Levenshtein distance between s1 and s2.
+
+    If max_distance is given, only the band of the matrix where the distance
+    can be <= max_distance is computed, and we stop as soon as a whole row is
+    above it: in this case, max_distance + 1 is returned.
+    Only two rows of the length of the shortest string are kept in memory.
+    """
+    if s1 == s2:
+        return 0
+    if len(s1) < len(s2):
+        s1, s2 = s2, s1  # s2 is the shortest
+    # Common prefix and suffix don't change the distance
+    begin = 0
+    end = len(s2)
+    while begin < end and s1[begin] == s2[begin]:
+        begin += 1
+    while end > begin and s1[end - len(s2) - 1] == s2[end - 1]:
+        end -= 1
+    s1 = s1[begin:len(s1) - len(s2) + end]
+    s2 = s2[begin:end]
+    n = len(s1)
+    m = len(s2)
+    if max_distance is None:
+        max_distance = n  # The distance can't be greater
+    elif n - m > max_distance:
+        return max_distance + 1
+    if m == 0:
+        return n
+    out = max_distance + 1  # Value of the cells out of the band
+    previous = range(m + 1)
+    current = [out] * (m + 1)
+    for i in xrange(1, n + 1):
+        c1 = s1[i - 1]
+        low = max(1, i - max_distance)
+        high = min(m, i + max_distance)
+        if low == 1:
+            current[0] = i if i <= max_distance else out
+        else:
+            current[low - 1] = out
+        row_min = current[low - 1]
+        left = row_min
+        for j in xrange(low, high + 1):
+            value = previous[j - 1] + (c1 != s2[j - 1])
+            if left + 1 < value:
+                value = left + 1
+            if previous[j] + 1 < value:
+                value = previous[j] + 1
+            current[j] = left = value
+            if value < row_min:
+                row_min = value
+        if row_min > max_distance:
+            return out
+        if high < m:
+            current[high + 1] = out
+        previous, current = current, previous
+    return min(previous[m], out)
+
+
+def edit_distances(s, candidates, max_distance=None):
+    """
+    Compare s to many candidates: return the list of (candidate, distance),
+    in the candidates order, for the ones at a distance <= max_distance (all
+    of them if max_distance is None).
+    """
+    final = []
+    length = len(s)
+    for candidate in candidates:
+        if max_distance is not None \
+           and abs(len(candidate) - length) > max_distance:
+            continue
+        distance = edit_distance(s, candidate, max_distance)
+        if max_distance is None or distance <= max_distance:
+            final.append((candidate, distance))
+    return final
+
+
 def lev(s1, s2, mode=3):
-    if mode == 1:
-        if len(s1) < len(s2):
-            return lev(s2, s1)
-        if not s1:
-            return len(s2)
-
-        previous_row = xrange(len(s2) + 1)
-        for i, c1 in enumerate(s1):
-            current_row = [i + 1]
-            for j, c2 in enumerate(s2):
-                insertions = previous_row[j + 1] + 1  # j+1 instead of j since previous_row and current_row are one character longer
-                deletions = current_row[j] + 1        # than s2
-                substitutions = previous_row[j] + (c1 != c2)
-                current_row.append(min(insertions, deletions, substitutions))
-            previous_row = current_row
-
-        return previous_row[-1]
-    elif mode == 2:
-        if not s1:
-            return len(s2)
-        if not s2:
-            return len(s1)
-        return min(lev(s1[1:], s2[1:]) + (s1[0] != s2[0]), lev(s1[1:], s2) + 1, lev(s1, s2[1:]) + 1)
-    else:
-        s1 = ' ' + s1
-        s2 = ' ' + s2
-        d = {}
-        S = len(s1)
-        T = len(s2)
-        for i in range(S):
-            d[i, 0] = i
-        for j in range(T):
-            d[0, j] = j
-        for j in range(1, T):
-            for i in range(1, S):
-                if s1[i] == s2[j]:
-                    d[i, j] = d[i - 1, j - 1]
-                else:
-                    d[i, j] = min(d[i - 1, j] + 1, d[i, j - 1] + 1, d[i - 1, j - 1] + 1)
-        return d[S - 1, T - 1]
+    """
+    Levenshtein distance, kept for compatibility: all the modes were
+    computing the same distance, use edit_distance.
+    """
+    return edit_distance(s1, s2)
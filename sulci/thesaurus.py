@@ -21,18 +21,138 @@ Here is the modelization:
 
     This is a piece of text that has been selected as having meaning.
 
+`DescriptorIndex`
+
+    In memory index of the descriptors names, to find the closest ones of
+    an expression.
+
 """
 import codecs
 
+from collections import defaultdict
+
 from limpyd import fields
 
 from sulci.base import BaseRedisModel
 from sulci.utils import save_to_file, get_dir
 from sulci.log import sulci_logger
+from sulci.textutils import edit_distance
+
+
+class DescriptorIndex(object):
+    """
+    Approximate-match index of descriptors names (case insensitive).
+
+    This is a character n-gram inverted index, partitioned by name length: the
+    names at a distance <= d of a query have a length in len(query) +/- d,
+    and share at least max(len) + n - 1 - d * n of their n-grams with it
+    (padded n-grams). Only these candidates are compared with edit_distance.
+    """
+    # The most frequent n-grams of a query are not looked up, as long as the
+    # remaining ones still have to match this many times.
+    min_threshold = 3
+
+    def __init__(self, names=(), size=3):
+        self.size = size
+        self.names = []
+        self._keys = []  # Lower case names
+        self._exact = {}
+        self._postings = defaultdict(list)  # (gram, length) => [name_idx]
+        self._lengths = defaultdict(list)  # length => [name_idx]
+        for name in names:
+            self.add(name)
+
+    @classmethod
+    def from_file(cls, path="thesaurus.txt", size=3):
+        """
+        Build the index from a thesaurus file, with one "- name" by line,
+        indented with tabs.
+        """
+        f = codecs.open(get_dir() + path, "r", "utf-8")
+        names = [line.strip()[2:] for line in f if line.strip().startswith(u"- ")]
+        f.close()
+        return cls(names, size)
+
+    def __len__(self):
+        return len(self.names)
+
+    def grams(self, name):
+        padding = u"\x00" * (self.size - 1)
+        name = padding + name + padding
+        grams = defaultdict(int)
+        for idx in xrange(len(name) - self.size + 1):
+            grams[name[idx:idx + self.size]] += 1
+        return grams
+
+    def add(self, name):
+        key = name.lower()
+        if key in self._exact:
+            return
+        idx = len(self.names)
+        self.names.append(name)
+        self._keys.append(key)
+        self._exact[key] = idx
+        self._lengths[len(key)].append(idx)
+        for gram, count in self.grams(key).iteritems():
+            self._postings[gram, len(key)].extend([idx] * count)
+
+    def search(self, query, max_distance=2, limit=10):
+        """
+        Return the `limit` closest names at a distance <= max_distance of
+        query, as (name, distance) tuples, the closest first.
+        """
+        query = query.lower()
+        if max_distance == 0:
+            idx = self._exact.get(query)
+            return [] if idx is None else [(self.names[idx], 0)]
+        grams = self.grams(query)
+        length = len(query)
+        final = []
+        for candidate_length in xrange(max(1, length - max_distance),
+                                       length + max_distance + 1):
+            # Minimum of common n-grams for a candidate of this length
+            threshold = max(length, candidate_length) + self.size - 1 \
+                        - max_distance * self.size
+            if threshold > 0:
+                common = defaultdict(int)
+                postings_by_gram = [(self._postings.get((gram, candidate_length), ()), count)
+                                    for gram, count in grams.iteritems()]
+                # Skip the most frequent n-grams, lowering the threshold
+                postings_by_gram.sort(key=lambda p: len(p[0]))
+                while postings_by_gram \
+                      and threshold - postings_by_gram[-1][1] >= self.min_threshold:
+                    threshold -= postings_by_gram.pop()[1]
+                for postings, count in postings_by_gram:
+                    if not postings:
+                        continue
+                    if count == 1:
+                        # May count twice a gram repeated in the candidate,
+                        # which only makes the filter looser
+                        for idx in postings:
+                            common[idx] += 1
+                    else:
+                        occurrences = defaultdict(int)
+                        for idx in postings:
+                            occurrences[idx] += 1
+                        for idx, occ in occurrences.iteritems():
+                            common[idx] += min(occ, count)
+                candidates = [idx for idx, c in common.iteritems() if c >= threshold]
+            else:
+                # Short query: the filter can't discard anything
+                candidates = self._lengths[candidate_length]
+            for idx in candidates:
+                distance = edit_distance(query, self._keys[idx], max_distance)
+                if distance <= max_distance:
+                    final.append((distance, self.names[idx]))
+        final.sort()
+        return [(name, distance) for distance, name in final[:limit]]
 
 
 class Thesaurus(object):
 
+    _index = None
+    _index_key = None
+
     def __init__(self, path="thesaurus.txt"):
         self.descriptors = Descriptor.collection()
 
@@ -46,6 +166,31 @@ class Thesaurus(object):
     def __getitem__(self, key):
         return Descriptor.get(name=unicode(key))
 
+    @property
+    def index(self):
+        """
+        The DescriptorIndex of the descriptors, shared by all the instances.
+        It is rebuilt when a descriptor name has been set or deleted since, in
+        this process (see Descriptor.names_version). Call reset_index when
+        the descriptors are changed by another process.
+        """
+        if Thesaurus._index is None or Thesaurus._index_key != Descriptor.names_version:
+            sulci_logger.debug("Building descriptors index...", "YELLOW", True)
+            Thesaurus._index = DescriptorIndex(unicode(d) for d in Descriptor.instances())
+            Thesaurus._index_key = Descriptor.names_version
+        return Thesaurus._index
+
+    @classmethod
+    def reset_index(cls):
+        cls._index = None
+
+    def search(self, expression, max_distance=2, limit=10):
+        """
+        Return the `limit` descriptors names closest to expression, as
+        (name, distance) tuples.
+        """
+        return self.index.search(unicode(expression), max_distance, limit)
+
     def normalize_item(self, item):
         from textmining import KeyEntity  # Sucks...
         if isinstance(item, KeyEntity):
@@ -94,10 +239,19 @@ class Descriptor(BaseRedisModel):
     max_weight = fields.HashableField(default=0)
     is_alias_of_id = fields.HashableField()
 
+    # Incremented each time a name is set or deleted, to invalidate the index
+    names_version = 0
+
     def __init__(self, *args, **kwargs):
         self._max_weight = None
         super(Descriptor, self).__init__(*args, **kwargs)
 
+    def post_command(self, sender, name, result, args, kwargs):
+        if isinstance(sender, fields.RedisField) and sender.name == "name" \
+           and name in sender.available_modifiers:
+            Descriptor.names_version += 1
+        return result
+
     def __unicode__(self):
         return self.name.hget().decode('utf-8')
 
@@ -2,7 +2,9 @@
 
 import os
 import time
+import random
 import datetime
+from itertools import izip
 
 from sulci.thesaurus import Trigger, TriggerToDescriptor, Descriptor
 from sulci.textmining import SemanticalTagger, GlobalPMI
@@ -272,10 +274,125 @@ class GlobalPMITrainer(ContentBaseTrainer):
             self.global_pmi.add_ngram(values['stemms'], amount=values['count'])
 
 
+class RulesCounts(object):
+    """
+    The (good, bad) of the rules tested by a RuleTrainer, kept up to date when
+    a rule is applied, as in the fast transformation based learning of Ngai
+    and Florian.
+
+    The result of a rule on a token only depends on the trained attribute (tag
+    or lemme) of this token, the complements only reading the words and the
+    verified tags. So a rule is only tested on all the tokens the first time
+    (all the tokens with its tag, if it has one, see RuleTrainer.rule_tag).
+    Once a rule is applied, only the tokens it changed are tested again, with
+    the rules that the trainer indexes under their old or new value (see
+    RuleTrainer.rule_keys and RuleTrainer.change_keys).
+    """
+
+    def __init__(self, trainer):
+        self.trainer = trainer
+        self.counts = {}  # rule: [good, bad]
+        self.templates = {}
+        self.index = {}  # key: set of rules
+        self.by_tag = {}  # tag: set of the positions of the tokens
+        for idx, token in enumerate(trainer.tokens):
+            self.by_tag.setdefault(token.tag, set()).add(idx)
+        self.full_tests = 0  # Number of rules tested on the tokens
+
+    def positions(self, rule):
+        """
+        Return the positions of the tokens the rule can apply to.
+        """
+        tag = self.trainer.rule_tag(rule)
+        if tag is None:
+            return xrange(len(self.trainer.tokens))
+        return sorted(self.by_tag.get(tag, ()))
+
+    def test_rule(self, rule):
+        """
+        Return (rule, good, bad), as RuleTrainer.test_rule.
+        """
+        counts = self.counts.get(rule)
+        if counts is None:
+            template = self.templates[rule] = self.trainer.get_template_instance(rule)
+            counts = self.counts[rule] = [0, 0]
+            tokens = self.trainer.tokens
+            for idx in self.positions(rule):
+                test = template.test_rule(tokens[idx], rule)
+                if test == 1:
+                    counts[0] += 1
+                elif test == -1:
+                    counts[1] += 1
+            self.full_tests += 1
+            sulci_logger.info(u"%s g: %d b : %d" % (rule, counts[0], counts[1]), "GRAY")
+            for key in self.trainer.rule_keys(rule):
+                self.index.setdefault(key, set()).add(rule)
+        return rule, counts[0], counts[1]
+
+    def test_token(self, token, rules):
+        return [self.templates[rule].test_rule(token, rule) for rule in rules]
+
+    def apply_rule(self, template, rule):
+        """
+        Apply the rule to the tokens of the trainer, and update the counts of
+        the rules on the tokens it changed.
+        """
+        attr = self.trainer.attr_name
+        positions = self.positions(rule)
+        tokens = [self.trainer.tokens[idx] for idx in positions]
+        before = [getattr(token, attr) for token in tokens]
+        template.apply_rule(tokens, rule)
+        for idx, token, old in izip(positions, tokens, before):
+            new = getattr(token, attr)
+            if new == old:
+                continue
+            if attr == "tag":
+                self.by_tag[old].remove(idx)
+                self.by_tag.setdefault(new, set()).add(idx)
+            rules = set()
+            for key in self.trainer.change_keys(token, old):
+                rules.update(self.index.get(key, ()))
+            if not rules:
+                continue
+            rules = list(rules)
+            setattr(token, attr, old)
+            results = self.test_token(token, rules)
+            setattr(token, attr, new)
+            for rule, result, new_result in zip(rules, results, self.test_token(token, rules)):
+                if result != new_result:
+                    counts = self.counts[rule]
+                    if result == 1:
+                        counts[0] -= 1
+                    elif result == -1:
+                        counts[1] -= 1
+                    if new_result == 1:
+                        counts[0] += 1
+                    elif new_result == -1:
+                        counts[1] += 1
+
+
 class RuleTrainer(ZMQTrainer):
     """
     Main trainer class for rules based, for factorisation.
+
+    In full mode, the results of the rules are kept and updated (see
+    RulesCounts), unless incremental is False.
+
+    If screening is given (a fraction of the samples, eg. 0.2), the candidates
+    are first tested on this fixed random part of the samples (at least one
+    sample), and only the ones whose estimated score is within
+    screening_margin of the best one are tested on all the tokens (see
+    test_candidates and screening_score). The margin is a difference of
+    scores, as given by select_one_rule (eg. 0.05). With check_screening,
+    each rule selected is compared with the one selected without screening,
+    which is slow.
     """
+    incremental = True
+    counts = None
+    screening = None
+    screening_margin = 0.05
+    screening_seed = 1977
+    check_screening = False
 
     def do(self):
         if self.mode == "slave":
@@ -317,11 +434,117 @@ class RuleTrainer(ZMQTrainer):
                 pondered_rules.append((r.decode("utf-8"), int(good), int(bad)))
                 sulci_logger.info(u"Received rule %s" % r.decode("utf-8"), "MAGENTA")
             sulci_logger.info(u"All rules are received from slaves")
+        elif self.counts is not None:
+            for rule in rules_candidates:
+                pondered_rules.append(self.counts.test_rule(rule))
         else:
             for rule in rules_candidates:
                 pondered_rules.append(self.test_rule(rule))
         return pondered_rules
 
+    def test_candidates(self, rules_candidates):
+        """
+        Return the results of the rules candidates select_one_rule needs to
+        choose the same rule as with all of them (except in master mode, where
+        the slaves test all of them).
+        The rules are tested by decreasing max_good, until no other one can
+        have a better score than the best one tested. With screening, the
+        rules whose screening_score is not within screening_margin of this
+        best score are not tested (so another rule can be selected).
+        """
+        if self.mode == "master":
+            return self.test_rules(rules_candidates)
+        unique = []
+        seen = set()
+        for rule in rules_candidates:
+            if not rule in seen:
+                seen.add(rule)
+                unique.append(rule)
+        bounds = dict((rule, self.max_good(rule)) for rule in unique)
+        # sorted is stable: the rules with the same bound stay in order
+        unique.sort(key=lambda rule: bounds[rule], reverse=True)
+        results = {}
+        best = None
+        screened = 0
+        for rule in unique:
+            bound = self.bound_score(bounds[rule])
+            if bound is None or (best is not None and bound < best):
+                break
+            if self.screening and best is not None and not self.is_tested(rule) \
+               and self.screening_score(rule) < best - self.screening_margin:
+                screened += 1
+                continue
+            results[rule] = self.test_rules([rule])[0]
+            _, score = self.select_one_rule([results[rule]])
+            if score is not None and (best is None or score > best):
+                best = score
+        self.screened_out += screened
+        self.skipped_tests += len(unique) - len(results) - screened
+        # In the order of the candidates, as select_one keeps the first of
+        # the rules with the same score
+        return [results[rule] for rule in rules_candidates if rule in results]
+
+    def is_tested(self, rule):
+        """
+        Is the result of the rule on all the tokens already known?
+        """
+        return self.counts is not None and rule in self.counts.counts
+
+    def screening_score(self, rule):
+        """
+        Return the score select_one_rule gives to the rule, with its good and
+        bad on the screening tokens scaled to all the tokens, or 0.0 (the
+        lowest score) if it would not select it.
+        """
+        template = self.get_template_instance(rule)
+        good = bad = 0
+        for token in self.screening_tokens:
+            test = template.test_rule(token, rule)
+            if test == 1:
+                good += 1
+            elif test == -1:
+                bad += 1
+        scale = float(len(self.tokens)) / len(self.screening_tokens)
+        _, score = self.select_one_rule([(rule, int(round(good * scale)),
+                                          int(round(bad * scale)))])
+        return score or 0.0
+
+    def check_screened(self, rules_candidates, rule):
+        """
+        Compare the rule selected with screening with the one selected
+        without it, testing all the candidates on all the tokens.
+        """
+        screening, counts, skipped = self.screening, self.counts, self.skipped_tests
+        self.screening = self.counts = None
+        try:
+            exhaustive, _ = self.select_one_rule(self.test_candidates(rules_candidates))
+        finally:
+            self.screening, self.counts, self.skipped_tests = screening, counts, skipped
+        self.screening_checks += 1
+        if exhaustive != rule:
+            self.screening_changes += 1
+            sulci_logger.info(u"Screening selected %s instead of %s" % (rule, exhaustive), "RED")
+
+    def max_good(self, rule):
+        """
+        Return an upper bound of the good of the rule (the tokens it would
+        correct), without testing it on the tokens.
+        """
+        return len(self.tokens)
+
+    def bound_score(self, good):
+        """
+        Return the best score select_one_rule can give to a rule with this
+        good, or None if it can not select it.
+        """
+        pass
+
+    def applied(self):
+        """
+        Called once a rule is applied to the tokens.
+        """
+        pass
+
     def pretrain(self):
         """
         Trainer specific training session preparation.
@@ -337,13 +560,47 @@ class RuleTrainer(ZMQTrainer):
     def select_one_rule(self, rules):
         pass
 
-    def train(self):
+    def rule_tag(self, rule):
+        """
+        Return the tag a token must have for the rule to apply to it, if any.
+        """
+        pass
+
+    def rule_keys(self, rule):
+        """
+        Return the keys of the rule in RulesCounts: a token whose trained
+        attribute changes is tested again with the rules of its change_keys.
+        """
+        return [self.rule_tag(rule)]
+
+    def change_keys(self, token, old):
+        """
+        Return the keys of the rules to test again on token, once its trained
+        attribute changed from old.
+        """
+        return [token.tag]
+
+    def train(self, export=True):
         """
         Main factorized train method.
+        Return the rules, with their score, and export them if export is True.
         """
         #We have to apply rules one after one to all objects
         sulci_logger.info("Begin of training session.", "WHITE", True)
         final_rules = []
+        self.skipped_tests = 0  # Rules not tested thanks to test_candidates
+        self.screened_out = 0  # Rules not tested thanks to screen
+        self.screening_checks = self.screening_changes = 0
+        if self.screening:
+            size = max(1, int(len(self.samples) * self.screening))
+            samples = random.Random(self.screening_seed).sample(
+                self.samples, min(size, len(self.samples)))
+            self.screening_tokens = [token for sample in samples for token in sample]
+            if not self.screening_tokens:
+                sulci_logger.info(u"No token to screen the rules on, screening disabled", "RED")
+                self.screening = None
+        if self.incremental and self.mode not in ("master", "slave"):
+            self.counts = RulesCounts(self)
         errors = self.get_errors()
         while errors:
             run_applied_rule = False
@@ -357,9 +614,11 @@ class RuleTrainer(ZMQTrainer):
                     template = self.get_template_instance(tpl)
                     rules_candidates += template.make_rules(token_with_error)
                 # Test the rules
-                pondered_rules = self.test_rules(rules_candidates)
+                pondered_rules = self.test_candidates(rules_candidates)
                 # Select one rule
                 rule_candidate, score = self.select_one_rule(pondered_rules)
+                if self.screening and self.check_screening:
+                    self.check_screened(rules_candidates, rule_candidate)
                 # Maybe the test "rule_candidate in final_rules" have to be done before...
                 if rule_candidate and not rule_candidate in final_rules:
                     # How to calculate the score min ?
@@ -367,7 +626,11 @@ class RuleTrainer(ZMQTrainer):
                     final_rules.append((rule_candidate, score))
                     # Apply the rule to the tokens
                     sulci_logger.info(u"Applying rule %s (%s)" % (rule_candidate, score), "RED")
-                    template.apply_rule(self.tokens, rule_candidate)
+                    if self.counts is not None:
+                        self.counts.apply_rule(template, rule_candidate)
+                    else:
+                        template.apply_rule(self.tokens, rule_candidate)
+                    self.applied()
                     if self.mode == "master":
                         # Send the rule to apply
                         self.pubsocket.send(" %s" % rule_candidate.encode("utf-8"))
@@ -383,7 +646,15 @@ class RuleTrainer(ZMQTrainer):
                 continue  # go back to while
             errors = None  # Nothing applied, we stop here.
         self.display_errors()
-        self.template_generator.export(final_rules)
+        sulci_logger.info(u"%d rules candidates not tested" % self.skipped_tests, "RED")
+        if self.screening:
+            sulci_logger.info(u"%d rules candidates screened out" % self.screened_out, "RED")
+        if self.screening_checks:
+            sulci_logger.info(u"Screening changed %d of %d selections" % (
+                self.screening_changes, self.screening_checks), "RED")
+        if export:
+            self.template_generator.export(final_rules)
+        return final_rules
 
     def test_rule(self, rule):
         template = self.get_template_instance(rule)
@@ -428,9 +699,12 @@ class LemmatizerTrainer(RuleTrainer):
     template_generator = LemmatizerTemplateGenerator
     attr_name = "lemme"  # Name of the attribute we test on
 
-    def __init__(self, lemmatizer, mode="full"):
+    def __init__(self, lemmatizer, mode="full", incremental=True, screening=None):
         self.lemmatizer = lemmatizer
         self.mode = mode
+        self.incremental = incremental
+        self.screening = screening
+        self._max_goods = None
         self.tokens = self.lemmatizer.tokens
         self.samples = self.lemmatizer.samples
         self.pretrain()
@@ -457,6 +731,28 @@ class LemmatizerTrainer(RuleTrainer):
         """
         return RuleTemplate.select_one(rules, len(self.tokens))
 
+    def bound_score(self, good):
+        return RuleTemplate.best_score(good, len(self.tokens))
+
+    def max_good(self, rule):
+        # The tags and the verified lemmes do not change, so the bounds
+        # neither
+        if self._max_goods is None:
+            self._max_goods = {}
+            self._verified_lemmes = {}  # tag: {verified lemme: count}
+            for token in self.tokens:
+                lemmes = self._verified_lemmes.setdefault(token.tag, {})
+                lemmes[token.verified_lemme] = lemmes.get(token.verified_lemme, 0) + 1
+        if not rule in self._max_goods:
+            name, args = self.template_generator.uncompile(rule)
+            template = self.get_template_instance(rule)
+            self._max_goods[rule] = template.max_good(args, self._verified_lemmes.get(args[0], {}))
+        return self._max_goods[rule]
+
+    def rule_tag(self, rule):
+        # The tags do not change here
+        return LemmatizerTemplateGenerator.uncompile(rule)[1][0]
+
 
 class POSTrainer(RuleTrainer):
     """
@@ -464,13 +760,16 @@ class POSTrainer(RuleTrainer):
     """
     attr_name = "tag"  # Name of the attribute we test on
 
-    def __init__(self, tagger, corpus, mode="full"):
+    def __init__(self, tagger, corpus, mode="full", incremental=True, screening=None):
         self.tagger = tagger
         self.corpus = corpus
         self.pretrain()
         self.tokens = self.corpus.tokens
         self.samples = self.corpus.samples
         self.mode = mode
+        self.incremental = incremental
+        self.screening = screening
+        self._errors_tags = None
 
     def log_error(self, token):
         sulci_logger.info(u"Error : %s, tagged %s instead of %s" \
@@ -483,6 +782,37 @@ class POSTrainer(RuleTrainer):
     def select_one_rule(self, rules):
         return RuleTemplate.select_one(rules, len(self.corpus), 3)
 
+    def bound_score(self, good):
+        return RuleTemplate.best_score(good, len(self.corpus), 3)
+
+    def max_good(self, rule):
+        # This is its exact good: a rule can only correct the errors which
+        # should be tagged its to_tag
+        if self._errors_tags is None:
+            self._errors_tags = {}  # verified tag: errors
+            for token in self.tokens:
+                if token.tag != token.verified_tag:
+                    self._errors_tags.setdefault(token.verified_tag, []).append(token)
+        to_tag = self.template_generator.uncompile(rule)[1]
+        template = self.get_template_instance(rule)
+        return sum(1 for token in self._errors_tags.get(to_tag, ())
+                   if template.test_rule(token, rule) == 1)
+
+    def applied(self):
+        self._errors_tags = None
+
+    def rule_tag(self, rule):
+        return self.template_generator.uncompile(rule)[0] or None
+
+    def rule_keys(self, rule):
+        # A rule without from_tag only changes its result on a token when its
+        # tag becomes or stops being its to_tag
+        from_tag, to_tag, _, _ = self.template_generator.uncompile(rule)
+        return [("from", from_tag)] if from_tag else [("to", to_tag)]
+
+    def change_keys(self, token, old):
+        return [("from", old), ("from", token.tag), ("to", old), ("to", token.tag)]
+
     def pretrain(self):
         self.tagger.tag_all(self.corpus.tokens)
 
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Contextual rules compiled into a deterministic transducer.
+
+The contextual rules are "change from_tag to to_tag if the context of the
+token is X", applied one after the other to the whole text. The contexts are
+made of words and verified tags, never of the tags being computed, so each
+token goes through the rules independently of its neighbours: its tag is the
+state of an automaton, and the rules are transitions guarded by the context
+of the token.
+
+The compiled transducer has one state by (tag, rule index): from a state, the
+next transition is the first following rule whose from_tag is the current tag
+and whose complement matches the context. The contexts are computed once per
+token and template, and the rules are found by dict lookups on them, so a text
+is tagged in one left-to-right pass, without testing each rule.
+"""
+from bisect import bisect_right
+
+
+class ContextualTransducer(object):
+    """
+    Deterministic transducer of a list of contextual rules.
+    """
+
+    def __init__(self, rules):
+        """
+        rules are (template, from_tag, to_tag, complement) tuples, in the order
+        they are applied (see PosTagger.compiled_rules).
+        """
+        self.to_tags = []
+        # {from_tag: [(template, {key: [rule indexes]})]}
+        self.transitions = {}
+        for idx, (template, from_tag, to_tag, complement) in enumerate(rules):
+            self.to_tags.append(to_tag)
+            by_template = self.transitions.setdefault(from_tag, [])
+            for tpl, keys in by_template:
+                if tpl is template:
+                    break
+            else:
+                keys = {}
+                by_template.append((template, keys))
+            keys.setdefault(template.rule_key(complement), []).append(idx)
+
+    def __len__(self):
+        return len(self.to_tags)
+
+    def next_rule(self, tag, position, token, contexts):
+        """
+        Return the index of the first rule after position matching the token
+        tagged tag, or None.
+        contexts caches the keys of the token context by template.
+        """
+        found = None
+        for template, keys in self.transitions.get(tag, ()):
+            try:
+                token_keys = contexts[template]
+            except KeyError:
+                token_keys = contexts[template] = template.complement_keys(token)
+            for key in token_keys:
+                indexes = keys.get(key)
+                if indexes is None:
+                    continue
+                i = bisect_right(indexes, position)
+                if i < len(indexes) and (found is None or indexes[i] < found):
+                    found = indexes[i]
+        return found
+
+    def transduce(self, token):
+        """
+        Return the final tag of the token, and whether a rule matched it.
+        """
+        tag = token.tag
+        position = -1
+        contexts = {}
+        while True:
+            next_position = self.next_rule(tag, position, token, contexts)
+            if next_position is None:
+                return tag, position >= 0
+            position = next_position
+            tag = self.to_tags[position]
+
+    def apply(self, tokens):
+        """
+        Tag the tokens in one pass.
+        """
+        for token in tokens:
+            tag, matched = self.transduce(token)
+            if matched:
+                token.tag = tag
+                # Maybe we should do this only in training mode
+                token.sample.reset_trainer_status()
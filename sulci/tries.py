@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Indexes of the lexicon words.
+
+The prefix and suffix tries answer "which lexicon words are this word plus or
+minus an affix" with one walk, instead of one lexicon lookup (and one string)
+by possible affix.
+The factor index answers "is this string a piece of a lexicon word" without
+storing all the pieces.
+"""
+from array import array
+
+
+class WordTrie(object):
+    """
+    Trie of words, made of nested dicts: {char: node}. A node containing the
+    END key is the end of a word.
+    """
+    END = None
+
+    def __init__(self, words=()):
+        self.root = {}
+        for word in words:
+            self.add(word)
+
+    def add(self, word):
+        node = self.root
+        for char in word:
+            node = node.setdefault(char, {})
+        node[self.END] = True
+
+    def find(self, word):
+        """
+        Return the node of word, or None if no word begins with it.
+        """
+        node = self.root
+        for char in word:
+            node = node.get(char)
+            if node is None:
+                return None
+        return node
+
+    def __contains__(self, word):
+        node = self.find(word)
+        return node is not None and self.END in node
+
+    def ends(self, word, min_length=0, max_length=None):
+        """
+        Return the lengths of the beginnings of word which are words, between
+        min_length and max_length.
+        """
+        final = []
+        node = self.root
+        for length, char in enumerate(word):
+            if max_length is not None and length > max_length:
+                return final
+            if length >= min_length and self.END in node:
+                final.append(length)
+            node = node.get(char)
+            if node is None:
+                return final
+        if len(word) >= min_length and self.END in node \
+           and (max_length is None or len(word) <= max_length):
+            final.append(len(word))
+        return final
+
+    def completions(self, word, max_length):
+        """
+        Return the strings, of 1 to max_length chars, which added after word
+        make a word.
+        """
+        final = []
+        node = self.find(word)
+        if node is None:
+            return final
+        stack = [(node, u"")]
+        while stack:
+            node, added = stack.pop()
+            for char, child in node.iteritems():
+                if char is self.END:
+                    if added:
+                        final.append(added)
+                elif len(added) < max_length:
+                    stack.append((child, added + char))
+        return final
+
+
+class LexiconTries(object):
+    """
+    The lexicon words in a prefix trie, and reversed in a suffix trie.
+    """
+
+    def __init__(self, words):
+        words = list(words)
+        self.prefix_trie = WordTrie(words)
+        self.suffix_trie = WordTrie(word[::-1] for word in words)
+
+    def added_prefixes(self, word, max_length):
+        """
+        Return the (prefix, prefix + word) which are lexicon words.
+        """
+        return [(added[::-1], added[::-1] + word)
+                for added in self.suffix_trie.completions(word[::-1], max_length)]
+
+    def added_suffixes(self, word, max_length):
+        """
+        Return the (suffix, word + suffix) which are lexicon words.
+        """
+        return [(added, word + added)
+                for added in self.prefix_trie.completions(word, max_length)]
+
+    def deleted_prefixes(self, word, max_length):
+        """
+        Return the (prefix, word without prefix) where the word without its
+        prefix, of 1 to max_length chars, is a lexicon word.
+        """
+        tlen = len(word)
+        lengths = self.suffix_trie.ends(word[::-1], max(1, tlen - max_length), tlen - 1)
+        return [(word[:tlen - length], word[tlen - length:]) for length in lengths]
+
+    def deleted_suffixes(self, word, max_length):
+        """
+        Return the (suffix, word without suffix) where the word without its
+        suffix, of 1 to max_length chars, is a lexicon word.
+        """
+        tlen = len(word)
+        lengths = self.prefix_trie.ends(word, max(1, tlen - max_length), tlen - 1)
+        return [(word[length:], word[:length]) for length in lengths]
+
+
+class FactorIndex(object):
+    """
+    Generalized suffix array of words: the words are stored in one UTF-8
+    string, separated by new lines, with the positions of all their suffixes,
+    sorted. A factor is found by a binary search on the suffixes, in
+    O(len(factor) * log(number of chars)), and the index only takes two ints
+    by char.
+    The UTF-8 bytes are sorted as their chars, and both tables can be read
+    from a file buffer (see CompiledLexicon).
+    """
+    SEPARATOR = "\n"
+
+    def __init__(self, words=()):
+        text = []
+        positions = []
+        start = 0
+        for word in words:
+            word = word.encode("utf-8")
+            text.append(word)
+            for idx, char in enumerate(word):
+                if not 0x80 <= ord(char) < 0xC0:  # Not an UTF-8 continuation
+                    positions.append(start + idx)
+            start += len(word) + 1
+        self.text = text = self.SEPARATOR.join(text) + self.SEPARATOR
+        positions.sort(key=lambda p: text[p:text.index(self.SEPARATOR, p)])
+        self.suffixes = array("I", positions)
+
+    @classmethod
+    def from_tables(cls, text, suffixes):
+        """
+        Build the index from its tables, text being the words and suffixes
+        the sorted positions (any sequence of ints).
+        """
+        index = cls()
+        index.text = text
+        index.suffixes = suffixes
+        return index
+
+    def __len__(self):
+        return len(self.suffixes)
+
+    def prefix(self, position, length):
+        """
+        Return the length first bytes of the suffix at position, in its word.
+        """
+        prefix = self.text[position:position + length]
+        end = prefix.find(self.SEPARATOR)
+        return prefix if end == -1 else prefix[:end]
+
+    def __contains__(self, factor):
+        """
+        Is factor a piece of a word, other than the whole word?
+        (Which is what Lexicon.add_factors used to store.)
+        """
+        if isinstance(factor, unicode):
+            factor = factor.encode("utf-8")
+        length = len(factor)
+        if not length:
+            return False
+        suffixes = self.suffixes
+        low, high = 0, len(suffixes)
+        while low < high:  # First suffix >= factor
+            middle = (low + high) // 2
+            if self.prefix(suffixes[middle], length) < factor:
+                low = middle + 1
+            else:
+                high = middle
+        # The suffixes beginning with factor are sorted from here. Only one
+        # of them can be a whole word equal to factor, so two are enough.
+        for idx in xrange(low, min(low + 2, len(suffixes))):
+            position = suffixes[idx]
+            if self.prefix(position, length) != factor:
+                return False
+            whole_word = (position == 0 or self.text[position - 1] == self.SEPARATOR) \
+                         and self.text[position + length] == self.SEPARATOR
+            if not whole_word:
+                return True
+        return False